@@ -0,0 +1,842 @@
+# Micro-benchmarks for the hot paths of the simulation and training loop
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+from utilities import SetSumo
+
+# Prints a table of timings in milliseconds, one row per variant
+def Report(Title, Rows):
+    print('\n=============== '+Title+' ===============')
+    Header='%-40s %12s %12s %12s'%('Variant','Mean (ms)','p50 (ms)','p99 (ms)')
+    print(Header)
+    for Name, Timings in Rows:
+        Timings=np.asarray(Timings)*1000
+        print('%-40s %12.3f %12.3f %12.3f'%(Name, Timings.mean(), np.percentile(Timings,50), np.percentile(Timings,99)))
+    print('='*len(Header))
+
+# Per decision step cost of reading the vehicles from sumo, bulk subscription vs one call per car and variable
+def BenchCollect(args):
+    import traci
+    from environment import VehicleCollector, PollingCollector
+
+    SumoCmd=SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps)
+    Rows=[]
+    for Name, Collector in [('Polling (per vehicle)',PollingCollector()), ('Bulk context subscription',VehicleCollector())]:
+        traci.start(SumoCmd)
+        traci.simulationStep(args.WarmUp) # Skip ahead to when the network is loaded with cars
+        Step=args.WarmUp
+
+        Timings=[]
+        Cars=[]
+        for _ in range(args.Decisions):
+            StartTime=timeit.default_timer()
+            for _ in range(args.GreenDuration):
+                traci.simulationStep()
+                Step+=1
+            Vehicles=Collector.Collect(Step)
+            Timings.append(timeit.default_timer()-StartTime)
+            Cars.append(len(Vehicles))
+        traci.close()
+        Rows.append((Name+' (%i cars)'%np.mean(Cars), Timings))
+
+    Report('Vehicle Collection (%i steps per decision)'%args.GreenDuration, Rows)
+
+# The if/elif cell mapping GetState used before LaneCellEncoder, kept as a reference for correctness and timing
+def LegacyState(NumStates, Positions, LaneIDs):
+    State=np.zeros(NumStates)
+    for LanePosition, LaneID in zip(Positions, LaneIDs):
+        LanePosition=750-LanePosition
+        if LanePosition < 7:
+            LaneCell = 0
+        elif LanePosition < 14:
+            LaneCell = 1
+        elif LanePosition < 21:
+            LaneCell = 2
+        elif LanePosition < 28:
+            LaneCell = 3
+        elif LanePosition < 40:
+            LaneCell = 4
+        elif LanePosition < 60:
+            LaneCell = 5
+        elif LanePosition < 100:
+            LaneCell = 6
+        elif LanePosition < 160:
+            LaneCell = 7
+        elif LanePosition < 400:
+            LaneCell = 8
+        elif LanePosition <= 750:
+            LaneCell = 9
+        
+        if LaneID == "W2TL_0" or LaneID == "W2TL_1" or LaneID == "W2TL_2":
+            LaneGroup = 0
+        elif LaneID == "W2TL_3":
+            LaneGroup = 1
+        elif LaneID == "N2TL_0" or LaneID == "N2TL_1" or LaneID == "N2TL_2":
+            LaneGroup = 2
+        elif LaneID == "N2TL_3":
+            LaneGroup = 3
+        elif LaneID == "E2TL_0" or LaneID == "E2TL_1" or LaneID == "E2TL_2":
+            LaneGroup = 4
+        elif LaneID == "E2TL_3":
+            LaneGroup = 5
+        elif LaneID == "S2TL_0" or LaneID == "S2TL_1" or LaneID == "S2TL_2":
+            LaneGroup = 6
+        elif LaneID == "S2TL_3":
+            LaneGroup = 7
+        else:
+            LaneGroup = -1
+        
+        if LaneGroup>=1 and LaneGroup<=7:
+            State[int(str(LaneGroup)+str(LaneCell))]=1
+        elif LaneGroup==0:
+            State[LaneCell]=1
+    return State
+
+# Cost of building the state vector, if/elif loop vs LaneCellEncoder, for growing numbers of cars
+# The lane groups LaneCellEncoder reads from the net also have to match the ones the if/elif mapping spells out
+def BenchEncode(args):
+    from environment import JunctionLayout
+    from simulations import LaneCellEncoder
+
+    Junctions=JunctionLayout(os.path.join('Junction','Environment.net.xml'))
+    Encoder=LaneCellEncoder(80, Junctions)
+    LaneIDs=list(Junctions.LaneGroups)+["TL2N_0", "TL2E_3", ":TL_6_0"] # Includes lanes that leave the junction
+    Random=np.random.default_rng(0)
+    Rows=[]
+    for NumCars in args.Cars:
+        Positions=Random.uniform(0, 750, NumCars)
+        Positions[::50]=0 # Cars right at the start of the lane
+        Lanes=list(Random.choice(LaneIDs, NumCars))
+
+        if not np.array_equal(LegacyState(80, Positions, Lanes), Encoder.Encode(Positions, Encoder.Groups(Lanes))[0]):
+            raise AssertionError('LaneCellEncoder differs from the if/elif mapping at %i cars'%NumCars)
+        
+        Legacy=[]
+        Vectorized=[]
+        for _ in range(args.Repeats):
+            StartTime=timeit.default_timer()
+            LegacyState(80, Positions, Lanes)
+            Legacy.append(timeit.default_timer()-StartTime)
+            StartTime=timeit.default_timer()
+            Encoder.Encode(Positions, Encoder.Groups(Lanes))
+            Vectorized.append(timeit.default_timer()-StartTime)
+        Rows.append(('if/elif loop, %i cars'%NumCars, Legacy))
+        Rows.append(('LaneCellEncoder, %i cars'%NumCars, Vectorized))
+
+    Report('State Encoding', Rows)
+
+# The list based replay memory used before the ring buffer, kept as a reference for timing
+class LegacyMemory:
+    def __init__(self, SizeMax):
+        self.Samples=[]
+        self.SizeMax=SizeMax
+    
+    def AddSample(self, Sample):
+        self.Samples.append(Sample)
+        if len(self.Samples)>self.SizeMax:
+            self.Samples.pop(0)
+    
+    def GetSamples(self, N):
+        Batch=random.sample(self.Samples, N)
+        return np.array([Val[0] for Val in Batch]), np.array([Val[3] for Val in Batch])
+
+# Cost of inserting into a full replay memory and drawing a batch as arrays, list vs ring buffer vs sum-tree
+def BenchMemory(args):
+    from utilities import Memory, PrioritizedMemory
+
+    Random=np.random.default_rng(0)
+    Sample=(Random.integers(0,2,80).astype(float), 1, -10.0, Random.integers(0,2,80).astype(float))
+    Rows=[]
+    for Name, Buffer in [('List memory',LegacyMemory(args.MaxMemorySize)), ('Ring buffer memory',Memory(args.MaxMemorySize,0)), ('Prioritized memory',PrioritizedMemory(args.MaxMemorySize,0))]:
+        for _ in range(args.MaxMemorySize):
+            Buffer.AddSample(Sample)
+        
+        Inserts=[]
+        Samples=[]
+        for _ in range(args.Repeats):
+            StartTime=timeit.default_timer()
+            Buffer.AddSample(Sample)
+            Inserts.append(timeit.default_timer()-StartTime)
+            StartTime=timeit.default_timer()
+            Buffer.GetSamples(args.BatchSize)
+            Samples.append(timeit.default_timer()-StartTime)
+        Rows.append((Name+', AddSample', Inserts))
+        Rows.append((Name+', GetSamples', Samples))
+        if isinstance(Buffer, PrioritizedMemory):
+            Updates=[]
+            for _ in range(args.Repeats):
+                Batch=Buffer.GetSamples(args.BatchSize)
+                StartTime=timeit.default_timer()
+                Buffer.UpdatePriorities(Batch.Indices, Random.normal(size=len(Batch)))
+                Updates.append(timeit.default_timer()-StartTime)
+            Rows.append((Name+', UpdatePriorities', Updates))
+
+    Report('Replay Memory (%i samples, batch of %i)'%(args.MaxMemorySize,args.BatchSize), Rows)
+
+# The replay update used before the fused forward pass: two predict calls, a python loop and a one epoch fit
+def LegacyReplay(Model, Memory, Gamma):
+    Batch=Memory.GetSamples(Model.BatchSize)
+    QSA=Model.model.predict(Batch.States, verbose=0)
+    QSAD=Model.model.predict(Batch.NextStates, verbose=0)
+    x=np.zeros((len(Batch), Model.InputDimension))
+    y=np.zeros((len(Batch), Model.OutputDimension))
+    for i, b in enumerate(Batch):
+        State, Action, Reward, _=b[0], b[1], b[2], b[3]
+        CurrentQ=QSA[i]
+        CurrentQ[Action]=Reward+Gamma*np.amax(QSAD[i])
+        x[i]=State
+        y[i]=CurrentQ
+    Model.model.fit(x, y, epochs=1, verbose=0)
+
+# Wall time of the replay epochs run after every episode, predict/loop/fit vs fused forward pass and compiled train step
+def BenchReplay(args):
+    from model import TrainModel
+    from simulations import TrainingSimulation
+    from utilities import Memory
+    from environment import NumpyEnvironment
+
+    Random=np.random.default_rng(0)
+    Environment=NumpyEnvironment(os.path.join('Junction','Environment.net.xml')) # Only gives the simulation its junction, replay never steps it
+    Buffer=Memory(args.MaxMemorySize, 0)
+    for _ in range(args.MaxMemorySize):
+        Buffer.AddSample((Random.integers(0,2,80), Random.integers(0,4), Random.normal(0,100), Random.integers(0,2,80)))
+
+    Rows=[]
+    Totals=[]
+    for Name in ['predict + loop + fit', 'Fused pass + tf.function']:
+        Model=TrainModel(args.NumLayers, args.LayerWidth, args.BatchSize, 0.001, 80, 4)
+        Simulation=TrainingSimulation(Model, Buffer, None, Environment, 0.75, 0, 0, 0, 80, 4, args.TrainingEpochs)
+        Timings=[]
+        StartTime=timeit.default_timer()
+        for _ in range(args.TrainingEpochs):
+            EpochStart=timeit.default_timer()
+            if Name=='predict + loop + fit':
+                LegacyReplay(Model, Buffer, 0.75)
+            else:
+                Simulation.Replay()
+            Timings.append(timeit.default_timer()-EpochStart)
+        Totals.append((Name, timeit.default_timer()-StartTime))
+        Rows.append((Name+', per epoch', Timings))
+
+    Report('Replay (%i epochs, batch of %i)'%(args.TrainingEpochs, args.BatchSize), Rows)
+    for Name, Total in Totals:
+        print('%-40s %11.1fs per episode'%(Name, Total))
+
+# Per decision latency of picking an action from a single state with every inference backend
+def BenchInference(args):
+    from model import TrainModel, Backends
+
+    Random=np.random.default_rng(0)
+    States=Random.integers(0, 2, (args.Decisions, 80)).astype(np.float32)
+    Rows=[]
+    Reference=None
+    for Backend in Backends:
+        Model=TrainModel(args.NumLayers, args.LayerWidth, 100, 0.001, 80, 4, Backend=Backend)
+        if Reference is None:
+            Reference=Model.model # Every backend runs on the same weights
+        else:
+            Model.model.set_weights(Reference.get_weights())
+            Model.Stale=True
+        
+        for State in States[:10]: # Warm up, tracing and the first predict call are not part of the decision cost
+            Model.PredictOne(State)
+        if not np.allclose(Model.PredictOne(States[0]), Reference.predict(States[:1], verbose=0), rtol=1e-4, atol=1e-4):
+            raise AssertionError('The %s backend does not match the keras model'%Backend)
+        
+        Timings=[]
+        for State in States:
+            StartTime=timeit.default_timer()
+            np.argmax(Model.PredictOne(State))
+            Timings.append(timeit.default_timer()-StartTime)
+        Rows.append((Backend, Timings))
+
+    Report('PredictOne (%ix%i network, %i decisions)'%(args.NumLayers, args.LayerWidth, args.Decisions), Rows)
+
+# Per decision cost of picking the actions of many junctions, one PredictOne per junction vs one batch for all of them
+def BenchJunctions(args):
+    from model import TrainModel
+
+    Model=TrainModel(args.NumLayers, args.LayerWidth, 100, 0.001, 80, 4)
+    Random=np.random.default_rng(0)
+    Rows=[]
+    for NumJunctions in args.Junctions:
+        States=Random.integers(0, 2, (args.Decisions, NumJunctions, 80)).astype(np.float32)
+        Model.PredictBatch(States[0]) # Every batch size is traced once before it is timed
+        if not np.allclose(Model.PredictBatch(States[0]), np.concatenate([Model.PredictOne(State) for State in States[0]]), rtol=1e-4, atol=1e-4):
+            raise AssertionError('PredictBatch does not match PredictOne for %i junctions'%NumJunctions)
+        
+        Single=[]
+        Batched=[]
+        for Decision in States:
+            StartTime=timeit.default_timer()
+            [np.argmax(Model.PredictOne(State)) for State in Decision]
+            Single.append(timeit.default_timer()-StartTime)
+            StartTime=timeit.default_timer()
+            np.argmax(Model.PredictBatch(Decision), axis=1)
+            Batched.append(timeit.default_timer()-StartTime)
+        Rows.append(('PredictOne per junction, %i junctions'%NumJunctions, Single))
+        Rows.append(('One PredictBatch, %i junctions'%NumJunctions, Batched))
+
+    Report('Actions of every junction (%ix%i network, %i decisions)'%(args.NumLayers, args.LayerWidth, args.Decisions), Rows)
+
+# Loads a model and picks one action in a fresh interpreter, prints how much memory it took at its peak
+ColdStart={
+    'Keras (TrainedModel.h5)': "from model import TestModel; Model=TestModel(%i, %r, 'function')",
+    'NumPy runtime (TrainedModel.npz)': "from runtime import ExportedModel; Model=ExportedModel(%i, %r)"}
+# The peak is read from /proc rather than getrusage, which keeps the peak of the benchmark process the interpreter was forked from
+ColdStartEnd="; import numpy; Model.PredictOne(numpy.zeros(Model.InputDimension)); print([Line.split()[1] for Line in open('/proc/self/status') if Line.startswith('VmHWM')][0])"
+
+# Cold start, peak memory and per decision latency of a trained model through Keras vs exported to the NumPy runtime in every precision
+def BenchExport(args):
+    from model import TrainModel, TestModel, ExportModel
+    from runtime import Precisions, ExportedModel
+
+    Random=np.random.default_rng(0)
+    States=Random.integers(0, 2, (args.Decisions, 80)).astype(np.float32)
+    Folder=tempfile.mkdtemp()
+    Trained=TrainModel(args.NumLayers, args.LayerWidth, 100, 0.001, 80, 4)
+    Trained.model.save(os.path.join(Folder, 'TrainedModel.h5'))
+    Models=[('Keras, function backend', Folder, TestModel(80, Folder, 'function'))]
+    for Precision in Precisions:
+        os.makedirs(os.path.join(Folder, Precision))
+        ExportModel(Trained.model, os.path.join(Folder, Precision, 'TrainedModel.npz'), Precision)
+        Models.append(('NumPy runtime, '+Precision, os.path.join(Folder, Precision), ExportedModel(80, os.path.join(Folder, Precision))))
+
+    Rows=[]
+    Accuracy=[]
+    Expected=Models[0][2].PredictBatch(States)
+    for Name, Path, Model in Models:
+        for State in States[:10]: # Warm up, tracing is not part of the decision cost
+            Model.PredictOne(State)
+        Timings=[]
+        for State in States:
+            StartTime=timeit.default_timer()
+            np.argmax(Model.PredictOne(State))
+            Timings.append(timeit.default_timer()-StartTime)
+        Rows.append((Name, Timings))
+        Values=Model.PredictBatch(States)
+        FileName=os.path.join(Path, 'TrainedModel.npz' if Path!=Folder else 'TrainedModel.h5')
+        Accuracy.append((Name, os.path.getsize(FileName)/1024, np.abs(Values-Expected).max(), 100*np.mean(Values.argmax(axis=1)==Expected.argmax(axis=1))))
+    Report('PredictOne (%ix%i network, %i decisions)'%(args.NumLayers, args.LayerWidth, args.Decisions), Rows)
+
+    print('\n=============== Cold start, load and first action in a new interpreter (%i runs) ==============='%args.Repeats)
+    Header='%-40s %12s %14s'%('Variant', 'Time (s)', 'Peak RSS (MB)')
+    print(Header)
+    for Name, Code in ColdStart.items():
+        Times=[]
+        Memory=[]
+        for _ in range(args.Repeats):
+            StartTime=timeit.default_timer()
+            Output=subprocess.run([sys.executable, '-c', Code%(80, os.path.join(Folder, 'float32') if 'NumPy' in Name else Folder)+ColdStartEnd], capture_output=True, text=True, check=True).stdout
+            Times.append(timeit.default_timer()-StartTime)
+            Memory.append(int(Output.split()[-1])/1024) # Linux reports the peak in kB
+        print('%-40s %12.2f %14.0f'%(Name, np.mean(Times), np.mean(Memory)))
+    print('='*len(Header))
+
+    print()
+    Header='%-40s %12s %16s %14s'%('Variant', 'File (kB)', 'Largest error', 'Same action')
+    print(Header)
+    for Name, Size, Error, Agreement in Accuracy:
+        print('%-40s %12.1f %16.2e %13.1f%%'%(Name, Size, Error, Agreement))
+    print('='*len(Header))
+
+# Startup of the entry points down to their --help, with the import time of every top level module from python -X importtime
+def BenchImports(args):
+    Rows=[]
+    Modules={}
+    for Script in args.Scripts:
+        Timings=[]
+        for _ in range(args.Repeats):
+            StartTime=timeit.default_timer()
+            Output=subprocess.run([sys.executable, '-X', 'importtime', Script, '--help'], capture_output=True, text=True, check=True).stderr
+            Timings.append(timeit.default_timer()-StartTime)
+        Rows.append((Script+' --help', Timings))
+        # Lines of the last run read "import time: self [us] | cumulative | module", nested imports are indented
+        for Line in Output.splitlines():
+            if Line.startswith('import time:') and not Line.startswith('import time: self'):
+                _, Cumulative, Module=Line[len('import time:'):].split('|')
+                if not Module[1:].startswith(' '):
+                    Modules[Script, Module.strip()]=int(Cumulative)/1e6
+
+    Report('Startup to --help (%i runs)'%args.Repeats, Rows)
+    print('\nSlowest top level imports of the last run:')
+    for (Script, Module), Time in sorted(Modules.items(), key=lambda Item: -Item[1])[:args.Top]:
+        print('%-14s %-26s %8.3fs'%(Script, Module, Time))
+
+# Per simulated step cost of stepping sumo and reading the queue length, one call per edge vs edge subscriptions
+def BenchQueue(args):
+    from environment import TraciEnvironment
+    from utilities import TrafficGen
+
+    Traffic=TrafficGen(args.MaxSteps, args.N_Cars, os.path.join(tempfile.mkdtemp(), 'EpisodeRoutes.rou.xml'))
+    Traffic.GenerateRoutes(seed=args.Seed)
+    Environment=TraciEnvironment(SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps))
+    EdgeIDs=["N2TL", "S2TL", "E2TL", "W2TL"]
+    Variants=[('Polling (one call per edge)', lambda: [Environment.Connection.edge.getLastStepHaltingNumber(EdgeID) for EdgeID in EdgeIDs]),
+              ('Edge subscriptions', lambda: Environment.HaltingNumbers(EdgeIDs))]
+    Rows=[]
+    for Name, HaltingNumbers in Variants:
+        Environment.Start(Traffic)
+        Environment.Connection.simulationStep(float(args.WarmUp)) # Skip ahead to when the network is loaded with cars
+        Timings=[]
+        Queue=0
+        for _ in range(args.Steps):
+            StartTime=timeit.default_timer()
+            Environment.Step()
+            Queue+=sum(HaltingNumbers())
+            Timings.append(timeit.default_timer()-StartTime)
+        Environment.Close()
+        Rows.append((Name+' (queue %.1f)'%(Queue/args.Steps), Timings))
+
+    Report('Step and queue length (%i steps)'%args.Steps, Rows)
+
+# Cost of simulating an episode under a fixed signal cycle, one call per second vs one call per phase with the queue recorded by sumo
+def BenchStepping(args):
+    from environment import TraciEnvironment
+    from utilities import TrafficGen
+
+    Traffic=TrafficGen(args.MaxSteps, args.N_Cars, os.path.join(tempfile.mkdtemp(), 'EpisodeRoutes.rou.xml'))
+    Traffic.GenerateRoutes(seed=args.Seed)
+    EdgeIDs=["N2TL", "S2TL", "E2TL", "W2TL"]
+    Sumo=SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps)
+    Rows=[]
+    Totals=[]
+    for Name, Environment in [('Per second', TraciEnvironment(Sumo, 'PerSecond')), ('Per phase', TraciEnvironment(Sumo, 'PerPhase', QueueEdges=EdgeIDs))]: # Persistent sumos running side by side need labels of their own:
+        Environment.Start(Traffic)
+        Timings=[]
+        SumQueue=0
+        StartTime=timeit.default_timer()
+        for Step in range(0, args.MaxSteps, args.GreenDuration):
+            PhaseStart=timeit.default_timer()
+            Environment.SetPhase("TL", 2*((Step//args.GreenDuration)%4)) # Cycles through the four green phases
+            if Environment.QueueEdges is None:
+                for _ in range(args.GreenDuration):
+                    Environment.Step()
+                    SumQueue+=sum(Environment.HaltingNumbers(EdgeIDs))
+            else:
+                Environment.Step(args.GreenDuration)
+            Timings.append(timeit.default_timer()-PhaseStart)
+        Environment.Close()
+        if Environment.QueueEdges is not None:
+            SumQueue=Environment.QueueLengths(args.MaxSteps).sum()
+        Totals.append((Name, timeit.default_timer()-StartTime, SumQueue))
+        Rows.append((Name, Timings))
+
+    Report('Stepping, per %is phase (%i steps)'%(args.GreenDuration, args.MaxSteps), Rows)
+    for Name, Time, SumQueue in Totals:
+        print('%-40s %8.2fs per episode, total queue %i'%(Name, Time, SumQueue))
+
+# Cost of getting sumo ready for an episode, a new process per episode vs one process that loads every episode
+def BenchStartup(args):
+    from environment import TraciEnvironment
+    from utilities import TrafficGen
+
+    Traffic=TrafficGen(args.MaxSteps, args.N_Cars, os.path.join(tempfile.mkdtemp(), 'EpisodeRoutes.rou.xml'))
+    Sumo=SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps)
+    Rows=[]
+    for Name, Environment in [('New sumo per episode', TraciEnvironment(Sumo, Persistent=False)), ('Persistent sumo, traci.load', TraciEnvironment(Sumo))]:
+        Timings=[]
+        for Episode in range(args.Episodes):
+            Traffic.GenerateRoutes(seed=Episode)
+            StartTime=timeit.default_timer()
+            Environment.Start(Traffic)
+            Environment.Step()
+            Timings.append(timeit.default_timer()-StartTime)
+            Environment.Close()
+        Environment.Disconnect()
+        Rows.append((Name, Timings))
+
+    Report('Episode startup (%i episodes)'%args.Episodes, Rows)
+
+# Cost per simulated step of sumo and its NumPy stand-in, on the same routes under a fixed signal cycle
+def BenchEnvironment(args):
+    from environment import TraciEnvironment, NumpyEnvironment
+    from utilities import TrafficGen
+
+    Traffic=TrafficGen(args.MaxSteps, args.N_Cars, os.path.join(tempfile.mkdtemp(), 'EpisodeRoutes.rou.xml'))
+    Traffic.GenerateRoutes(seed=args.Seed)
+    Environments=[('NumPy stand-in', NumpyEnvironment(os.path.join('Junction','Environment.net.xml')))]
+    if not args.NoSumo:
+        Environments.insert(0, ('Sumo through TraCI', TraciEnvironment(SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps))))
+
+    Rows=[]
+    Totals=[]
+    for Name, Environment in Environments:
+        Environment.Start(Traffic)
+        Timings=[]
+        SumQueue=0
+        StartTime=timeit.default_timer()
+        for Step in range(args.MaxSteps):
+            StepStart=timeit.default_timer()
+            if Step%args.GreenDuration==0:
+                Environment.Vehicles(Step)
+                Environment.SetPhase("TL", 2*((Step//args.GreenDuration)%4)) # Cycles through the four green phases
+            Environment.Step()
+            SumQueue+=sum(Environment.HaltingNumbers(["N2TL", "S2TL", "E2TL", "W2TL"]))
+            Timings.append(timeit.default_timer()-StepStart)
+        Totals.append((Name, timeit.default_timer()-StartTime, SumQueue/args.MaxSteps))
+        Environment.Close()
+        Rows.append((Name+', per step', Timings))
+
+    Report('Environment (%i steps, %i cars)'%(args.MaxSteps, args.N_Cars), Rows)
+    for Name, Total, AverageQueue in Totals:
+        print('%-40s %11.2fs per episode, average queue %.1f cars'%(Name, Total, AverageQueue))
+
+# The loop TrafficGen.GenerateRoutes used before, one np.append, draw and print per car
+def LegacyGenerateRoutes(MaxSteps, N_Cars, RouteFile, seed):
+    Random=np.random.RandomState(seed)
+    Timing=np.sort(Random.weibull(2,N_Cars))
+    CarGen=[]
+    OldMin=math.floor(Timing[1])
+    OldMax=math.floor(Timing[-1])
+    for x in Timing:
+        CarGen=np.append(CarGen,(MaxSteps/(OldMax-OldMin)))
+    CarGen=np.rint(CarGen)
+    Straights=["W_E","E_W","N_S","S_N"]
+    Turns=["W_N","W_S","N_W","N_E","E_N","E_S","S_W","S_E"]
+    with open(RouteFile, "w") as route:
+        print("<routes>", file=route)
+        for cc,step in enumerate(CarGen):
+            if Random.uniform() < 0.73:
+                Route=Straights[Random.randint(1,5)-1]
+            else:
+                Route=Turns[Random.randint(1,9)-1]
+            print('    <vehicle id="%s_%i" type="Car" route="%s" depart="%s" departLane="random" departSpeed="10" />' % (Route, cc, Route, step), file=route)
+        print("</routes>", file=route)
+
+# Cost of generating the routes of one episode, per car loop vs vectorized draws and a single write vs a scenario bank lookup
+def BenchRoutes(args):
+    from utilities import TrafficGen, ScenarioBank, GenerateScenarioBank
+
+    Directory=tempfile.mkdtemp()
+    RouteFile=os.path.join(Directory, 'EpisodeRoutes.rou.xml')
+    BankFile=os.path.join(Directory, 'ScenarioBank.npy')
+    GenerateScenarioBank(BankFile, args.MaxSteps, args.N_Cars, args.Repeats)
+    Variants=[('Per car loop, printed per line', lambda seed: LegacyGenerateRoutes(args.MaxSteps, args.N_Cars, RouteFile, seed)),
+              ('Vectorized, one write', TrafficGen(args.MaxSteps, args.N_Cars, RouteFile).GenerateRoutes),
+              ('Vectorized, in memory only', TrafficGen(args.MaxSteps, args.N_Cars, None).GenerateRoutes),
+              ('Scenario bank, one write', TrafficGen(args.MaxSteps, args.N_Cars, RouteFile, ScenarioBank(BankFile)).GenerateRoutes),
+              ('Scenario bank, in memory only', TrafficGen(args.MaxSteps, args.N_Cars, None, ScenarioBank(BankFile)).GenerateRoutes)]
+    Rows=[]
+    for Name, Generate in Variants:
+        Timings=[]
+        for seed in range(args.Repeats):
+            StartTime=timeit.default_timer()
+            Generate(seed)
+            Timings.append(timeit.default_timer()-StartTime)
+        Rows.append((Name, Timings))
+
+    Report('Route generation (%i cars)'%args.N_Cars, Rows)
+
+# Episodes of training on the NumPy stand-in until the delay and queue length fall below a fraction of the first episode's, per Q-learning target rule and replay memory
+def BenchConvergence(args):
+    import keras
+    from model import TrainModel
+    from utilities import TrafficGen, Memory, PrioritizedMemory
+    from simulations import TrainingSimulation
+    from environment import NumpyEnvironment
+
+    Variants=[('Trained network (current rule)', {}, Memory),
+              ('Hard target, every %i steps'%args.TargetEvery, {'TargetUpdate': 'hard', 'TargetEvery': args.TargetEvery}, Memory),
+              ('Polyak target, tau %g'%args.Tau, {'TargetUpdate': 'polyak', 'Tau': args.Tau}, Memory),
+              ('Double DQN, hard target', {'TargetUpdate': 'hard', 'TargetEvery': args.TargetEvery, 'DoubleDQN': True}, Memory),
+              ('Prioritized replay', {}, PrioritizedMemory)]
+    Results=[]
+    for Name, Options, MemoryType in Variants:
+        # Every variant starts from the same weights and sees the same exploration and samples
+        keras.utils.set_random_seed(args.Seed)
+        random.seed(args.Seed)
+        Model=TrainModel(args.NumLayers, args.LayerWidth, args.BatchSize, 0.001, 80, 4, **Options)
+        Buffer=MemoryType(50000, args.MinMemorySize)
+        Buffer.Random=np.random.default_rng(args.Seed)
+        Simulation=TrainingSimulation(Model, Buffer, TrafficGen(args.MaxSteps, args.N_Cars, None), NumpyEnvironment(os.path.join('Junction','Environment.net.xml')), 0.75, args.MaxSteps, 10, 4, 80, 4, args.TrainingEpochs)
+        TrainingTime=0
+        for Episode in range(args.Episodes):
+            TrainingTime+=Simulation.RunTraining(Episode, 1-(Episode/args.Episodes))[1]
+        Results.append((Name, np.array(Simulation.TotalWaitStore), np.array(Simulation.AverageQueueLengthStore), TrainingTime/args.Episodes))
+
+    # Thresholds relative to the first episode, which is fully random for every variant
+    DelayThreshold=args.Threshold*Results[0][1][0]
+    QueueThreshold=args.Threshold*Results[0][2][0]
+    Reached=lambda Values, Threshold: str(np.argmax(Values<=Threshold)+1) if (Values<=Threshold).any() else 'not reached'
+    print('\n=============== Episodes to %g of the first episode (%i episodes, %i steps) ==============='%(args.Threshold, args.Episodes, args.MaxSteps))
+    print('First episode: delay %i, queue %.1f'%(Results[0][1][0], Results[0][2][0]))
+    Header='%-40s %14s %14s %14s %14s %12s'%('Variant','Delay','Queue','Best delay','Best queue','Train (s/ep)')
+    print(Header)
+    for Name, Delays, Queues, TrainingTime in Results:
+        print('%-40s %14s %14s %14i %14.1f %12.1f'%(Name, Reached(Delays, DelayThreshold), Reached(Queues, QueueThreshold), Delays.min(), Queues.min(), TrainingTime))
+    print('='*len(Header))
+
+# Round trip of training.py through the command line, killed once it wrote a checkpoint and carried on with --Mode resume
+# Checks the resumed run finishes every episode in the same model folder, and prints the size and write time of the checkpoint
+def BenchResume(args):
+    from checkpoint import CheckpointName
+    from metrics import ReadMetrics
+
+    Script=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training.py')
+    Options=['--Environment', 'numpy', '--Backend', 'numpy', '--CheckpointEvery', '1']
+    with tempfile.TemporaryDirectory() as Directory:
+        os.symlink(os.path.abspath('Junction'), os.path.join(Directory, 'Junction'))
+        Checkpoint=os.path.join(Directory, 'Models', 'Model_1', CheckpointName)
+        Training=subprocess.Popen([sys.executable, Script, '--TotalEpisodes', str(args.Episodes), '--MaxSteps', str(args.MaxSteps), '--N_Cars', str(args.N_Cars),
+                                   '--NumLayers', str(args.NumLayers), '--LayerWidth', str(args.LayerWidth), '--MinMemorySize', str(args.MinMemorySize), '--TrainingEpochs', str(args.TrainingEpochs)]+Options,
+                                  cwd=Directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while not os.path.isfile(Checkpoint):
+            if Training.poll() is not None:
+                sys.exit('training.py exited with code %i before writing a checkpoint'%Training.returncode)
+            time.sleep(0.05)
+        Training.kill()
+        Training.wait()
+
+        with np.load(Checkpoint) as Arrays:
+            Stopped=json.loads(str(Arrays['State']))['Episode']
+            Uncompressed=io.BytesIO()
+            StartTime=timeit.default_timer()
+            np.savez(Uncompressed, **Arrays)
+            UncompressedTime=timeit.default_timer()-StartTime
+            StartTime=timeit.default_timer()
+            np.savez_compressed(io.BytesIO(), **Arrays)
+            CompressedTime=timeit.default_timer()-StartTime
+        print('Killed training.py after the checkpoint of episode %i of %i'%(Stopped, args.Episodes))
+        print('Checkpoint: %.2f MB compressed in %.2fs, %.2f MB uncompressed in %.2fs'%(os.path.getsize(Checkpoint)/2**20, CompressedTime, Uncompressed.tell()/2**20, UncompressedTime))
+
+        Resumed=subprocess.run([sys.executable, Script, '--Mode', 'resume']+Options, cwd=Directory, capture_output=True, text=True)
+        if Resumed.returncode!=0:
+            sys.exit('training.py --Mode resume failed:\n'+Resumed.stderr[-2000:])
+        Models=sorted(os.listdir(os.path.join(Directory, 'Models')))
+        Episodes=ReadMetrics(os.path.join(Directory, 'Models', 'Model_1', 'Episodes.csv'), ['Episode'])['Episode']
+        Passed=Models==['Model_1'] and Episodes.tolist()==list(range(1, args.Episodes+1)) and os.path.isfile(os.path.join(Directory, 'Models', 'Model_1', 'TrainedModel.h5'))
+        print('Resumed: model folders %s, episodes in Episodes.csv %s'%(Models, Episodes.astype(int).tolist()))
+        print('Round trip '+('passed' if Passed else 'FAILED'))
+        if not Passed:
+            sys.exit(1)
+
+# Episodes simulated per second with NumEnvs workers, as threads like the first ParallelTrainingSimulation vs as the processes it runs now
+# The first round of each is left out, it starts the sumo instances and worker processes
+def BenchScaling(args):
+    import contextlib
+    from concurrent.futures import ThreadPoolExecutor
+    from environment import TraciEnvironment, NumpyEnvironment
+    from model import TrainModel
+    from simulations import TrainingSimulation, ParallelTrainingSimulation
+    from utilities import Memory, TrafficGen
+
+    Directory=tempfile.mkdtemp()
+    NetFile=os.path.join('Junction','Environment.net.xml')
+    if args.Environment=='sumo':
+        Environment=TraciEnvironment(SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps), 'Scaling', NetFile)
+        RouteFile=lambda Name: os.path.join(Directory, Name+'.rou.xml')
+    else:
+        Environment=NumpyEnvironment(NetFile)
+        RouteFile=lambda Name: None
+    Model=TrainModel(args.NumLayers, args.LayerWidth, 100, 0.001, 80, 4, Backend='numpy')
+    Rows=[]
+    Throughputs=[]
+    for NumEnvs in args.NumEnvs:
+        Workers=[TrainingSimulation(Model, Memory(50000, 600), TrafficGen(args.MaxSteps, args.N_Cars, RouteFile('Thread_%i'%Worker)), Environment.Clone('Thread_%i'%Worker), 0.75, args.MaxSteps, 10, 4, 80, 4, 0) for Worker in range(NumEnvs)]
+        Simulation=ParallelTrainingSimulation(Model, Memory(50000, 600), TrafficGen(args.MaxSteps, args.N_Cars, RouteFile('Process')), Environment, 0.75, args.MaxSteps, 10, 4, 80, 4, 0, NumEnvs)
+        Threads=[]
+        Processes=[]
+        with ThreadPoolExecutor(max_workers=NumEnvs) as Pool, contextlib.redirect_stdout(io.StringIO()):
+            for Round in range(args.Rounds+1):
+                Episodes=range(Round*NumEnvs, (Round+1)*NumEnvs)
+                StartTime=timeit.default_timer()
+                list(Pool.map(lambda Worker, Episode: Worker.RunEpisode(Episode, args.Epsilon), Workers, Episodes))
+                Threads.append(timeit.default_timer()-StartTime)
+                StartTime=timeit.default_timer()
+                Simulation.RunTraining(list(Episodes), [args.Epsilon]*NumEnvs)
+                Processes.append(timeit.default_timer()-StartTime)
+        for Worker in Workers:
+            Worker.Environment.Shutdown()
+        Simulation.Pool.shutdown()
+        for Name, Timings in [('Threads', Threads[1:]), ('Processes', Processes[1:])]:
+            Rows.append(('%s, %i workers, per round'%(Name, NumEnvs), Timings))
+            Throughputs.append((Name, NumEnvs, NumEnvs/np.mean(Timings)))
+
+    Report('Parallel episodes (%s, %i cars, %i steps, %i cpus)'%(args.Environment, args.N_Cars, args.MaxSteps, os.cpu_count()), Rows)
+    for Name, NumEnvs, Throughput in Throughputs:
+        Single=[Rate for Other, Workers, Rate in Throughputs if Other==Name and Workers==args.NumEnvs[0]][0]
+        print('%-40s %8.2f episodes/s, %.2fx of %i worker(s)'%('%s, %i workers'%(Name, NumEnvs), Throughput, Throughput/Single, args.NumEnvs[0]))
+
+# Kills sumo partway through a training episode, checks the episode is run again in a new sumo and only its rerun reaches the memory
+def BenchCrash(args):
+    from environment import TraciEnvironment
+    from simulations import TrainingSimulation
+    from utilities import Memory, TrafficGen
+
+    Traffic=TrafficGen(args.MaxSteps, args.N_Cars, os.path.join(tempfile.mkdtemp(), 'EpisodeRoutes.rou.xml'))
+    Environment=TraciEnvironment(SetSumo(False,"SumoConfig.sumocfg",args.MaxSteps), 'Crash')
+    Buffer=Memory(50000, 1)
+    Simulation=TrainingSimulation(None, Buffer, Traffic, Environment, 0.75, args.MaxSteps, 10, 4, 80, 4, 0) # Random actions only, so no model is needed
+    Killed=[]
+    Step=Environment.Step
+    def KillingStep(Steps=1):
+        if not Killed and Environment.Time>=args.KillAt:
+            Killed.append((Environment.Connection._process.pid, Buffer.SizeNow()))
+            Environment.Connection._process.kill()
+            Environment.Connection._process.wait()
+        Step(Steps)
+    Environment.Step=KillingStep
+
+    StartTime=timeit.default_timer()
+    Simulation.RunEpisode(args.Seed, 1.0)
+    EpisodeTime=timeit.default_timer()-StartTime
+    Restarted=Environment.Connection._process.pid
+    Environment.Shutdown()
+
+    Passed=len(Killed)==1 and Killed[0][1]==0 and Restarted!=Killed[0][0] and Simulation.Step>=args.MaxSteps and len(Simulation.RewardStore)==1 and Buffer.SizeNow()>0
+    if Killed:
+        print('Killed sumo (pid %i) at step %i, its episode was run again in sumo pid %i in %.1fs'%(Killed[0][0], args.KillAt, Restarted, EpisodeTime))
+    print('Episode stats recorded %i time(s), %i samples in memory, %i of them from the killed run'%(len(Simulation.RewardStore), Buffer.SizeNow(), Killed[0][1] if Killed else 0))
+    print('Recovery '+('passed' if Passed else 'FAILED'))
+    if not Passed:
+        sys.exit(1)
+
+if __name__=="__main__":
+    Parser=argparse.ArgumentParser()
+    Subparsers=Parser.add_subparsers(dest='Benchmark',required=True)
+
+    Collect=Subparsers.add_parser('collect',help='Vehicle collection through TraCI, polling vs subscriptions')
+    Collect.add_argument('--MaxSteps',type=int,default=5400)
+    Collect.add_argument('--WarmUp',help='Simulation step at which the measurement starts',type=int,default=2800)
+    Collect.add_argument('--Decisions',type=int,default=100)
+    Collect.add_argument('--GreenDuration',type=int,default=10)
+    Collect.set_defaults(Run=BenchCollect)
+
+    Encode=Subparsers.add_parser('encode',help='State vector encoding, if/elif loop vs vectorized encoder')
+    Encode.add_argument('--Cars',type=int,nargs='+',default=[100,1000,10000])
+    Encode.add_argument('--Repeats',type=int,default=50)
+    Encode.set_defaults(Run=BenchEncode)
+
+    Memory=Subparsers.add_parser('memory',help='Replay memory insertion and sampling, list vs ring buffer vs prioritized')
+    Memory.add_argument('--MaxMemorySize',type=int,default=50000)
+    Memory.add_argument('--BatchSize',type=int,default=100)
+    Memory.add_argument('--Repeats',type=int,default=800)
+    Memory.set_defaults(Run=BenchMemory)
+
+    Replay=Subparsers.add_parser('replay',help='Replay epochs, predict/fit vs fused forward pass and compiled train step')
+    Replay.add_argument('--TrainingEpochs',type=int,default=800)
+    Replay.add_argument('--NumLayers',type=int,default=5)
+    Replay.add_argument('--LayerWidth',type=int,default=400)
+    Replay.add_argument('--BatchSize',type=int,default=100)
+    Replay.add_argument('--MaxMemorySize',type=int,default=5000)
+    Replay.set_defaults(Run=BenchReplay)
+
+    Inference=Subparsers.add_parser('inference',help='Single state inference latency of every backend')
+    Inference.add_argument('--Decisions',type=int,default=1000)
+    Inference.add_argument('--NumLayers',type=int,default=5)
+    Inference.add_argument('--LayerWidth',type=int,default=400)
+    Inference.set_defaults(Run=BenchInference)
+
+    Junctions=Subparsers.add_parser('junctions',help='Actions of many junctions per decision, one forward pass each vs one batch')
+    Junctions.add_argument('--Junctions',type=int,nargs='+',default=[1,4,9,16])
+    Junctions.add_argument('--Decisions',type=int,default=200)
+    Junctions.add_argument('--NumLayers',type=int,default=5)
+    Junctions.add_argument('--LayerWidth',type=int,default=400)
+    Junctions.set_defaults(Run=BenchJunctions)
+
+    Export=Subparsers.add_parser('export',help='Cold start, memory and latency of a model through Keras vs exported to the NumPy runtime')
+    Export.add_argument('--Decisions',type=int,default=1000)
+    Export.add_argument('--NumLayers',type=int,default=5)
+    Export.add_argument('--LayerWidth',type=int,default=400)
+    Export.add_argument('--Repeats',type=int,default=3)
+    Export.set_defaults(Run=BenchExport)
+
+    Imports=Subparsers.add_parser('imports',help='Startup and import time of the entry points, measured with python -X importtime')
+    Imports.add_argument('--Scripts',nargs='+',default=['training.py','testing.py','evaluate.py','export.py'])
+    Imports.add_argument('--Repeats',type=int,default=3)
+    Imports.add_argument('--Top',help='Number of slowest top level imports to list',type=int,default=10)
+    Imports.set_defaults(Run=BenchImports)
+
+    Queue=Subparsers.add_parser('queue',help='Step and queue length through TraCI, polling vs edge subscriptions')
+    Queue.add_argument('--MaxSteps',type=int,default=5400)
+    Queue.add_argument('--N_Cars',type=int,default=1000)
+    Queue.add_argument('--Seed',type=int,default=0)
+    Queue.add_argument('--WarmUp',help='Simulation step at which the measurement starts',type=int,default=2800)
+    Queue.add_argument('--Steps',type=int,default=1000)
+    Queue.set_defaults(Run=BenchQueue)
+
+    Stepping=Subparsers.add_parser('stepping',help='Episode simulation through TraCI, one step per call vs one phase per call')
+    Stepping.add_argument('--MaxSteps',type=int,default=5400)
+    Stepping.add_argument('--N_Cars',type=int,default=1000)
+    Stepping.add_argument('--Seed',type=int,default=0)
+    Stepping.add_argument('--GreenDuration',type=int,default=10)
+    Stepping.set_defaults(Run=BenchStepping)
+
+    Startup=Subparsers.add_parser('startup',help='Episode startup through TraCI, new sumo per episode vs traci.load into a persistent one')
+    Startup.add_argument('--MaxSteps',type=int,default=5400)
+    Startup.add_argument('--N_Cars',type=int,default=1000)
+    Startup.add_argument('--Episodes',type=int,default=20)
+    Startup.set_defaults(Run=BenchStartup)
+
+    Environment=Subparsers.add_parser('environment',help='Simulated step cost, sumo vs the NumPy stand-in')
+    Environment.add_argument('--MaxSteps',type=int,default=5400)
+    Environment.add_argument('--N_Cars',type=int,default=1000)
+    Environment.add_argument('--Seed',type=int,default=0)
+    Environment.add_argument('--GreenDuration',type=int,default=10)
+    Environment.add_argument('--NoSumo',help='Only runs the NumPy stand-in, for machines without sumo',action='store_true')
+    Environment.set_defaults(Run=BenchEnvironment)
+
+    Convergence=Subparsers.add_parser('convergence',help='Episodes to reach a delay/queue threshold on the NumPy stand-in, per Q-learning target rule and replay memory')
+    Convergence.add_argument('--Episodes',type=int,default=25)
+    Convergence.add_argument('--MaxSteps',type=int,default=5400)
+    Convergence.add_argument('--N_Cars',type=int,default=1000)
+    Convergence.add_argument('--NumLayers',type=int,default=5)
+    Convergence.add_argument('--LayerWidth',type=int,default=400)
+    Convergence.add_argument('--BatchSize',type=int,default=100)
+    Convergence.add_argument('--MinMemorySize',type=int,default=600)
+    Convergence.add_argument('--TrainingEpochs',type=int,default=800)
+    Convergence.add_argument('--TargetEvery',type=int,default=500)
+    Convergence.add_argument('--Tau',type=float,default=0.005)
+    Convergence.add_argument('--Threshold',help='Fraction of the first episode delay and queue length to reach',type=float,default=0.5)
+    Convergence.add_argument('--Seed',type=int,default=0)
+    Convergence.set_defaults(Run=BenchConvergence)
+
+    Routes=Subparsers.add_parser('routes',help='Episode route generation, per car loop vs vectorized vs scenario bank')
+    Routes.add_argument('--MaxSteps',type=int,default=5400)
+    Routes.add_argument('--N_Cars',type=int,default=1000)
+    Routes.add_argument('--Repeats',type=int,default=50)
+    Routes.set_defaults(Run=BenchRoutes)
+
+    Resume=Subparsers.add_parser('resume',help='Kills training.py once it wrote a checkpoint and resumes it, checks the resumed run and prints the checkpoint size')
+    Resume.add_argument('--Episodes',type=int,default=4)
+    Resume.add_argument('--MaxSteps',type=int,default=1000)
+    Resume.add_argument('--N_Cars',type=int,default=300)
+    Resume.add_argument('--NumLayers',type=int,default=5)
+    Resume.add_argument('--LayerWidth',type=int,default=400)
+    Resume.add_argument('--MinMemorySize',type=int,default=600)
+    Resume.add_argument('--TrainingEpochs',type=int,default=100)
+    Resume.set_defaults(Run=BenchResume)
+
+    Scaling=Subparsers.add_parser('scaling',help='Episodes per second of parallel training workers as threads vs processes, per number of workers')
+    Scaling.add_argument('--NumEnvs',type=int,nargs='+',default=[1,2,4])
+    Scaling.add_argument('--Environment',choices=['numpy','sumo'],default='numpy')
+    Scaling.add_argument('--MaxSteps',type=int,default=5400)
+    Scaling.add_argument('--N_Cars',type=int,default=1000)
+    Scaling.add_argument('--NumLayers',type=int,default=5)
+    Scaling.add_argument('--LayerWidth',type=int,default=400)
+    Scaling.add_argument('--Epsilon',help='Share of random actions, the others run the forward pass',type=float,default=0.5)
+    Scaling.add_argument('--Rounds',type=int,default=3)
+    Scaling.set_defaults(Run=BenchScaling)
+
+    Crash=Subparsers.add_parser('crash',help='Kills sumo during a training episode, checks the episode is run again from its start in a new sumo')
+    Crash.add_argument('--MaxSteps',type=int,default=1000)
+    Crash.add_argument('--N_Cars',type=int,default=300)
+    Crash.add_argument('--KillAt',help='Simulation step at which sumo is killed',type=int,default=500)
+    Crash.add_argument('--Seed',type=int,default=0)
+    Crash.set_defaults(Run=BenchCrash)
+
+    args=Parser.parse_args()
+    args.Run(args)
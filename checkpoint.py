@@ -0,0 +1,101 @@
+# Checkpoints of the whole training state, so a stopped run can be resumed exactly where it stopped
+import json
+import os
+import random
+
+import numpy as np
+
+CheckpointName="Checkpoint.npz"
+
+# Writes the weights, target network, optimizer slots, replay memory and its priorities, random states and stats after the given number of episodes
+# The checkpoint is written next to the old one and moved over it, so a crash while saving never leaves a broken checkpoint
+# It is compressed, the replay memory holds mostly empty cells and shrinks several times
+def SaveCheckpoint(Path, Episode, TotalEpisodes, Model, Memory, Simulation):
+    Arrays={}
+    for i, Weight in enumerate(Model.model.get_weights()):
+        Arrays['Weight_%i'%i]=Weight
+    # The optimizer creates its slots with the first update, they are built empty if memory hasn't filled up yet so they can be restored
+    Optimizer=Model.model.optimizer
+    if not Optimizer.built:
+        Optimizer.build(Model.model.trainable_variables)
+    for i, Variable in enumerate(Optimizer.variables):
+        Arrays['Optimizer_%i'%i]=Variable.numpy()
+    if Model.TargetModel is not None:
+        for i, Weight in enumerate(Model.TargetModel.get_weights()):
+            Arrays['Target_%i'%i]=Weight
+    with Memory.Lock:
+        if Memory.States is not None:
+            Arrays['States']=Memory.States[:Memory.Size]
+            Arrays['Actions']=Memory.Actions[:Memory.Size]
+            Arrays['Rewards']=Memory.Rewards[:Memory.Size]
+            Arrays['NextStates']=Memory.NextStates[:Memory.Size]
+            if hasattr(Memory, 'Priorities'):
+                Arrays['Priorities']=Memory.Priorities.Values(np.arange(Memory.Size))
+        State={
+            'Episode': Episode,
+            'ModelSteps': Model.Steps,
+            'TotalEpisodes': TotalEpisodes,
+            'MemoryNext': Memory.Next,
+            'MemorySize': Memory.Size,
+            'MemoryRandom': Memory.Random.bit_generator.state,
+            'MaxPriority': getattr(Memory, 'MaxPriority', None),
+            'Random': random.getstate(),
+            'EpisodeOffset': Simulation.EpisodeOffset,
+            'RewardStore': Simulation.RewardStore,
+            'TotalWaitStore': Simulation.TotalWaitStore,
+            'AverageQueueLengthStore': Simulation.AverageQueueLengthStore}
+    Arrays['State']=np.array(json.dumps(State, default=lambda Value: Value.item())) # Stats may hold NumPy scalars
+
+    CheckpointFile=os.path.join(Path, CheckpointName)
+    with open(CheckpointFile+'.tmp', 'wb') as File:
+        np.savez_compressed(File, **Arrays)
+        File.flush()
+        os.fsync(File.fileno())
+    os.replace(CheckpointFile+'.tmp', CheckpointFile)
+
+    return CheckpointFile
+
+# Restores the state saved by SaveCheckpoint into a model, memory and simulation built with the same settings
+# Returns the number of episodes done and the total number of episodes of the run
+def LoadCheckpoint(Path, Model, Memory, Simulation):
+    with np.load(os.path.join(Path, CheckpointName)) as Arrays:
+        State=json.loads(str(Arrays['State']))
+        Model.model.set_weights([Arrays['Weight_%i'%i] for i in range(len(Model.model.get_weights()))])
+        if Model.TargetModel is not None:
+            Model.TargetModel.set_weights([Arrays['Target_%i'%i] for i in range(len(Model.TargetModel.get_weights()))])
+        Model.Steps=State.get('ModelSteps', 0)
+
+        # The optimizer creates its slots with the first update, they have to exist before they can be restored
+        Optimizer=Model.model.optimizer
+        if not Optimizer.built:
+            Optimizer.build(Model.model.trainable_variables)
+        for i, Variable in enumerate(Optimizer.variables):
+            Variable.assign(Arrays['Optimizer_%i'%i])
+        Model.Stale=True
+
+        with Memory.Lock:
+            if 'States' in Arrays:
+                Memory.Allocate(Arrays['States'].shape[1])
+                Size=State['MemorySize']
+                Memory.States[:Size]=Arrays['States']
+                Memory.Actions[:Size]=Arrays['Actions']
+                Memory.Rewards[:Size]=Arrays['Rewards']
+                Memory.NextStates[:Size]=Arrays['NextStates']
+                if 'Priorities' in Arrays:
+                    Memory.Priorities.Update(np.arange(Size), Arrays['Priorities'])
+                    Memory.MaxPriority=State['MaxPriority']
+            Memory.Next=State['MemoryNext']
+            Memory.Size=State['MemorySize']
+            Memory.Random.bit_generator.state=State['MemoryRandom']
+
+    Version, InternalState, GaussNext=State['Random']
+    random.setstate((Version, tuple(InternalState), GaussNext))
+    Simulation.RewardStore[:]=State['RewardStore']
+    Simulation.TotalWaitStore[:]=State['TotalWaitStore']
+    Simulation.AverageQueueLengthStore[:]=State['AverageQueueLengthStore']
+    Simulation.EpisodeOffset=State.get('EpisodeOffset', 0)
+    if Simulation.Metrics is not None: # Episodes simulated after the checkpoint are dropped from the metrics file as well, the ones of earlier runs are kept
+        Simulation.Metrics.Reset(Simulation.EpisodeOffset)
+        Simulation.Metrics.Extend(Simulation.EpisodeOffset+np.arange(1, len(Simulation.RewardStore)+1), Simulation.RewardStore, Simulation.TotalWaitStore, Simulation.AverageQueueLengthStore)
+
+    return State['Episode'], State['TotalEpisodes']
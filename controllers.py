@@ -0,0 +1,36 @@
+# Cheap signal controllers that can replace the trained network in TestingSimulation, to benchmark the models against
+import numpy as np
+
+class FixedTimeController:
+    # Cycles every junction through the green phases in order, each one lasting the green duration of the simulation
+    def Reset(self, Seed, NumJunctions):
+        self.Cycle=np.full(NumJunctions, -1)
+
+    def ChooseActions(self, Simulation, Junctions, States):
+        self.Cycle[Junctions]=(self.Cycle[Junctions]+1)%Simulation.NumActions
+        return self.Cycle[Junctions]
+
+class MaxPressureController:
+    # Gives green to the phase with the most cars halting on the lanes it serves
+    # The cars leave the net right after the junction, so there is no queue downstream and the pressure of a phase is its queue
+    def Reset(self, Seed, NumJunctions):
+        pass
+
+    def ChooseActions(self, Simulation, Junctions, States):
+        Layout=Simulation.Junctions
+        Lanes=list(Layout.LaneGroups)
+        Halting=Simulation.Environment.LaneHaltingNumbers(Lanes)
+        Queues=np.bincount([Layout.LaneGroups[Lane] for Lane in Lanes], weights=Halting, minlength=len(Layout)*Layout.NumGroups)
+        Queues=Queues.reshape(len(Layout), Layout.NumGroups)[Junctions]
+        Served=Layout.PhaseGroups[Junctions[:, None], Layout.GreenPhases[Junctions, :Simulation.NumActions]] # (Junction, Action, Group), from each junction's own green phases
+        return np.argmax((Served*Queues[:, None, :]).sum(axis=2), axis=1)
+
+class RandomController:
+    # Picks a green phase uniformly at random, seeded with the episode so every run on a seed is the same
+    def Reset(self, Seed, NumJunctions):
+        self.Random=np.random.RandomState(Seed)
+
+    def ChooseActions(self, Simulation, Junctions, States):
+        return self.Random.randint(Simulation.NumActions, size=len(Junctions))
+
+Controllers={'fixed': FixedTimeController, 'maxpressure': MaxPressureController, 'random': RandomController}
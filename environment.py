@@ -0,0 +1,444 @@
+# Environments the simulations run in: sumo through TraCI, or a NumPy stand-in of the same junction
+import atexit
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import sumolib
+import traci
+import traci.constants as tc
+
+# Vehicle variables needed by GetState and CollectWaitingTimes
+VehicleVariables=[tc.VAR_LANE_ID, tc.VAR_LANEPOSITION, tc.VAR_ROAD_ID, tc.VAR_ACCUMULATED_WAITING_TIME]
+
+class JunctionLayout:
+    # The traffic lights of a net and the lanes leading into each of them, read with sumolib
+    # The roads into a junction are taken clockwise starting from the west, each one giving 2 lane groups:
+    # its rightmost lanes, and its leftmost lane as the 'left-only' turn, which is the layout of the original junction
+    # Lane groups every action gives green in that layout: north-south, north-south left turns, east-west, east-west left turns
+    ActionGroups=[[2, 6], [3, 7], [0, 4], [1, 5]]
+
+    def __init__(self, NetFile, JunctionIDs=None):
+        Net=sumolib.net.readNet(NetFile, withPrograms=True)
+        Lights=[Light for Light in Net.getTrafficLights() if JunctionIDs is None or Light.getID() in JunctionIDs]
+        if not Lights:
+            raise ValueError("No traffic lights %sin %s"%("" if JunctionIDs is None else "named %s "%", ".join(JunctionIDs), NetFile))
+        self.IDs=[Light.getID() for Light in Lights]
+        Approaches=[sorted(Light.getEdges(), key=self.Bearing) for Light in Lights]
+        self.Nodes=[Edges[0].getToNode().getID() for Edges in Approaches] # The junction the light stands at
+
+        self.NumGroups=2*max(len(Edges) for Edges in Approaches) # Junctions with fewer roads leave the groups of the missing ones empty
+        self.IncomingEdges=[]
+        self.EdgeJunctions={} # Index of the junction every incoming edge leads into
+        self.LaneGroups={} # Lane group of every incoming lane, numbered across all junctions
+        self.GroupLengths=np.zeros(len(Lights)*self.NumGroups)
+        for Junction, Edges in enumerate(Approaches):
+            for Approach, Edge in enumerate(Edges):
+                self.IncomingEdges.append(Edge.getID())
+                self.EdgeJunctions[Edge.getID()]=Junction
+                Group=Junction*self.NumGroups+2*Approach
+                self.GroupLengths[Group:Group+2]=Edge.getLength()
+                Lanes=Edge.getLanes()
+                for Lane in Lanes:
+                    self.LaneGroups[Lane.getID()]=Group+1 if len(Lanes)>1 and Lane.getIndex()==len(Lanes)-1 else Group
+
+        # Lane groups every phase of every junction's program lets drive on, a group being green when any link of its lanes is
+        Phases=[list(Light.getPrograms().values())[0].getPhases() for Light in Lights]
+        self.PhaseGroups=np.zeros((len(Lights), max(len(Program) for Program in Phases), self.NumGroups), dtype=bool)
+        for Junction, (Light, Program) in enumerate(zip(Lights, Phases)):
+            for Lane, _, Link in Light.getConnections():
+                Group=self.LaneGroups[Lane.getID()]-Junction*self.NumGroups
+                for Phase, State in enumerate(Program):
+                    self.PhaseGroups[Junction, Phase, Group]|=State.state[Link] in 'Gg'
+
+        # Green phase of every action at every junction, the one whose lane groups match the action's the closest, which gives the
+        # original junction its phases 0, 2, 4 and 6, and has actions share a phase at junctions with fewer green phases
+        # The yellow phase of an action is the one after its green phase, -1 if the program goes on without yellow
+        self.GreenPhases=np.zeros((len(Lights), len(self.ActionGroups)), dtype=np.int64)
+        self.YellowPhases=np.full((len(Lights), len(self.ActionGroups)), -1, dtype=np.int64)
+        for Junction, Program in enumerate(Phases):
+            Greens=[Phase for Phase, State in enumerate(Program) if 'y' not in State.state and self.PhaseGroups[Junction, Phase].any()]
+            if not Greens:
+                raise ValueError("The program of traffic light %s has no green phase to give its actions"%self.IDs[Junction])
+            for Action, Groups in enumerate(self.ActionGroups):
+                Wanted=np.isin(np.arange(self.NumGroups), Groups)
+                Served=self.PhaseGroups[Junction, Greens]
+                Match=(Served&Wanted).sum(axis=1)/(Served|Wanted).sum(axis=1)
+                Green=Greens[int(np.argmax(Match))]
+                self.GreenPhases[Junction, Action]=Green
+                if 'y' in Program[(Green+1)%len(Program)].state:
+                    self.YellowPhases[Junction, Action]=(Green+1)%len(Program)
+
+        # One context subscription around the junction nearest the middle, reaching the far end of every incoming road, sees every car only once
+        Positions=np.array([Edges[0].getToNode().getCoord()[:2] for Edges in Approaches])
+        Starts=np.array([Edge.getFromNode().getCoord()[:2] for Edges in Approaches for Edge in Edges])
+        Center=np.argmin(np.linalg.norm(Positions-Positions.mean(axis=0), axis=1))
+        self.Center=self.Nodes[Center]
+        self.Range=float(np.linalg.norm(Starts-Positions[Center], axis=1).max())+250
+
+    # Where an incoming edge comes from, as the clockwise angle from the west seen from the junction
+    @staticmethod
+    def Bearing(Edge):
+        Shape=Edge.getLanes()[0].getShape()
+        Angle=np.degrees(np.arctan2(Shape[-2][1]-Shape[-1][1], Shape[-2][0]-Shape[-1][0]))
+        return (180-Angle)%360
+
+    # Whether each junction goes through yellow from its old action to its new one: not on its first decision,
+    # not when both actions share a green phase, and not when its program has no yellow after the old green phase
+    def Yellows(self, Junctions, OldActions, Actions):
+        return (OldActions>=0) & (self.GreenPhases[Junctions, OldActions]!=self.GreenPhases[Junctions, Actions]) & (self.YellowPhases[Junctions, OldActions]>=0)
+
+    def __len__(self):
+        return len(self.IDs)
+
+class VehicleCollector:
+    # Fetches the vehicle variables of every car around the junction in one bulk TraCI response per step
+    def __init__(self, JunctionID="TL", Range=1000):
+        self.JunctionID=JunctionID
+        self.Range=Range # Has to reach the far end of the 750m incoming roads
+        self.Reset()
+
+    # Has to be called at the start of every episode, since the step counter starts over
+    def Reset(self, Connection=traci):
+        self.Connection=Connection
+        self.Time=None
+        self.Vehicles={}
+
+    # Returns {CarID: {Variable: Value}} for the given step, GetState and CollectWaitingTimes share one round-trip
+    def Collect(self, Time):
+        if Time!=self.Time:
+            # The subscription only spans the current step, so sumo doesn't keep evaluating it during Simulate
+            self.Connection.junction.subscribeContext(self.JunctionID, tc.CMD_GET_VEHICLE_VARIABLE, self.Range, VehicleVariables, begin=Time, end=Time)
+            self.Vehicles=self.Connection.junction.getContextSubscriptionResults(self.JunctionID) or {}
+            self.Time=Time
+        return self.Vehicles
+
+class PollingCollector(VehicleCollector):
+    # Asks sumo for every variable of every car separately, kept as a reference for benchmarking
+    def Collect(self, Time):
+        Vehicles={}
+        for CarID in self.Connection.vehicle.getIDList():
+            Vehicles[CarID]={
+                tc.VAR_LANE_ID: self.Connection.vehicle.getLaneID(CarID),
+                tc.VAR_LANEPOSITION: self.Connection.vehicle.getLanePosition(CarID),
+                tc.VAR_ROAD_ID: self.Connection.vehicle.getRoadID(CarID),
+                tc.VAR_ACCUMULATED_WAITING_TIME: self.Connection.vehicle.getAccumulatedWaitingTime(CarID)}
+        return Vehicles
+
+# Starts sumo and returns its TraCI connection, starts are serialized so parallel workers don't race for a free port
+StartLock=threading.Lock()
+def StartSumo(SumoCmd, Label):
+    with StartLock:
+        traci.start(SumoCmd, label=Label, doSwitch=False)
+        return traci.getConnection(Label)
+
+class TraciEnvironment:
+    # Runs the episode in sumo, every instance running at the same time needs its own label
+    # With QueueEdges sumo records the cars halting on those edges after every step, so several steps can be simulated in one call
+    # A persistent environment keeps its sumo running between episodes and loads every new episode into it
+    # Every traffic light of the net file, which has to be the net sumo runs, is controlled
+    def __init__(self, Sumo, Label="default", NetFile=os.path.join("Junction","Environment.net.xml"), QueueEdges=None, Persistent=True):
+        self.Sumo=Sumo
+        self.Label=Label
+        self.NetFile=NetFile
+        self.Junctions=JunctionLayout(NetFile)
+        self.QueueEdges=QueueEdges
+        self.Persistent=Persistent
+        self.Connection=None
+        self.Collector=VehicleCollector(self.Junctions.Center, self.Junctions.Range)
+        if Persistent:
+            atexit.register(self.Shutdown) # Lets sumo quit cleanly along with the program
+        if QueueEdges is not None:
+            self.QueueDirectory=tempfile.TemporaryDirectory(prefix="Queue_") # Removed at Shutdown, or once the environment is gone
+            self.WriteQueueOutput(self.QueueDirectory.name)
+
+    # A new environment of the same kind for a parallel worker
+    def Clone(self, Label):
+        return TraciEnvironment(self.Sumo, Label, self.NetFile, self.QueueEdges, self.Persistent)
+
+    # Pickled as its settings, so a worker process gets an environment of its own with no sumo running yet
+    def __reduce__(self):
+        return TraciEnvironment, (self.Sumo, self.Label, self.NetFile, self.QueueEdges, self.Persistent)
+
+    # Additional file asking sumo for the waiting time on the queue edges over every single step, which is the number of halting cars
+    def WriteQueueOutput(self, Directory):
+        self.QueueFile=os.path.join(Directory, "Queue.xml")
+        self.AdditionalFile=os.path.join(Directory, "Queue.add.xml")
+        with open(self.AdditionalFile, "w") as Additional:
+            Additional.write('<additional>\n    <edgeData id="Queue" file="%s" period="1" edges="%s" excludeEmpty="true"/>\n</additional>\n' % (self.QueueFile, " ".join(self.QueueEdges)))
+
+    # Starts sumo on the route file TrafficGen wrote for the episode
+    def Start(self, Traffic):
+        SumoCmd=self.Sumo+["--route-files", Traffic.RouteFile]
+        if self.QueueEdges is not None:
+            SumoCmd+=["--additional-files", self.AdditionalFile]
+        self.Load(SumoCmd)
+        self.Collector.Reset(self.Connection)
+        self.HaltingEdges=set()
+        self.HaltingLanes=set()
+        self.Time=0
+
+    # Loads the episode into the running sumo, which skips starting the process and connecting to it, or starts a new sumo
+    def Load(self, SumoCmd):
+        if self.Persistent and self.Connection is not None:
+            try:
+                self.Connection.load(SumoCmd[1:])
+                return
+            except traci.exceptions.FatalTraCIError: # Sumo crashed or quit since the last episode, so it is started again
+                self.Disconnect()
+        self.Connection=StartSumo(SumoCmd, self.Label)
+
+    # Simulates the given number of steps, more than 1 in a single call
+    def Step(self, Steps=1):
+        self.Time+=Steps
+        if Steps==1:
+            self.Connection.simulationStep()
+        else:
+            self.Connection.simulationStep(float(self.Time))
+
+    def SetPhase(self, JunctionID, Phase):
+        self.Connection.trafficlight.setPhase(JunctionID, Phase)
+
+    # Number of cars with no speed on each of the given edges
+    # The edges are subscribed on first use, from then on sumo sends their numbers back with every step response
+    def HaltingNumbers(self, EdgeIDs):
+        for EdgeID in EdgeIDs:
+            if EdgeID not in self.HaltingEdges:
+                self.Connection.edge.subscribe(EdgeID, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER])
+                self.HaltingEdges.add(EdgeID)
+        Results=self.Connection.edge.getAllSubscriptionResults()
+        return [Results[EdgeID][tc.LAST_STEP_VEHICLE_HALTING_NUMBER] for EdgeID in EdgeIDs]
+
+    # Number of cars with no speed on each of the given lanes, subscribed on first use like the edges
+    def LaneHaltingNumbers(self, LaneIDs):
+        for LaneID in LaneIDs:
+            if LaneID not in self.HaltingLanes:
+                self.Connection.lane.subscribe(LaneID, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER])
+                self.HaltingLanes.add(LaneID)
+        Results=self.Connection.lane.getAllSubscriptionResults()
+        return [Results[LaneID][tc.LAST_STEP_VEHICLE_HALTING_NUMBER] for LaneID in LaneIDs]
+
+    # Returns {CarID: {Variable: Value}} for every car around the junctions
+    def Vehicles(self, Time):
+        return self.Collector.Collect(Time)
+
+    # Ends the episode, a persistent sumo is left running for the next one and quits along with the program
+    def Close(self):
+        if not self.Persistent:
+            self.Disconnect()
+
+    def Disconnect(self):
+        if self.Connection is None:
+            return
+        try:
+            self.Connection.close()
+        except traci.exceptions.FatalTraCIError:
+            pass
+        self.Connection=None
+
+    # Quits sumo for good and removes its queue output, the environment can't be used afterwards
+    def Shutdown(self):
+        self.Disconnect()
+        if self.QueueEdges is not None:
+            self.QueueDirectory.cleanup()
+
+    # Cars halting on the QueueEdges after each of the first Steps steps, read from sumo's output once the episode is closed
+    # Sumo writes every interval as soon as it ends, so the output of a persistent sumo can be read before its root element is closed
+    def QueueLengths(self, Steps):
+        Queue=np.zeros(Steps, dtype=np.int64)
+        Parser=ET.XMLPullParser(['end'])
+        with open(self.QueueFile) as Output:
+            Parser.feed(Output.read())
+        for _, Interval in Parser.read_events():
+            if Interval.tag!='interval':
+                continue
+            Step=int(float(Interval.get('begin'))) # The interval starting at a step ends with the step after it
+            if Step<Steps:
+                Queue[Step]=round(sum(float(Edge.get('waitingTime', 0)) for Edge in Interval.iter('edge')))
+        return Queue
+
+class NumpyEnvironment:
+    # Vectorized stand-in for sumo on the junction of the net file, cars follow their leader and stop at the stop line on red
+    Length=5.0 # Same vehicle type as the routes generated by TrafficGen
+    MinGap=2.5
+    Accel=1.0
+    HaltingSpeed=0.1 # Speed below which sumo counts a car as halting and waiting
+
+    # With QueueEdges the cars halting on those edges are recorded after every step, like TraciEnvironment does
+    # Only the one junction is simulated, cars leave the network once they have crossed it
+    def __init__(self, NetFile, JunctionID="TL", Seed=0, QueueEdges=None):
+        self.NetFile=NetFile
+        self.JunctionID=JunctionID
+        self.Junctions=JunctionLayout(NetFile, [JunctionID])
+        self.Seed=Seed
+        self.QueueEdges=QueueEdges
+        self.ReadNet(NetFile)
+
+    # A new environment of the same kind for a parallel worker
+    def Clone(self, Label):
+        return NumpyEnvironment(self.NetFile, self.JunctionID, self.Seed, self.QueueEdges)
+
+    # Reads the lanes around the junction, which incoming lane leads to which outgoing lane, and the traffic light phases
+    def ReadNet(self, NetFile):
+        Net=ET.parse(NetFile).getroot()
+        self.LaneIDs=[]
+        self.EdgeIDs=[]
+        EdgeIncoming=[]
+        LaneEdges=[]
+        LaneLengths=[]
+        LaneSpeeds=[]
+        for Edge in Net.iter('edge'):
+            if Edge.get('function')=='internal' or self.JunctionID not in (Edge.get('from'), Edge.get('to')):
+                continue
+            self.EdgeIDs.append(Edge.get('id'))
+            EdgeIncoming.append(Edge.get('to')==self.JunctionID)
+            for Lane in Edge.iter('lane'):
+                self.LaneIDs.append(Lane.get('id'))
+                LaneEdges.append(len(self.EdgeIDs)-1)
+                LaneLengths.append(float(Lane.get('length')))
+                LaneSpeeds.append(float(Lane.get('speed')))
+        self.LaneEdges=np.array(LaneEdges)
+        self.EdgeIndex={EdgeID: i for i, EdgeID in enumerate(self.EdgeIDs)}
+        self.LaneIndex={LaneID: i for i, LaneID in enumerate(self.LaneIDs)}
+        self.LaneNumbers=np.array([int(LaneID.rsplit('_',1)[1]) for LaneID in self.LaneIDs]) # Index of every lane within its edge
+        self.LaneLengths=np.array(LaneLengths)
+        self.LaneSpeeds=np.array(LaneSpeeds)
+        self.Incoming=np.array(EdgeIncoming)[self.LaneEdges] # Whether each lane leads into the junction
+
+        # Lanes a car can take from an incoming edge to an outgoing edge, with the lane it ends up on and its signal
+        self.Links={}
+        LaneLinks=[[] for _ in self.LaneIDs]
+        for Connection in Net.iter('connection'):
+            if Connection.get('tl')!=self.JunctionID:
+                continue
+            FromLane=self.LaneIndex[Connection.get('from')+'_'+Connection.get('fromLane')]
+            ToLane=self.LaneIndex[Connection.get('to')+'_'+Connection.get('toLane')]
+            self.Links.setdefault((Connection.get('from'), Connection.get('to')), []).append((FromLane, ToLane))
+            LaneLinks[FromLane].append(int(Connection.get('linkIndex')))
+
+        # A lane may drive on in a phase when any of its links is green
+        States=[Phase.get('state') for Logic in Net.iter('tlLogic') if Logic.get('id')==self.JunctionID for Phase in Logic.iter('phase')]
+        self.PhaseGreen=np.array([[any(State[Link] in 'Gg' for Link in Links) for Links in LaneLinks] for State in States])
+
+    # Takes the cars TrafficGen generated for the episode straight from memory, on their departure lane or else a random lane that leads to the road they want to take
+    def Start(self, Traffic):
+        Random=np.random.RandomState(self.Seed)
+        self.IDs=np.array(Traffic.IDs, dtype=object)
+        self.Departs=np.asarray(Traffic.Departs, dtype=float)
+        self.Lane=np.zeros(len(self.IDs), dtype=np.int64)
+        self.ToLane=np.zeros(len(self.IDs), dtype=np.int64)
+        for Route in np.unique(Traffic.Routes):
+            Cars=np.flatnonzero(Traffic.Routes==Route)
+            Links=np.array(self.Links[Traffic.RouteEdges[Route]])
+            Choice=Random.randint(len(Links), size=len(Cars))
+            LinkOfLane=np.full(len(self.LaneIDs), -1) # Which link starts on each lane number of the incoming edge
+            LinkOfLane[self.LaneNumbers[Links[:,0]]]=np.arange(len(Links))
+            Given=Traffic.Lanes[Cars]>=0
+            Choice[Given]=LinkOfLane[Traffic.Lanes[Cars][Given]]
+            if (Choice<0).any():
+                raise ValueError("Route %s can't be taken from lane %s"%(Route, Traffic.Lanes[Cars][Choice<0][0]))
+            self.Lane[Cars], self.ToLane[Cars]=Links[Choice].T
+        self.DepartSpeeds=np.full(len(self.IDs), 10.0) # departSpeed of the generated routes
+        self.Position=np.zeros(len(self.IDs)) # Position of the front of the car along its lane
+        self.Speed=np.zeros(len(self.IDs))
+        self.Waiting=np.zeros(len(self.IDs))
+        self.Status=np.zeros(len(self.IDs), dtype=np.int8) # 0 waiting to depart, 1 driving, 2 arrived
+        self.Time=0
+        self.Phase=0
+        self.Queue=[]
+
+    # Simulates the given number of steps
+    def Step(self, Steps=1):
+        for _ in range(Steps):
+            self.Advance()
+            if self.QueueEdges is not None:
+                self.Queue.append(sum(self.HaltingNumbers(self.QueueEdges)))
+
+    # Simulates 1 step, all cars at once
+    def Advance(self):
+        self.Time+=1
+        self.Insert()
+
+        Driving=np.flatnonzero(self.Status==1)
+        Order=Driving[np.lexsort((self.Position[Driving], self.Lane[Driving]))] # By lane, then from the back of the queue to the front
+        Lanes=self.Lane[Order]
+        Positions=self.Position[Order]
+
+        # Space to the car ahead on the same lane, or to the stop line for the first car of a lane facing red
+        Gaps=np.full(len(Order), np.inf)
+        SameLane=Lanes[1:]==Lanes[:-1]
+        Gaps[:-1][SameLane]=Positions[1:][SameLane]-self.Length-self.MinGap-Positions[:-1][SameLane]
+        First=np.append(~SameLane, True)
+        Stopping=First & self.Incoming[Lanes] & ~self.PhaseGreen[self.Phase][Lanes]
+        Gaps[Stopping]=self.LaneLengths[Lanes[Stopping]]-Positions[Stopping]
+
+        Speeds=np.minimum(np.minimum(self.Speed[Order]+self.Accel, self.LaneSpeeds[Lanes]), np.maximum(Gaps, 0))
+        self.Speed[Order]=Speeds
+        self.Position[Order]=Positions+Speeds
+        self.Waiting[Order]+=Speeds<self.HaltingSpeed
+
+        # Cars past the end of their lane cross the junction onto their outgoing lane, or leave the network
+        Past=Order[self.Position[Order]>self.LaneLengths[Lanes]]
+        Crossing=Past[self.Incoming[self.Lane[Past]]]
+        Leaving=Past[~self.Incoming[self.Lane[Past]]]
+        self.Position[Crossing]-=self.LaneLengths[self.Lane[Crossing]]
+        self.Lane[Crossing]=self.ToLane[Crossing]
+        self.Status[Leaving]=2
+
+    # Inserts cars that are due at the start of their lane, at most one per lane and step, when there is space
+    def Insert(self):
+        Due=np.flatnonzero((self.Status==0) & (self.Departs<=self.Time))
+        if len(Due)==0:
+            return
+        _, First=np.unique(self.Lane[Due], return_index=True) # Cars are in order of departure
+        Due=Due[First]
+
+        Driving=self.Status==1
+        Rear=np.full(len(self.LaneIDs), np.inf) # Position of the back of the last car on every lane
+        np.minimum.at(Rear, self.Lane[Driving], self.Position[Driving]-self.Length)
+        Space=Rear[self.Lane[Due]]-self.MinGap-self.Length
+        Due, Space=Due[Space>=0], Space[Space>=0]
+
+        self.Status[Due]=1
+        self.Position[Due]=self.Length
+        self.Speed[Due]=np.minimum(self.DepartSpeeds[Due], Space)
+
+    def SetPhase(self, JunctionID, Phase):
+        self.Phase=Phase
+
+    # Number of cars with no speed on each of the given edges
+    def HaltingNumbers(self, EdgeIDs):
+        Halting=(self.Status==1) & (self.Speed<self.HaltingSpeed)
+        Counts=np.bincount(self.LaneEdges[self.Lane[Halting]], minlength=len(self.EdgeIDs))
+        return [int(Counts[self.EdgeIndex[EdgeID]]) for EdgeID in EdgeIDs]
+
+    # Number of cars with no speed on each of the given lanes
+    def LaneHaltingNumbers(self, LaneIDs):
+        Halting=(self.Status==1) & (self.Speed<self.HaltingSpeed)
+        Counts=np.bincount(self.Lane[Halting], minlength=len(self.LaneIDs))
+        return [int(Counts[self.LaneIndex[LaneID]]) for LaneID in LaneIDs]
+
+    # Returns {CarID: {Variable: Value}} for every car in the network, in the same form as the TraCI subscription
+    def Vehicles(self, Time):
+        Driving=np.flatnonzero(self.Status==1)
+        Lanes=self.Lane[Driving]
+        return {CarID: {
+                    tc.VAR_LANE_ID: self.LaneIDs[Lane],
+                    tc.VAR_LANEPOSITION: Position,
+                    tc.VAR_ROAD_ID: self.EdgeIDs[Edge],
+                    tc.VAR_ACCUMULATED_WAITING_TIME: Waiting}
+                for CarID, Lane, Edge, Position, Waiting in zip(self.IDs[Driving], Lanes.tolist(), self.LaneEdges[Lanes].tolist(), self.Position[Driving].tolist(), self.Waiting[Driving].tolist())}
+
+    def Close(self):
+        pass
+
+    def Shutdown(self):
+        pass
+
+    # Cars halting on the QueueEdges after each of the first Steps steps
+    def QueueLengths(self, Steps):
+        Queue=np.zeros(Steps, dtype=np.int64)
+        Queue[:min(Steps, len(self.Queue))]=self.Queue[:Steps]
+        return Queue
@@ -0,0 +1,180 @@
+# Evaluates trained models and baseline controllers on many seeds at once, one simulation per worker process, and compares them in one table
+# Results are cached by model, seed and settings, so a rerun only simulates the runs that are missing
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from controllers import Controllers
+from environment import TraciEnvironment, NumpyEnvironment, JunctionLayout
+from model import TestModel, Backends
+from simulations import TestingSimulation
+from utilities import SetSumo, TrafficGen, ScenarioBank, ImportSettings
+
+CacheName="Evaluation.json"
+
+# Columns of the comparison table, each one computed from a testing episode
+Metrics=['Delay', 'MeanQueue', 'P95Queue', 'Reward']
+
+def parse_args():
+    Parser=argparse.ArgumentParser(description=__doc__)
+    Parser.add_argument('--Models',help='Model folders to evaluate, every folder in Models with a trained model by default',nargs='+')
+    Parser.add_argument('--Baselines',help='Controllers to score the models against, on the settings of the first model',nargs='*',choices=list(Controllers),default=list(Controllers))
+    Parser.add_argument('--Seeds',help='First and last seed of the traffic to test on',type=int,nargs=2,default=[1000,1019])
+    Parser.add_argument('--Workers',help='Number of processes, each one running its own sumo',type=int,default=os.cpu_count())
+    Parser.add_argument('--Environment',help='Simulate in sumo, or in the much faster NumPy stand-in of the junction (no sumo needed)',choices=['sumo','numpy'],default='sumo')
+    Parser.add_argument('--StepPhases',help='Simulates every green/yellow phase in one call, the queue length of every step is read from the environment at the end of the episode',action='store_true')
+    Parser.add_argument('--ScenarioBank',help='Scenario bank made by scenarios.py to take the traffic from, instead of generating it')
+    Parser.add_argument('--Backend',help='How the Model picks an action from a single state',choices=Backends,default='function')
+    Parser.add_argument('--Cache',help='File the results of every run are kept in',default=os.path.join('Models',CacheName))
+    Parser.add_argument('--Confidence',help='Level of the bootstrap confidence intervals',type=float,default=0.95)
+
+    return Parser.parse_args()
+
+# Every folder of Models with a trained model and its settings
+def TrainedModels(ModelsPath="Models"):
+    Folders=[os.path.join(ModelsPath, Name) for Name in sorted(os.listdir(ModelsPath))]
+    return [Folder for Folder in Folders if os.path.isfile(os.path.join(Folder, 'TrainedModel.h5')) and os.path.isfile(os.path.join(Folder, 'Settings.ini'))]
+
+# Hash of the weights of a model, so a retrained model is evaluated again even though its folder is the same
+# A baseline controller has no weights and is known by its name
+def ModelHash(ModelPath):
+    if ModelPath in Controllers:
+        return 'Baseline_'+ModelPath
+    Hash=hashlib.sha256()
+    with open(os.path.join(ModelPath, 'TrainedModel.h5'), 'rb') as File:
+        for Block in iter(lambda: File.read(1<<20), b''):
+            Hash.update(Block)
+    return Hash.hexdigest()
+
+# Everything besides the model and the seed that changes the outcome of a run, the traffic depends on maxsteps, n_cars and weibulldepartures
+def RunSettings(Config, args):
+    Settings={Name: Config[Name] for Name in ('maxsteps', 'n_cars', 'weibulldepartures', 'greenduration', 'yellowduration', 'numstates', 'numactions')}
+    Settings.update(Environment=args.Environment, StepPhases=args.StepPhases, Backend=args.Backend)
+    if args.ScenarioBank:
+        Settings['ScenarioBank']=os.path.getsize(args.ScenarioBank), os.path.getmtime(args.ScenarioBank)
+    return Settings
+
+def CacheKey(Hash, Seed, Settings):
+    return '%s/%i/%s'%(Hash, Seed, hashlib.sha256(json.dumps(Settings, sort_keys=True).encode()).hexdigest()[:16])
+
+def LoadCache(CacheFile):
+    if os.path.isfile(CacheFile):
+        with open(CacheFile) as File:
+            return json.load(File)
+    return {}
+
+# The cache is written next to the old one and moved over it, so a crash never leaves a broken cache
+def SaveCache(CacheFile, Cache):
+    with open(CacheFile+'.tmp', 'w') as File:
+        json.dump(Cache, File, indent=1, sort_keys=True)
+    os.replace(CacheFile+'.tmp', CacheFile)
+
+# Environment, traffic and models of a worker process, kept between its runs so sumo and every model are only set up once
+WorkerState={}
+
+# Runs one testing episode of a model or a baseline controller in a worker process, returns its metrics
+def Evaluate(ModelPath, Seed, Config, args):
+    if 'Environment' not in WorkerState:
+        NetFile=os.path.join("Junction","Environment.net.xml")
+        QueueEdges=JunctionLayout(NetFile).IncomingEdges if args.StepPhases else None
+        if args.Environment=='sumo':
+            WorkerState['Environment']=TraciEnvironment(SetSumo(False,"SumoConfig.sumocfg",Config['maxsteps']),"Evaluate_"+str(os.getpid()),NetFile,QueueEdges)
+        else:
+            WorkerState['Environment']=NumpyEnvironment(NetFile,QueueEdges=QueueEdges)
+        WorkerState['Bank']=ScenarioBank(args.ScenarioBank) if args.ScenarioBank else None
+        WorkerState['Models']={}
+    if ModelPath in Controllers:
+        Model, Controller=None, Controllers[ModelPath]()
+    else:
+        if ModelPath not in WorkerState['Models']:
+            WorkerState['Models'][ModelPath]=TestModel(Config['numstates'],ModelPath,args.Backend)
+        Model, Controller=WorkerState['Models'][ModelPath], None
+
+    # Every worker writes its own route file
+    RouteFile=os.path.join(tempfile.gettempdir(),"EvaluationRoutes_"+str(os.getpid())+".rou.xml") if args.Environment=='sumo' else None
+    Traffic=TrafficGen(Config['maxsteps'],Config['n_cars'],RouteFile,WorkerState['Bank'],Config['weibulldepartures'])
+    Simulation=TestingSimulation(Model,Traffic,WorkerState['Environment'],Config['maxsteps'],Config['greenduration'],Config['yellowduration'],Config['numstates'],Config['numactions'],Controller=Controller)
+    Simulation.RunTesting(Seed)
+
+    Queue=Simulation.EpisodeQueueLength
+    Rewards=np.array(Simulation.EpisodeReward)
+    return {
+        'Delay': int(Queue.sum()), # Every car in the queue waits 1 second per step
+        'MeanQueue': float(Queue.mean()),
+        'P95Queue': float(np.percentile(Queue, 95)),
+        'Reward': float(Rewards[Rewards<0].sum())}
+
+# Mean of the values and its bootstrap confidence interval, the resampling is seeded so a table always comes out the same
+def ConfidenceInterval(Values, Confidence, Resamples=10000):
+    Values=np.asarray(Values, dtype=np.float64)
+    if len(Values)<2:
+        return Values.mean(), Values.mean(), Values.mean()
+    Means=np.random.default_rng(0).choice(Values, (Resamples, len(Values))).mean(axis=1)
+    Low, High=np.percentile(Means, [50*(1-Confidence), 50*(1+Confidence)])
+    return Values.mean(), Low, High
+
+# Table of every model and baseline, then how the delay of every model compares to that of the best baseline
+def Report(Results, Confidence, Baselines=()):
+    print('\n=============== Evaluation (mean [%i%% confidence interval]) ==============='%round(100*Confidence))
+    Header='%-24s %6s'%('Model', 'Seeds')+''.join(' %30s'%Metric for Metric in Metrics)
+    print(Header)
+    for ModelPath, Runs in Results.items():
+        Cells=[]
+        for Metric in Metrics:
+            Mean, Low, High=ConfidenceInterval([Run[Metric] for Run in Runs], Confidence)
+            Cells.append(' %30s'%('%.1f [%.1f, %.1f]'%(Mean, Low, High)))
+        print('%-24s %6i'%(os.path.basename(os.path.normpath(ModelPath)), len(Runs))+''.join(Cells))
+    print('='*len(Header))
+    if Baselines:
+        Delays={ModelPath: np.mean([Run['Delay'] for Run in Runs]) for ModelPath, Runs in Results.items()}
+        Best=min(Baselines, key=Delays.get)
+        for ModelPath in Results:
+            if ModelPath not in Baselines:
+                print('%-24s %+.1f%% delay against %s, the best baseline'%(os.path.basename(os.path.normpath(ModelPath)), 100*(Delays[ModelPath]/Delays[Best]-1), Best))
+
+if __name__=="__main__":
+    args=parse_args()
+    ModelPaths=args.Models or TrainedModels()
+    Seeds=range(args.Seeds[0], args.Seeds[1]+1)
+    Cache=LoadCache(args.Cache)
+
+    # Runs that are not in the cache yet
+    Configs={}
+    Keys={}
+    Missing=[]
+    for ModelPath in ModelPaths:
+        Configs[ModelPath]=ImportSettings(os.path.join(ModelPath,"Settings.ini"))
+    # The baselines run on the same traffic as the first model
+    for Baseline in args.Baselines:
+        Configs[Baseline]=Configs[ModelPaths[0]]
+    for ModelPath in ModelPaths[1:]:
+        if any(Configs[ModelPath][Name]!=Configs[ModelPaths[0]][Name] for Name in ('maxsteps', 'n_cars', 'weibulldepartures')):
+            print('Warning:', ModelPath, 'was trained on other traffic than', ModelPaths[0], 'which the baselines run on')
+    ModelPaths=ModelPaths+args.Baselines
+    for ModelPath in ModelPaths:
+        Hash=ModelHash(ModelPath)
+        Settings=RunSettings(Configs[ModelPath], args)
+        for Seed in Seeds:
+            Keys[ModelPath, Seed]=CacheKey(Hash, Seed, Settings)
+            if Keys[ModelPath, Seed] not in Cache:
+                Missing.append((ModelPath, Seed))
+    print(len(Keys)-len(Missing), 'of', len(Keys), 'runs are cached,', len(Missing), 'to simulate')
+
+    # Workers are spawned rather than forked, TensorFlow and sumo connections don't survive a fork
+    if Missing:
+        with ProcessPoolExecutor(max_workers=min(args.Workers, len(Missing)), mp_context=multiprocessing.get_context('spawn')) as Pool:
+            Runs={Pool.submit(Evaluate, ModelPath, Seed, Configs[ModelPath], args): (ModelPath, Seed) for ModelPath, Seed in Missing}
+            for Done, Run in enumerate(as_completed(Runs)):
+                ModelPath, Seed=Runs[Run]
+                Cache[Keys[ModelPath, Seed]]=dict(Run.result(), Model=ModelPath, Seed=Seed)
+                SaveCache(args.Cache, Cache) # Finished runs are kept even if a later one crashes
+                print('Evaluated', ModelPath, 'on seed', Seed, '(%i of %i)'%(Done+1, len(Missing)))
+
+    Report({ModelPath: [Cache[Keys[ModelPath, Seed]] for Seed in Seeds] for ModelPath in ModelPaths}, args.Confidence, args.Baselines)
@@ -0,0 +1,33 @@
+# Exports a trained model to TrainedModel.npz in its folder, for testing and deployment with the NumPy-only runtime of runtime.py
+import os
+import argparse
+
+import numpy as np
+
+from model import TestModel, ExportModel
+from runtime import Precisions, ExportedModel
+from utilities import SetTestPath, ImportSettings
+
+def parse_args():
+    # Takes arguments from command line
+    Parser=argparse.ArgumentParser()
+    Parser.add_argument('--ModelNumber',help='Model Number to be Exported',type=int,default = 4)
+    Parser.add_argument('--Precision',help='How the weights are stored, float16 and int8 make the file 2x and 4x smaller at some accuracy',choices=Precisions,default='float32')
+
+    return Parser.parse_args()
+
+if __name__=="__main__":
+    args=parse_args()
+    ModelPath,_=SetTestPath(args.ModelNumber)
+    config=ImportSettings(os.path.join(ModelPath,"Settings.ini"))
+
+    Model=TestModel(config['numstates'],ModelPath,'numpy')
+    FileName=os.path.join(ModelPath,'TrainedModel.npz')
+    ExportModel(Model.Model,FileName,args.Precision)
+
+    # How far the exported model is from the Keras one, on random states
+    States=np.random.default_rng(0).integers(0, 2, (1000, config['numstates'])).astype(np.float32)
+    Expected=Model.PredictBatch(States)
+    Exported=ExportedModel(config['numstates'],ModelPath).PredictBatch(States)
+    print('Model exported at:',FileName,'(%.1f kB)'%(os.path.getsize(FileName)/1024))
+    print('Largest action value error: %.2e, same action for %.1f%% of the states'%(np.abs(Exported-Expected).max(), 100*np.mean(Exported.argmax(axis=1)==Expected.argmax(axis=1))))
@@ -0,0 +1,101 @@
+# Metrics streamed to append-only CSV files while running, so a run that stops still leaves every metric up to its last chunk on disk
+import io
+import os
+
+import numpy as np
+
+class MetricsSink:
+    # Buffers rows of the given columns and appends them to the file ChunkSize rows at a time, each chunk in a single write
+    # The file can be read while it is written, ReadMetrics leaves out a row that is only partly written
+    # An existing file with the same columns is carried on, Existing being the number of rows it already holds, any other file is started over
+    # Carrying a file on only cuts off a partly written last row, the rows before it are never rewritten
+    def __init__(self, FileName, Columns, ChunkSize=1000):
+        self.FileName=FileName
+        self.Columns=list(Columns)
+        self.Buffer=np.zeros((ChunkSize, len(self.Columns)))
+        self.Rows=0
+        self.Existing=0
+        Header=(",".join(self.Columns)+"\n").encode()
+        if os.path.isfile(FileName):
+            with open(FileName, "rb") as File:
+                Carried=File.readline()==Header
+        else:
+            Carried=False
+        if Carried:
+            with open(FileName, "r+b") as File:
+                Lines, End=CompleteLines(File)
+                File.truncate(End)
+            self.Existing=Lines-1
+            self.File=open(FileName, "a")
+        else:
+            self.File=open(FileName, "w")
+            self.File.write(Header.decode())
+            self.File.flush()
+
+    # Drops every row after the first Keep by cutting the file off there, the header and the rows before are left as they are
+    def Reset(self, Keep=0):
+        self.Rows=0
+        self.File.close()
+        with open(self.FileName, "r+b") as File:
+            _, End=CompleteLines(File, Keep+1)
+            File.truncate(End)
+        self.File=open(self.FileName, "a")
+
+    # Adds one row, with a value for every column
+    def Append(self, *Values):
+        self.Buffer[self.Rows]=Values
+        self.Rows+=1
+        if self.Rows==len(self.Buffer):
+            self.Flush()
+
+    # Adds many rows at once, given as one array per column
+    def Extend(self, *Columns):
+        self.Flush()
+        self.Write(np.column_stack(Columns))
+
+    # Writes the buffered rows to the file
+    def Flush(self):
+        if self.Rows>0:
+            self.Write(self.Buffer[:self.Rows])
+            self.Rows=0
+
+    def Write(self, Rows):
+        Text=io.StringIO()
+        np.savetxt(Text, Rows, fmt="%.17g", delimiter=",")
+        self.File.write(Text.getvalue())
+        self.File.flush()
+
+    def Close(self):
+        self.Flush()
+        self.File.close()
+
+# Number of complete lines at the start of a file opened in binary mode, at most Limit of them, and the byte offset just past them
+def CompleteLines(File, Limit=None):
+    File.seek(0)
+    Lines=0
+    End=0
+    Offset=0
+    for Block in iter(lambda: File.read(1<<20), b""):
+        Count=Block.count(b"\n")
+        if Limit is not None and Lines+Count>=Limit:
+            Position=-1
+            for _ in range(Limit-Lines):
+                Position=Block.index(b"\n", Position+1)
+            return Limit, Offset+Position+1
+        if Count:
+            End=Offset+Block.rfind(b"\n")+1
+        Lines+=Count
+        Offset+=len(Block)
+    return Lines, End
+
+# Reads the given columns of a metrics file, or all of them, as {Column: array}
+def ReadMetrics(FileName, Columns=None):
+    with open(FileName) as File:
+        Text=File.read()
+    Header, _, Body=Text[:Text.rfind("\n")+1].partition("\n") # Up to the last complete row
+    Names=Header.split(",")
+    Columns=Names if Columns is None else list(Columns)
+    if not Body:
+        return {Column: np.zeros(0) for Column in Columns}
+    Data=np.loadtxt(io.StringIO(Body), delimiter=",", usecols=[Names.index(Column) for Column in Columns], ndmin=2)
+    return {Column: Data[:,i] for i, Column in enumerate(Columns)}
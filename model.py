@@ -2,27 +2,83 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL']='2'  # doesnt show any annoying tensorflow warnings
 import numpy as np
 import sys
+import threading
+import importlib.util
+import shutil
 
-from tensorflow import keras
-from keras import layers,losses
-from keras.optimizers import Adam
-from keras.utils import plot_model
-from keras.models import load_model
+# TensorFlow and Keras take seconds to import, so they are only imported by the methods that build, compile or load a network
+# Importing this module stays cheap for --help, settings checks and the NumPy-only runtime
+from runtime import DenseForward, SaveLayers, CheckActivation
+
+# Backends available for picking an action from a single state
+Backends=['keras', 'function', 'numpy']
+
+# How the target network used for the Q-learning targets follows the trained network, 'none' uses the trained network itself
+TargetUpdates=['none', 'hard', 'polyak']
+
+class NumpyForward:
+    # Forward pass of the dense ReLU stack built by BuildModel in plain NumPy, no TensorFlow dispatch per call
+    def __init__(self, model):
+        self.LoadWeights(model)
+    
+    def LoadWeights(self, model):
+        from keras import layers
+        Layers=[]
+        for Layer in model.layers:
+            if isinstance(Layer, layers.Dense):
+                Kernel, Bias=Layer.get_weights()
+                Layers.append((Kernel, Bias, CheckActivation(Layer.get_config()['activation'])))
+            elif not isinstance(Layer, (layers.InputLayer, layers.Flatten)):
+                raise ValueError("The numpy backend only supports Dense layers, found "+Layer.__class__.__name__)
+        self.Layers=Layers # Swapped in at once, other threads may be predicting with the old weights
+    
+    def __call__(self, states):
+        return DenseForward(self.Layers, states)
+
+# Writes the weights of a model built by BuildModel to a .npz file that runtime.py runs without TensorFlow
+def ExportModel(model, FileName, Precision='float32'):
+    SaveLayers(FileName, NumpyForward(model).Layers, Precision)
 
 class TrainModel:
     # Basic class definition
-    def __init__(self, NumLayers, width, BatchSize, LearningRate, InputDimension, OutputDimension, model=None):
+    # TargetUpdate 'hard' copies the weights into the target network every TargetEvery training steps, 'polyak' moves it Tau of the way after every step
+    # DoubleDQN picks the next action with the trained network and values it with the target network
+    def __init__(self, NumLayers, width, BatchSize, LearningRate, InputDimension, OutputDimension, model=None, Backend='function', TargetUpdate='none', TargetEvery=500, Tau=0.005, DoubleDQN=False):
         self.InputDimension = InputDimension
         self.OutputDimension = OutputDimension
         self.BatchSize = BatchSize
         self.LearningRate = LearningRate
+        self.Backend = Backend
+        self.TargetUpdate = TargetUpdate
+        self.TargetEvery = TargetEvery
+        self.Tau = Tau
+        self.DoubleDQN = DoubleDQN
+        self.Steps = 0 # Training steps taken, for the hard target updates
         if model:
+            # Keras 3 loads the optimizer of a .h5 model without its slots, built for none of the weights, so it can't train them and a new one takes over
+            from keras import losses
+            from keras.optimizers import Adam
+            model.compile(loss=losses.mean_squared_error, optimizer=Adam(learning_rate=LearningRate))
             self.model = model
         else:
             self.model = self.BuildModel(NumLayers, width)
+        if TargetUpdate!='none':
+            from tensorflow import keras
+            self.TargetModel = keras.models.clone_model(self.model)
+            self.TargetModel.set_weights(self.model.get_weights())
+        else:
+            self.TargetModel = None
+        self.CompileFunctions()
+        if Backend=='numpy':
+            self.Numpy = NumpyForward(self.model)
+        self.Stale = False # Whether the numpy weights are behind the ones being trained
+        self.StaleLock = threading.Lock() # Parallel workers predict with the Model while it trains
     
     #Builds a fully connected nueral network
     def BuildModel(self, NumLayers, width):
+        from tensorflow import keras
+        from keras import layers,losses
+        from keras.optimizers import Adam
         Input=keras.Input(shape=(self.InputDimension,))
         Output=layers.Dense(width, activation='relu')(Input)
         
@@ -52,33 +108,122 @@ class TrainModel:
         Model.compile(loss=losses.mean_squared_error,optimizer=Adam(learning_rate=self.LearningRate))
         return Model
     
+    # Traces the forward pass and the update step once, so replay doesn't pay the setup cost of predict/fit on every call
+    def CompileFunctions(self):
+        import tensorflow as tf
+        from keras import losses
+        Model=self.model
+        Optimizer=Model.optimizer
+        StateSpec=tf.TensorSpec([None, self.InputDimension], tf.float32)
+        
+        @tf.function(input_signature=[StateSpec])
+        def Forward(states):
+            return Model(states, training=False)
+        
+        @tf.function(input_signature=[StateSpec, tf.TensorSpec([None, self.OutputDimension], tf.float32), tf.TensorSpec([None], tf.float32)])
+        def TrainStep(states, qsa, weights):
+            with tf.GradientTape() as Tape:
+                Loss=tf.reduce_mean(weights*losses.mean_squared_error(qsa, Model(states, training=True)))
+            Gradients=Tape.gradient(Loss, Model.trainable_variables)
+            Optimizer.apply_gradients(zip(Gradients, Model.trainable_variables))
+            if self.TargetUpdate=='polyak':
+                for Target, Weight in zip(self.TargetModel.weights, Model.weights):
+                    Target.assign(self.Tau*Weight+(1-self.Tau)*Target)
+            return Loss
+        
+        self.Forward=Forward
+        self.TrainStep=TrainStep
+        
+        if self.TargetModel is not None:
+            TargetModel=self.TargetModel
+            
+            @tf.function(input_signature=[StateSpec])
+            def TargetForward(states):
+                return TargetModel(states, training=False)
+            
+            @tf.function
+            def SyncTarget():
+                for Target, Weight in zip(TargetModel.weights, Model.weights):
+                    Target.assign(Weight)
+            
+            self.TargetForward=TargetForward
+            self.SyncTarget=SyncTarget
+    
     # Predicts Action Value from a single state
     def PredictOne(self, state):
-        state=np.reshape(state, [1, self.InputDimension])
-        return self.model.predict(state)
+        state=np.reshape(state, [1, self.InputDimension]).astype(np.float32)
+        if self.Backend=='numpy':
+            self.Refresh()
+            return self.Numpy(state)
+        elif self.Backend=='function':
+            return self.Forward(state).numpy()
+        else:
+            return self.model.predict(state, verbose=0)
     
     # Predicts Action Values from a Batch of States
     def PredictBatch(self, states):
-        return self.model.predict(states)
+        states=np.asarray(states, dtype=np.float32)
+        if self.Backend=='numpy':
+            self.Refresh()
+            return self.Numpy(states)
+        elif self.Backend=='function':
+            return self.Forward(states).numpy()
+        else:
+            return self.model.predict(states, verbose=0)
+    
+    # Predicts Action Values of a replay batch with the traced forward pass whatever the Backend, the weights change after every training step
+    def PredictReplay(self, states):
+        return self.Forward(np.asarray(states, dtype=np.float32)).numpy()
+    
+    # Picks up the weights of the last training run once, a single worker reloads them while the others wait
+    def Refresh(self):
+        with self.StaleLock:
+            if self.Stale:
+                self.Numpy.LoadWeights(self.model)
+                self.Stale=False
+    
+    # Predicts Action Values of a Batch of States with the target network
+    def PredictTarget(self, states):
+        return self.TargetForward(np.asarray(states, dtype=np.float32)).numpy()
     
-    # Trains the Nueral Network using the updates Q-Values
-    def TrainBatch(self, states, qsa):
-        self.model.fit(states, qsa, epochs=1, verbose=0)
+    # Trains the Nueral Network using the updates Q-Values, one gradient step over the batch
+    # Weights scale the loss of every sample, for samples that were not drawn uniformly
+    def TrainBatch(self, states, qsa, weights=None):
+        if weights is None:
+            weights=np.ones(len(states), dtype=np.float32)
+        self.TrainStep(np.asarray(states, dtype=np.float32), np.asarray(qsa, dtype=np.float32), np.asarray(weights, dtype=np.float32))
+        with self.StaleLock:
+            self.Stale=True
+        self.Steps+=1
+        if self.TargetUpdate=='hard' and self.Steps%self.TargetEvery==0:
+            self.SyncTarget()
         
     # Saves the current model in the given path as a .h5 file and a model architecture graph
+    # The graph needs pydot and the dot program of graphviz, which are looked up first since plot_model only prints a warning without them in some setups
     def SaveModel(self, path):
         self.model.save(os.path.join(path,'TrainedModel.h5'))
+        if importlib.util.find_spec('pydot') is None or shutil.which('dot') is None:
+            print('ModelStructure.png is not drawn, it needs pydot and graphviz')
+            return
+        from keras.utils import plot_model
         plot_model(self.model,to_file=os.path.join(path, 'ModelStructure.png'),show_shapes=True,show_layer_names=True)
     
 class TestModel:
-    def __init__(self, InputDimension, ModelPath):
+    def __init__(self, InputDimension, ModelPath, Backend='function'):
         self.InputDimension=InputDimension
+        self.Backend=Backend
         self.Model=self.LoadModel(ModelPath)
+        if Backend=='numpy':
+            self.Numpy=NumpyForward(self.Model)
+        else:
+            import tensorflow as tf
+            self.Forward=tf.function(lambda state: self.Model(state, training=False), input_signature=[tf.TensorSpec([None, InputDimension], tf.float32)])
         
     def LoadModel(self, ModelFolderPath):
         ModelFilePath=os.path.join(ModelFolderPath, 'TrainedModel.h5')
         
         if os.path.isfile(ModelFilePath):
+            from keras.models import load_model
             LoadedModel=load_model(ModelFilePath)
             return LoadedModel
         else:
@@ -86,5 +231,20 @@ class TestModel:
     
     # Predicts Action Value from a single state
     def PredictOne(self, state):
-        state=np.reshape(state, [1, self.InputDimension])
-        return self.Model.predict(state)
\ No newline at end of file
+        state=np.reshape(state, [1, self.InputDimension]).astype(np.float32)
+        if self.Backend=='numpy':
+            return self.Numpy(state)
+        elif self.Backend=='function':
+            return self.Forward(state).numpy()
+        else:
+            return self.Model.predict(state, verbose=0)
+    
+    # Predicts Action Values of a Batch of States, one row per junction
+    def PredictBatch(self, states):
+        states=np.asarray(states, dtype=np.float32)
+        if self.Backend=='numpy':
+            return self.Numpy(states)
+        elif self.Backend=='function':
+            return self.Forward(states).numpy()
+        else:
+            return self.Model.predict(states, verbose=0)
@@ -0,0 +1,91 @@
+# Timers around the hot paths of the episode loop, only installed when profiling is switched on so they cost nothing otherwise
+import cProfile
+import functools
+import os
+import timeit
+
+import numpy as np
+
+# Methods timed by Profiler.Instrument, for every part of a simulation
+SimulationTimers=['GetState', 'CollectWaitingTimes', 'GetQueueLength', 'ChooseActions', 'Predict', 'Replay']
+EnvironmentTimers=['Start', 'Step', 'Vehicles', 'HaltingNumbers', 'QueueLengths']
+ModelTimers=['PredictOne', 'PredictBatch', 'PredictReplay', 'PredictTarget', 'TrainBatch']
+
+class Profiler:
+    # Keeps the duration of every call of every timer until it is reset, normally once per episode
+    # With a DumpEpisode the whole of that episode also runs under cProfile, its stats are saved to DumpPath
+    # They can be turned into call graphs and flame graphs with snakeviz, gprof2dot or flameprof
+    # cProfile only follows the main thread, so the --Async learner only shows up in the timers
+    # Parallel workers run in processes of their own, which neither the timers nor cProfile follow
+    def __init__(self, DumpEpisode=None, DumpPath=None):
+        self.Timings={}
+        self.Instrumented=set()
+        self.DumpEpisode=DumpEpisode
+        self.DumpPath=DumpPath
+        self.Profile=None
+
+    # Replaces the methods of a simulation, its environment and its model with timed ones
+    def Instrument(self, Simulation):
+        self.Wrap(Simulation, 'Simulation', SimulationTimers)
+        self.Wrap(Simulation.Environment, 'Environment', EnvironmentTimers)
+        self.Wrap(Simulation.Model, 'Model', ModelTimers)
+
+    # Times the given methods of one object, an object shared by several simulations is only wrapped once
+    def Wrap(self, Object, Prefix, Names):
+        if id(Object) in self.Instrumented:
+            return
+        self.Instrumented.add(id(Object))
+        for Name in Names:
+            if hasattr(Object, Name):
+                setattr(Object, Name, self.Timed(Prefix+'.'+Name, getattr(Object, Name)))
+
+    def Timed(self, Name, Method):
+        Timings=self.Timings.setdefault(Name, [])
+        @functools.wraps(Method)
+        def Wrapper(*args, **kwargs):
+            StartTime=timeit.default_timer()
+            try:
+                return Method(*args, **kwargs)
+            finally:
+                Timings.append(timeit.default_timer()-StartTime) # Appending to a list is safe from the learner thread
+        return Wrapper
+
+    # Count, total and percentiles of every timer that ran, the slowest in total first
+    def Histograms(self):
+        Rows=[]
+        for Name, Timings in self.Timings.items():
+            if Timings:
+                Timings=np.array(Timings)*1000
+                Rows.append((Name, len(Timings), Timings.sum()/1000, np.percentile(Timings, 50), np.percentile(Timings, 99)))
+        return sorted(Rows, key=lambda Row: -Row[2])
+
+    def Report(self, Title):
+        print('\n=============== '+Title+' ===============')
+        Header='%-34s %10s %11s %11s %11s'%('Timer', 'Calls', 'Total (s)', 'p50 (ms)', 'p99 (ms)')
+        print(Header)
+        for Row in self.Histograms():
+            print('%-34s %10i %11.2f %11.3f %11.3f'%Row)
+        print('='*len(Header))
+
+    # Starts over for the next episode, the timed methods stay in place
+    def Reset(self):
+        for Timings in self.Timings.values():
+            Timings.clear()
+
+    # Called before simulating the given episodes (counted from 0), starts cProfile when one of them is the episode to dump
+    def Begin(self, Episodes):
+        if self.DumpEpisode is not None and self.DumpEpisode-1 in Episodes:
+            self.Profile=cProfile.Profile()
+            self.Profile.enable()
+
+    # Called once the episodes are done, saves the cProfile stats and reports the timers
+    def End(self, Title):
+        if self.Profile is not None:
+            self.Profile.disable()
+            FileName=os.path.join(self.DumpPath, 'Profile_Episode_%i.prof'%self.DumpEpisode)
+            self.Profile.dump_stats(FileName)
+            self.Profile=None
+            print('cProfile stats saved at:', FileName)
+        if self.Histograms():
+            self.Report(Title)
+        self.Reset()
@@ -0,0 +1,72 @@
+# Inference on exported models with NumPy alone, so picking actions needs neither TensorFlow nor Keras
+import os
+import sys
+
+import numpy as np
+
+# Precisions the kernels of an exported model can be stored in, the biases are always kept as float32
+Precisions=['float32', 'float16', 'int8']
+
+# Activations DenseForward runs, layers with any other are refused rather than run as linear
+Activations=['relu', 'linear']
+
+def CheckActivation(Activation):
+    if Activation not in Activations:
+        raise ValueError("The NumPy forward pass only supports %s activations, found %s"%(' and '.join(Activations), Activation))
+    return Activation
+
+# Forward pass of a dense stack given as (Kernel, Bias, Activation) layers, one row of action values per state
+def DenseForward(Layers, states):
+    Output=np.asarray(states, dtype=np.float32)
+    for Kernel, Bias, Activation in Layers:
+        Output=Output@Kernel+Bias
+        if Activation=='relu':
+            np.maximum(Output, 0, out=Output)
+    return Output
+
+# Writes the layers to a .npz file, an int8 kernel is stored with one float32 scale per output so its largest weight is 127
+def SaveLayers(FileName, Layers, Precision='float32'):
+    Arrays={'Activations': np.array([Activation for _, _, Activation in Layers]), 'Precision': np.array(Precision)}
+    for i, (Kernel, Bias, _) in enumerate(Layers):
+        if Precision=='int8':
+            Scale=np.abs(Kernel).max(axis=0)/127
+            Scale[Scale==0]=1
+            Arrays['Kernel_%i'%i]=np.round(Kernel/Scale).astype(np.int8)
+            Arrays['Scale_%i'%i]=Scale.astype(np.float32)
+        else:
+            Arrays['Kernel_%i'%i]=Kernel.astype(Precision)
+        Arrays['Bias_%i'%i]=Bias.astype(np.float32)
+    np.savez_compressed(FileName, **Arrays)
+
+# Reads the layers of a .npz file back, every kernel is turned into float32 once so the forward pass runs at full speed
+def LoadLayers(FileName):
+    with np.load(FileName) as Arrays:
+        Layers=[]
+        for i, Activation in enumerate(Arrays['Activations']):
+            Kernel=Arrays['Kernel_%i'%i].astype(np.float32)
+            if 'Scale_%i'%i in Arrays:
+                Kernel*=Arrays['Scale_%i'%i]
+            Layers.append((Kernel, Arrays['Bias_%i'%i], CheckActivation(str(Activation))))
+    return Layers
+
+class ExportedModel:
+    # Drop-in for TestModel on the TrainedModel.npz written by export.py
+    def __init__(self, InputDimension, ModelPath):
+        self.InputDimension=InputDimension
+        self.Layers=self.LoadModel(ModelPath)
+
+    def LoadModel(self, ModelFolderPath):
+        ModelFilePath=os.path.join(ModelFolderPath, 'TrainedModel.npz')
+
+        if os.path.isfile(ModelFilePath):
+            return LoadLayers(ModelFilePath)
+        else:
+            sys.exit("Exported Model Does Not Exist, run export.py first")
+
+    # Predicts Action Value from a single state
+    def PredictOne(self, state):
+        return DenseForward(self.Layers, np.reshape(state, [1, self.InputDimension]))
+
+    # Predicts Action Values of a Batch of States, one row per junction
+    def PredictBatch(self, states):
+        return DenseForward(self.Layers, states)
@@ -0,0 +1,23 @@
+# Pregenerates the traffic of every episode into a scenario bank that training.py and testing.py can read with --ScenarioBank
+
+import argparse
+import os
+
+from utilities import GenerateScenarioBank, ScenarioBank, BankSettingsFile
+
+def parse_args():
+    # Takes arguments from command line
+    Parser=argparse.ArgumentParser()
+    Parser.add_argument('--BankFile',help='Where to write the scenario bank',default=os.path.join("Junction","ScenarioBank.npy"))
+    Parser.add_argument('--NumScenarios',help='Number of seeds to generate, training uses the episode number as seed and testing seed 1000',type=int,default=2000)
+    Parser.add_argument('--MaxSteps',help='Max Number of steps that can be taken',type=int,default=5400)
+    Parser.add_argument('--N_Cars',help='Number of cars to be generated in each episode',type=int,default=1000)
+    Parser.add_argument('--WeibullDepartures',help='Spreads the departures of the cars over the episode along a Weibull distribution, instead of all cars departing at the same step',action='store_true')
+    
+    return Parser.parse_args()
+
+if __name__=="__main__":
+    args=parse_args()
+    GenerateScenarioBank(args.BankFile,args.MaxSteps,args.N_Cars,args.NumScenarios,args.WeibullDepartures)
+    Bank=ScenarioBank(args.BankFile)
+    print('Scenario bank of %i scenarios of %i cars saved at: %s (%.1f MB), with its settings in %s'%(len(Bank),args.N_Cars,args.BankFile,os.path.getsize(args.BankFile)/2**20,BankSettingsFile(args.BankFile)))
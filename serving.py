@@ -0,0 +1,262 @@
+# Serves the actions of a trained model to signal controllers over a local socket, and a client that drives simulations with them
+# The model is loaded once, the requests of every connected controller that arrive together are answered with one forward pass
+#
+# Protocol, little endian: on connecting the server sends the number of cells in a state as a uint32
+# A request is the number of states as a uint32 followed by the states as float32, the reply is the number of actions followed by the actions as int32
+
+import argparse
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import timeit
+
+import numpy as np
+
+from environment import TraciEnvironment, NumpyEnvironment
+from metrics import MetricsSink
+from model import TestModel, Backends
+from runtime import ExportedModel
+from simulations import TestingSimulation
+from utilities import SetSumo, TrafficGen, ImportSettings
+
+CountFormat=struct.Struct('<I') # Leading count of every message
+
+# Prints the count and percentiles in milliseconds of every list of latencies in seconds
+def LatencyReport(Title, Rows):
+    print('\n=============== '+Title+' ===============')
+    Header='%-34s %10s %11s %11s %11s'%('Latency', 'Requests', 'p50 (ms)', 'p99 (ms)', 'Max (ms)')
+    print(Header)
+    for Name, Timings in Rows:
+        if len(Timings):
+            Timings=np.array(Timings)*1000
+            print('%-34s %10i %11.3f %11.3f %11.3f'%(Name, len(Timings), np.percentile(Timings, 50), np.percentile(Timings, 99), Timings.max()))
+    print('='*len(Header))
+
+# Reads exactly Size bytes, a closed connection raises ConnectionError
+def ReceiveExactly(Connection, Size):
+    Data=bytearray(Size)
+    View=memoryview(Data)
+    Received=0
+    while Received<Size:
+        Count=Connection.recv_into(View[Received:])
+        if Count==0:
+            raise ConnectionError('Connection closed')
+        Received+=Count
+    return Data
+
+def Connect(Connection):
+    Connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Small messages go out at once rather than waiting to be combined
+    return Connection
+
+class Request:
+    __slots__=('Connection', 'States', 'Arrival')
+
+    def __init__(self, Connection, States, Arrival):
+        self.Connection=Connection
+        self.States=States
+        self.Arrival=Arrival
+
+class PolicyServer:
+    # Every connection gets a thread reading its requests, one batching thread answers them
+    # The batch waits at most MaxWait seconds after its first request for the other connected controllers, and never waits for more than one request per controller
+    # With a MetricsFile the latencies of every request are streamed to it, and they are reported every ReportEvery seconds
+    def __init__(self, Model, NumStates, Host='127.0.0.1', Port=8765, MaxBatch=64, MaxWait=0.002, MetricsFile=None, ReportEvery=60):
+        self.Model=Model
+        self.NumStates=NumStates
+        self.MaxBatch=MaxBatch
+        self.MaxWait=MaxWait
+        self.ReportEvery=ReportEvery
+        self.Requests=queue.Queue()
+        self.Clients=0 # Controllers connected
+        self.ClientsLock=threading.Lock()
+        self.StartTime=timeit.default_timer()
+        self.Metrics=MetricsSink(MetricsFile, ['Time', 'States', 'Batch', 'Wait', 'Inference', 'Total']) if MetricsFile else None
+        self.Latencies={'Wait': [], 'Inference': [], 'Total': []}
+        self.Listener=socket.create_server((Host, Port))
+
+    # Accepts controllers until interrupted
+    def Serve(self):
+        for Size in (1, 2): # The forward pass is traced on its first single state and first batch, which takes far longer than a decision
+            self.Model.PredictBatch(np.zeros((Size, self.NumStates), dtype=np.float32))
+        Batcher=threading.Thread(target=self.Batch)
+        Batcher.start()
+        print('Serving on %s:%i'%self.Listener.getsockname()[:2])
+        try:
+            while True:
+                Connection, _=self.Listener.accept()
+                threading.Thread(target=self.Read, args=(Connect(Connection),), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.Listener.close()
+            self.Requests.put(None)
+            Batcher.join()
+            self.Report()
+            if self.Metrics is not None:
+                self.Metrics.Close()
+
+    # Reads the requests of one controller until it disconnects
+    def Read(self, Connection):
+        with self.ClientsLock:
+            self.Clients+=1
+        try:
+            Connection.sendall(CountFormat.pack(self.NumStates))
+            while True:
+                Count=CountFormat.unpack(ReceiveExactly(Connection, CountFormat.size))[0]
+                States=np.frombuffer(ReceiveExactly(Connection, 4*Count*self.NumStates), dtype=np.float32).reshape(Count, self.NumStates)
+                self.Requests.put(Request(Connection, States, timeit.default_timer()))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.ClientsLock:
+                self.Clients-=1
+            Connection.close()
+
+    # Collects the requests that arrive together, picks their actions in one forward pass and replies to each of them
+    def Batch(self):
+        LastReport=timeit.default_timer()
+        while True:
+            Requests=[self.Requests.get()]
+            if Requests[0] is None:
+                return
+            Size=len(Requests[0].States)
+            Deadline=Requests[0].Arrival+self.MaxWait
+            while Size<self.MaxBatch and len(Requests)<self.Clients:
+                try:
+                    Next=self.Requests.get(timeout=max(Deadline-timeit.default_timer(), 0))
+                except queue.Empty:
+                    break
+                if Next is None:
+                    self.Requests.put(None) # Stops the loop once this batch is answered
+                    break
+                Requests.append(Next)
+                Size+=len(Next.States)
+
+            StartTime=timeit.default_timer()
+            Actions=np.argmax(self.Model.PredictBatch(np.concatenate([Request.States for Request in Requests])), axis=1).astype(np.int32)
+            EndTime=timeit.default_timer()
+            Start=0
+            for Request in Requests:
+                Count=len(Request.States)
+                try:
+                    Request.Connection.sendall(CountFormat.pack(Count)+Actions[Start:Start+Count].tobytes())
+                except OSError: # The controller left, its reader thread cleans up
+                    pass
+                Start+=Count
+                self.Record(Request, Size, StartTime, EndTime, timeit.default_timer())
+
+            if timeit.default_timer()-LastReport>=self.ReportEvery:
+                self.Report()
+                LastReport=timeit.default_timer()
+
+    def Record(self, Request, Size, StartTime, EndTime, Replied):
+        Wait, Inference, Total=StartTime-Request.Arrival, EndTime-StartTime, Replied-Request.Arrival
+        self.Latencies['Wait'].append(Wait)
+        self.Latencies['Inference'].append(Inference)
+        self.Latencies['Total'].append(Total)
+        if self.Metrics is not None:
+            self.Metrics.Append(Replied-self.StartTime, len(Request.States), Size, 1000*Wait, 1000*Inference, 1000*Total)
+
+    # Reports the latencies since the last report, from the arrival of a request to the start of its forward pass, of the forward pass and until the reply is sent
+    def Report(self):
+        if self.Latencies['Total']:
+            LatencyReport('Served requests', [('Batch wait', self.Latencies['Wait']), ('Forward pass', self.Latencies['Inference']), ('Arrival to reply', self.Latencies['Total'])])
+        if self.Metrics is not None:
+            self.Metrics.Flush()
+        for Timings in self.Latencies.values():
+            Timings.clear()
+
+class PolicyClient:
+    # Asks a PolicyServer for the actions of the given states, and keeps the round trip time of every request
+    # It is also a Controller for TestingSimulation, so a simulation can be driven by the served policy
+    def __init__(self, Host='127.0.0.1', Port=8765):
+        self.Connection=Connect(socket.create_connection((Host, Port)))
+        self.NumStates=CountFormat.unpack(ReceiveExactly(self.Connection, CountFormat.size))[0]
+        self.Latencies=[]
+
+    def Decide(self, States):
+        States=np.ascontiguousarray(States, dtype=np.float32).reshape(-1, self.NumStates)
+        StartTime=timeit.default_timer()
+        self.Connection.sendall(CountFormat.pack(len(States))+States.tobytes())
+        Count=CountFormat.unpack(ReceiveExactly(self.Connection, CountFormat.size))[0]
+        Actions=np.frombuffer(ReceiveExactly(self.Connection, 4*Count), dtype=np.int32)
+        self.Latencies.append(timeit.default_timer()-StartTime)
+        return Actions
+
+    def Reset(self, Seed, NumJunctions):
+        pass
+
+    def ChooseActions(self, Simulation, Junctions, States):
+        return self.Decide(States)
+
+    def Close(self):
+        self.Connection.close()
+
+def parse_args():
+    Parser=argparse.ArgumentParser(description='Policy server for real-time signal control, and a client running testing episodes against it')
+    Subparsers=Parser.add_subparsers(dest='Command',required=True)
+
+    Serve=Subparsers.add_parser('serve',help='Loads a trained model once and serves actions until interrupted')
+    Serve.add_argument('--ModelNumber',help='Model Number to be Served',type=int,default=4)
+    Serve.add_argument('--Backend',help='How the Model computes the action values of a batch',choices=Backends,default='function')
+    Serve.add_argument('--Exported',help='Serves the TrainedModel.npz written by export.py with the NumPy-only runtime instead of the Keras model',action='store_true')
+    Serve.add_argument('--MaxBatch',help='Most states answered in one forward pass',type=int,default=64)
+    Serve.add_argument('--MaxWait',help='Milliseconds a batch waits after its first request for the requests of the other controllers',type=float,default=2)
+    Serve.add_argument('--ReportEvery',help='Seconds between latency reports',type=float,default=60)
+
+    Client=Subparsers.add_parser('client',help='Runs testing episodes with the actions of a running server, one controller per episode at the same time')
+    Client.add_argument('--ModelNumber',help='Model whose settings the episodes run with',type=int,default=4)
+    Client.add_argument('--Clients',help='Controllers, each running its own episode over its own connection',type=int,default=4)
+    Client.add_argument('--Environment',help='Simulate in sumo, or in the much faster NumPy stand-in of the junction (no sumo needed)',choices=['sumo','numpy'],default='sumo')
+    Client.add_argument('--Seed',help='Seed of the traffic of the first controller, the others take the next ones',type=int,default=1000)
+
+    for Command in (Serve, Client):
+        Command.add_argument('--Host',default='127.0.0.1')
+        Command.add_argument('--Port',type=int,default=8765)
+
+    return Parser.parse_args()
+
+# Runs one testing episode per controller, each in its own thread and environment
+def RunClients(args, Config):
+    NetFile=os.path.join("Junction","Environment.net.xml")
+    Clients=[]
+    for Client in range(args.Clients):
+        Controller=PolicyClient(args.Host, args.Port)
+        if Controller.NumStates!=Config['numstates']:
+            raise ValueError('The server takes states of %i cells, the settings have %i'%(Controller.NumStates, Config['numstates']))
+        if args.Environment=='sumo':
+            Environment=TraciEnvironment(SetSumo(False,"SumoConfig.sumocfg",Config['maxsteps']),"Client_"+str(Client),NetFile)
+            Traffic=TrafficGen(Config['maxsteps'],Config['n_cars'],os.path.join(tempfile.gettempdir(),"ClientRoutes_"+str(Client)+".rou.xml"),WeibullDepartures=Config['weibulldepartures'])
+        else:
+            Environment=NumpyEnvironment(NetFile)
+            Traffic=TrafficGen(Config['maxsteps'],Config['n_cars'],None,WeibullDepartures=Config['weibulldepartures'])
+        Clients.append(TestingSimulation(None,Traffic,Environment,Config['maxsteps'],Config['greenduration'],Config['yellowduration'],Config['numstates'],Config['numactions'],Controller=Controller))
+
+    Threads=[threading.Thread(target=Simulation.RunTesting, args=(args.Seed+Client,)) for Client, Simulation in enumerate(Clients)]
+    for Thread in Threads:
+        Thread.start()
+    for Thread in Threads:
+        Thread.join()
+
+    for Client, Simulation in enumerate(Clients):
+        Simulation.Controller.Close()
+        print('Controller %i, seed %i: total reward %.0f, mean queue %.1f'%(Client, args.Seed+Client, sum(Simulation.EpisodeReward), Simulation.EpisodeQueueLength.mean()))
+    LatencyReport('Round trips of %i controllers'%args.Clients, [('Request to reply', [Latency for Simulation in Clients for Latency in Simulation.Controller.Latencies])])
+
+if __name__=="__main__":
+    args=parse_args()
+    ModelPath=os.path.join("Models","Model_"+str(args.ModelNumber))
+    Config=ImportSettings(os.path.join(ModelPath,"Settings.ini"))
+
+    if args.Command=='serve':
+        if args.Exported:
+            Model=ExportedModel(Config['numstates'],ModelPath)
+        else:
+            Model=TestModel(Config['numstates'],ModelPath,args.Backend)
+        Server=PolicyServer(Model,Config['numstates'],args.Host,args.Port,args.MaxBatch,args.MaxWait/1000,os.path.join(ModelPath,'Serving.csv'),args.ReportEvery)
+        Server.Serve()
+    else:
+        RunClients(args, Config)
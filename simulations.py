@@ -1,7 +1,19 @@
-import traci
+import os
+import atexit
+import heapq
+import traci.constants as tc
+import traci.exceptions
 import numpy as np
 import random
+import threading
 import timeit
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from model import NumpyForward
+from runtime import DenseForward
+from metrics import MetricsSink
 
 #phase codes for traffic lights
 NS_Green=0
@@ -13,15 +25,67 @@ EW_Yellow=5
 EWL_Green=6
 EWL_Yellow=7
 
+# Distance from the traffic light (in meters) at which each of the 10 cells of a lane ends
+CellEdges=np.array([7, 14, 21, 28, 40, 60, 100, 160, 400, 750])
+
+class LaneCellEncoder:
+    # Maps cars to the occupancy cells of the state vectors, 10 cells for each lane group of every junction of the JunctionLayout
+    def __init__(self, NumStates, Junctions, Inclusive=True):
+        if NumStates!=Junctions.NumGroups*len(CellEdges):
+            raise ValueError("The junctions have %i lane groups, which makes %i states instead of %i"%(Junctions.NumGroups, Junctions.NumGroups*len(CellEdges), NumStates))
+        self.NumStates=NumStates
+        self.Junctions=Junctions
+        self.Inclusive=Inclusive # Whether a car exactly at the start of the lane (750m away) still counts as in the last cell
+        
+    # Looks up the lane group of every lane ID, -1 for lanes not leading into a junction
+    def Groups(self, LaneIDs):
+        LaneGroups=self.Junctions.LaneGroups
+        return np.fromiter((LaneGroups.get(LaneID, -1) for LaneID in LaneIDs), dtype=np.int64)
+    
+    # Fills the occupancy vectors of all junctions from arrays of lane positions and lane groups in one scatter, one row per junction
+    def Encode(self, Positions, Groups):
+        State=np.zeros(len(self.Junctions)*self.NumStates)
+        Valid=Groups>=0
+        Distance=np.full(len(Groups), -1.0)
+        Distance[Valid]=self.Junctions.GroupLengths[Groups[Valid]]-np.asarray(Positions, dtype=np.float64)[Valid] # Distance from the traffic light
+        LaneCells=np.searchsorted(CellEdges[:-1], Distance, side='right')
+        if self.Inclusive:
+            Valid&=(Distance>=0) & (Distance<=CellEdges[-1])
+        else:
+            Valid&=(Distance>=0) & (Distance<CellEdges[-1])
+        State[Groups[Valid]*10+LaneCells[Valid]]=1 # Creates a number between 0 and 79 for the first junction
+        return State.reshape(len(self.Junctions), self.NumStates)
+
+class DecisionScheduler:
+    # Heap of the next event of every junction, so the simulation only runs up to the earliest one and every junction keeps its own phase clock
+    Green=0 # The yellow phase of the junction is over and its new green phase starts
+    Decide=1 # The green phase of the junction is over and it picks its next phase
+    def __init__(self, NumJunctions):
+        self.Events=[(0, self.Decide, Junction) for Junction in range(NumJunctions)] # Every junction decides at the start, already in heap order
+    
+    def Push(self, Time, Kind, Junction):
+        heapq.heappush(self.Events, (Time, Kind, Junction))
+    
+    # Pops every event due at the earliest time, returns that time, the junctions starting their green phase and the junctions deciding
+    def Next(self):
+        Time=self.Events[0][0]
+        Junctions=([], [])
+        while self.Events and self.Events[0][0]==Time:
+            _, Kind, Junction=heapq.heappop(self.Events)
+            Junctions[Kind].append(Junction)
+        return Time, np.array(Junctions[self.Green], dtype=np.int64), np.array(Junctions[self.Decide], dtype=np.int64)
+
 class TrainingSimulation:
     # Basic Class Definition
-    def __init__(self, Model, Memory, Traffic, Sumo, Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs):
+    # With a MetricsPath the stats of every episode are streamed to Episodes.csv in it as soon as the episode is over
+    MaxRestarts=3 # Times sumo is started again when it dies during an episode, before giving up
+    def __init__(self, Model, Memory, Traffic, Environment, Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs, MetricsPath=None):
         self.Model=Model
         self.Memory = Memory
         self.Traffic = Traffic
         self.Gamma = Gamma
         self.Step = 0
-        self.Sumo = Sumo
+        self.Environment = Environment # Sumo through TraCI or the NumPy stand-in
         self.MaxSteps = MaxSteps
         self.GreenDuration = GreenDuration
         self.YellowDuration = YellowDuration
@@ -31,16 +95,53 @@ class TrainingSimulation:
         self.TotalWaitStore = []
         self.AverageQueueLengthStore = []
         self.TrainingEpochs = TrainingEpochs
+        self.Junctions = Environment.Junctions # Every traffic light is an agent, all of them sharing the Model and Memory
+        if NumActions>self.Junctions.GreenPhases.shape[1]:
+            raise ValueError("The junctions have green phases for %i actions, not %i"%(self.Junctions.GreenPhases.shape[1], NumActions))
+        self.Encoder = LaneCellEncoder(NumStates, self.Junctions)
+        self.Metrics = None if MetricsPath is None else MetricsSink(os.path.join(MetricsPath, "Episodes.csv"), ["Episode", "Reward", "Delay", "Queue"], ChunkSize=1)
+        self.EpisodeOffset = 0 if self.Metrics is None else self.Metrics.Existing # Retraining numbers its episodes on from the ones already in Episodes.csv
     
     # Runs an episode of simuation and then trains the model on the generated simulation
     def RunTraining(self, episode, epsilon):
+        SimulationTime=self.RunEpisode(episode, epsilon)
+        
+        print("=====Training The Model=====")
+        TrainingTime=self.Train(self.TrainingEpochs)
+        
+        return SimulationTime, TrainingTime
+    
+    # Simulates one episode in sumo, saving every transition to memory
+    # If sumo dies during the episode it is started again and the episode is run again from its start
+    def RunEpisode(self, episode, epsilon):
         StartTime=timeit.default_timer()
         
         # Generate route file
         self.Traffic.GenerateRoutes(seed=episode)
         
-        # Setting up Sumo
-        traci.start(self.Sumo)
+        for Restart in range(self.MaxRestarts+1):
+            try:
+                Samples=self.SimulateEpisode(epsilon)
+                break
+            except traci.exceptions.FatalTraCIError as Error:
+                if Restart==self.MaxRestarts:
+                    raise
+                print("Sumo quit during the episode (%s), running it again"%Error)
+                self.Environment.Disconnect()
+        
+        # Samples only reach the memory once the episode is complete, so a rerun episode leaves none of its first try behind
+        for Sample in Samples:
+            self.Memory.AddSample(Sample)
+        self.SaveEpisodeStats()
+        print("Total Reward: ", self.SumNegativeReward, "| Epsilon: ", round(epsilon, 2))
+        SimulationTime=round(timeit.default_timer() - StartTime, 1)
+        
+        return SimulationTime
+    
+    # Runs the episode on the routes of RunEpisode, returns the transitions of every junction
+    def SimulateEpisode(self, epsilon):
+        # Setting up Sumo, or its stand-in
+        self.Environment.Start(self.Traffic)
         
         print("=====Simulating Cars=====")
         
@@ -50,264 +151,389 @@ class TrainingSimulation:
         self.SumNegativeReward=0
         self.SumQueueReward=0
         self.SumWaitingTime=0
-        OldTotalWait=0
-        OldState=-1
-        OldAction=-1
+        OldTotalWait=np.zeros(len(self.Junctions))
+        OldStates=np.zeros((len(self.Junctions), self.NumStates))
+        OldActions=np.full(len(self.Junctions), -1) # -1 until a junction has made its first decision
+        Scheduler=DecisionScheduler(len(self.Junctions))
+        Samples=[]
         
-        while self.Step<self.MaxSteps:
-            # Current State of the Junction
-            CurrentState=self.GetState()
+        while True:
+            # Simulates up to the next event of any junction
+            Time, Greens, Deciding=Scheduler.Next()
+            self.Simulate(Time-self.Step)
+            if self.Step>=self.MaxSteps:
+                break
+            self.StartGreenPhases(Scheduler, Greens, OldActions[Greens])
+            if len(Deciding)==0:
+                continue
+            
+            # Current State of every deciding Junction, one row each
+            CurrentStates=self.GetState()[Deciding]
             
             # Waiting time is the number of seconds that a car has waiting after being spawned into the env
-            # Here we will be getting the sum of all waiting times for the cars in all lanes
-            CurrentTotalWait=self.CollectWaitingTimes()
-            Reward=OldTotalWait-CurrentTotalWait
+            # Here we will be getting the sum of all waiting times for the cars in all lanes of each junction
+            CurrentTotalWait=self.CollectWaitingTimes()[Deciding]
+            Rewards=OldTotalWait[Deciding]-CurrentTotalWait
             
-            # Save Data to Memory
-            if self.Step!=0:
-                self.Memory.AddSample((OldState,OldAction,Reward,CurrentState))
+            # Save Data for the Memory, a sample for every junction that decided before
+            Decided=OldActions[Deciding]>=0
+            Samples.extend(zip(OldStates[Deciding][Decided],OldActions[Deciding][Decided],Rewards[Decided],CurrentStates[Decided]))
             
-            # Choose an Action or Light Phase to activate based on the current state of the junction
-            Action=self.ChooseAction(CurrentState, epsilon)
+            # Choose an Action or Light Phase to activate based on the current state of each junction, in one batch
+            Actions=self.ChooseActions(CurrentStates, epsilon)
             
-            # If the chosen action/phase is different than the old one, change to yellow phase
-            if self.Step!=0 and OldAction!=Action:
-                self.SetYellowPhase(OldAction)
-                self.Simulate(self.YellowDuration)
-                
-            # Execute the chosen phase
-            self.SetGreenPhase(Action)
-            self.Simulate(self.GreenDuration)
+            # Junctions changing their phase go through yellow first, the others go on with green right away
+            self.StartPhases(Scheduler, Deciding, OldActions[Deciding], Actions)
             
             # Save Variables for next iteration and Collect Reward
-            OldState=CurrentState
-            OldAction=Action
-            OldTotalWait=CurrentTotalWait
+            OldStates[Deciding]=CurrentStates
+            OldActions[Deciding]=Actions
+            OldTotalWait[Deciding]=CurrentTotalWait
             
             # Save only meaningful rewards to see if the agent is behaving to as planned
-            if Reward<0:
-                self.SumNegativeReward+=Reward
+            self.SumNegativeReward+=float(Rewards[Rewards<0].sum())
                 
-        self.SaveEpisodeStats()
-        print("Total Reward: ", self.SumNegativeReward, "| Epsilon: ", round(epsilon, 2))
-        traci.close()
-        SimulationTime=round(timeit.default_timer() - StartTime, 1)
+        self.Environment.Close()
+        if self.Environment.QueueEdges is not None:
+            QueueLength=int(self.Environment.QueueLengths(self.MaxSteps).sum())
+            self.SumQueueReward+=QueueLength
+            self.SumWaitingTime+=QueueLength
         
-        print("=====Training The Model=====")
+        return Samples
+    
+    # Trains the model on samples from memory for the given number of epochs
+    def Train(self, Epochs):
         StartTime=timeit.default_timer()
-        for _ in range(self.TrainingEpochs):
+        for _ in range(Epochs):
             self.Replay()
         TrainingTime=round(timeit.default_timer() - StartTime, 1)
         
-        return SimulationTime, TrainingTime
+        return TrainingTime
 
     # Gathers states while executing steps in sumo
     def Simulate(self, StepsTodo):
         if(self.Step+StepsTodo)>=self.MaxSteps:
             StepsTodo=self.MaxSteps-self.Step
+        
+        # The environment records the queue of every step itself, so the whole phase is simulated in one call
+        if self.Environment.QueueEdges is not None:
+            if StepsTodo>0:
+                self.Environment.Step(StepsTodo)
+                self.Step+=StepsTodo
+            return
             
         while StepsTodo>0:
-            traci.simulationStep() # Simulate 1 step
+            self.Environment.Step() # Simulate 1 step
             self.Step+=1
             StepsTodo-=1
             QueueLength=self.GetQueueLength()
             self.SumQueueReward+=QueueLength
             self.SumWaitingTime+=QueueLength # 1 one step while waiting in queue
 
-    # Collect the waiting time for every car in the Incoming Roads            
+    # Collect the waiting time for every car in the Incoming Roads, summed up for each junction
     def CollectWaitingTimes(self):
-        IncomingRoads=["E2TL", "N2TL", "W2TL", "S2TL"]
-        CarList=traci.vehicle.getIDList()
-        for CarID in CarList:
-            WaitTime=traci.vehicle.getAccumulatedWaitingTime(CarID)
-            RoadID=traci.vehicle.getRoadID(CarID) # Get Road ID on which the vehicle is
+        IncomingRoads=self.Junctions.EdgeJunctions
+        Vehicles=self.Environment.Vehicles(self.Step)
+        for CarID, Variables in Vehicles.items():
+            WaitTime=Variables[tc.VAR_ACCUMULATED_WAITING_TIME]
+            RoadID=Variables[tc.VAR_ROAD_ID] # Get Road ID on which the vehicle is
             if RoadID in IncomingRoads: # Considers only waiting time of cars in incoming roads
-                self.WaitingTimes[CarID]=WaitTime
+                self.WaitingTimes[CarID]=(IncomingRoads[RoadID], WaitTime)
             else:
                 if CarID in self.WaitingTimes: # Car that was tracked and has now cleared the intersection
                     del self.WaitingTimes[CarID]
-        TotalWaitingTime=sum(self.WaitingTimes.values())
+        TotalWaitingTime=np.zeros(len(self.Junctions))
+        if self.WaitingTimes:
+            Junctions, WaitTimes=zip(*self.WaitingTimes.values())
+            TotalWaitingTime=np.bincount(Junctions, weights=WaitTimes, minlength=len(self.Junctions))
         
         return TotalWaitingTime
     
-    # Decide whether to explore or exploit, according to an epsilon-greedy policy
-    def ChooseAction(self, state, epsilon):
-        if random.random() < epsilon:
-            return random.randint(0, self.NumActions -1)
-        else:
-            return np.argmax(self.Model.PredictOne(state))
+    # Decide whether to explore or exploit for every junction, according to an epsilon-greedy policy
+    # The junctions that exploit are predicted together, so one forward pass serves all of them
+    def ChooseActions(self, States, epsilon):
+        Actions=np.zeros(len(States), dtype=np.int64)
+        Exploit=np.ones(len(States), dtype=bool)
+        for Junction in range(len(States)):
+            if random.random() < epsilon:
+                Actions[Junction]=random.randint(0, self.NumActions -1)
+                Exploit[Junction]=False
+        if Exploit.any():
+            Actions[Exploit]=np.argmax(self.Predict(States[Exploit]), axis=1)
+        
+        return Actions
+    
+    # Action values of a batch of states, a single junction takes the model's quicker path for one state
+    def Predict(self, States):
+        if len(States)==1:
+            return self.Model.PredictOne(States[0])
+        return self.Model.PredictBatch(States)
 
-    # Activates the green correct green light combination
-    def SetYellowPhase(self, OldAction):
-        YellowPhaseCode=OldAction*2+1
-        traci.trafficlight.setPhase("TL", YellowPhaseCode)
+    # Sets the phases of the junctions that just decided, a junction that changes its phase goes through yellow first
+    # Schedules when each of them starts its green phase or decides again
+    def StartPhases(self, Scheduler, Junctions, OldActions, Actions):
+        Changing=self.Junctions.Yellows(Junctions, OldActions, Actions)
+        self.SetYellowPhase(Junctions[Changing], OldActions[Changing])
+        for Junction in Junctions[Changing]:
+            Scheduler.Push(self.Step+self.YellowDuration, Scheduler.Green, Junction)
+        self.StartGreenPhases(Scheduler, Junctions[~Changing], Actions[~Changing])
+    
+    # Starts the green phases of the given junctions and schedules their next decision
+    def StartGreenPhases(self, Scheduler, Junctions, Actions):
+        self.SetGreenPhase(Junctions, Actions)
+        for Junction in Junctions:
+            Scheduler.Push(self.Step+self.GreenDuration, Scheduler.Decide, Junction)
 
-    # Activates the green correct green light combination
-    def SetGreenPhase(self, ActionNumber):
-        if ActionNumber==0:
-            traci.trafficlight.setPhase("TL",NS_Green)
-        elif ActionNumber==1:
-            traci.trafficlight.setPhase("TL",NSL_Green)
-        elif ActionNumber==2:
-            traci.trafficlight.setPhase("TL",EW_Green)
-        elif ActionNumber==3:
-            traci.trafficlight.setPhase("TL",EWL_Green)
+    # Activates the yellow phase after the old green one at the given junctions
+    def SetYellowPhase(self, Junctions, OldActions):
+        for Junction, OldAction in zip(Junctions, OldActions):
+            self.Environment.SetPhase(self.Junctions.IDs[Junction], self.Junctions.YellowPhases[Junction, OldAction])
 
-    # Get the number of cars with no speed in all the incoming lanes
+    # Activates the green correct green light combination at the given junctions
+    def SetGreenPhase(self, Junctions, Actions):
+        for Junction, ActionNumber in zip(Junctions, Actions):
+            self.Environment.SetPhase(self.Junctions.IDs[Junction], self.Junctions.GreenPhases[Junction, ActionNumber])
+
+    # Get the number of cars with no speed in all the incoming lanes of all junctions
     def GetQueueLength(self):
-        HaltN=traci.edge.getLastStepHaltingNumber("N2TL")
-        HaltS=traci.edge.getLastStepHaltingNumber("S2TL")
-        HaltE=traci.edge.getLastStepHaltingNumber("E2TL")
-        HaltW=traci.edge.getLastStepHaltingNumber("W2TL")
-        QueueLength=HaltN+HaltE+HaltS+HaltW
+        QueueLength=sum(self.Environment.HaltingNumbers(self.Junctions.IncomingEdges))
         
         return QueueLength
     
-    # Retrieves the state of the junction from sumo
+    # Retrieves the states of the junctions from sumo, one row each
     def GetState(self):
-        State=np.zeros(self.NumStates)
-        CarList=traci.vehicle.getIDList()
-        
-        for CarID in CarList:
-            LanePosition=traci.vehicle.getLanePosition(CarID)
-            LaneID=traci.vehicle.getLaneID(CarID)
-            LanePosition=750-LanePosition # If the car is close to the traffic light
-            
-            # Distance from the Traffic Light being mapped into cells
-            if LanePosition < 7:
-                LaneCell = 0
-            elif LanePosition < 14:
-                LaneCell = 1
-            elif LanePosition < 21:
-                LaneCell = 2
-            elif LanePosition < 28:
-                LaneCell = 3
-            elif LanePosition < 40:
-                LaneCell = 4
-            elif LanePosition < 60:
-                LaneCell = 5
-            elif LanePosition < 100:
-                LaneCell = 6
-            elif LanePosition < 160:
-                LaneCell = 7
-            elif LanePosition < 400:
-                LaneCell = 8
-            elif LanePosition <= 750:
-                LaneCell = 9
-            
-            # Finding where the car is located
-            # Here W2TL_3, N2TL_3, E2TL_3, S2TL_3 are 'left-only' turns
-            if LaneID == "W2TL_0" or LaneID == "W2TL_1" or LaneID == "W2TL_2":
-                LaneGroup = 0
-            elif LaneID == "W2TL_3":
-                LaneGroup = 1
-            elif LaneID == "N2TL_0" or LaneID == "N2TL_1" or LaneID == "N2TL_2":
-                LaneGroup = 2
-            elif LaneID == "N2TL_3":
-                LaneGroup = 3
-            elif LaneID == "E2TL_0" or LaneID == "E2TL_1" or LaneID == "E2TL_2":
-                LaneGroup = 4
-            elif LaneID == "E2TL_3":
-                LaneGroup = 5
-            elif LaneID == "S2TL_0" or LaneID == "S2TL_1" or LaneID == "S2TL_2":
-                LaneGroup = 6
-            elif LaneID == "S2TL_3":
-                LaneGroup = 7
-            else:
-                LaneGroup = -1
-                
-            if LaneGroup>=1 and LaneGroup<=7:
-                CarPosition=int(str(LaneGroup)+str(LaneCell)) # Creates a number between 0 and 79
-                ValidCar=True
-            elif LaneGroup==0:
-                CarPosition=LaneCell
-                ValidCar=True
-            else:
-                ValidCar=False # Flag to make sure the cars crossing the intersection/driving away from the intersection arent detected
-            
-            if ValidCar:
-                State[CarPosition]=1 # Writes the position of the Car in the state array as 'cell occupied'
+        Vehicles=self.Environment.Vehicles(self.Step)
+        Positions=np.fromiter((Variables[tc.VAR_LANEPOSITION] for Variables in Vehicles.values()), dtype=np.float64, count=len(Vehicles))
+        Groups=self.Encoder.Groups(Variables[tc.VAR_LANE_ID] for Variables in Vehicles.values())
         
-        return State
+        return self.Encoder.Encode(Positions, Groups)
     
     # Retrieve a group of samples from memory and update the learning equation for each of them, then train the Nueral Network
     def Replay(self):
         Batch=self.Memory.GetSamples(self.Model.BatchSize)
         if len(Batch)>0:
-            States=np.array([Val[0] for Val in Batch])
-            NextStates=np.array([Val[3] for Val in Batch])
+            # Predictions of Q(State) and Q(NextState) for every sample, in a single forward pass
+            Q=self.Model.PredictReplay(np.concatenate((Batch.States, Batch.NextStates)))
+            QSA, QSAD=Q[:len(Batch)], Q[len(Batch):]
             
-            # Predictions of Q(State) and Q(NextState) for every sample
-            QSA=self.Model.PredictBatch(States)
-            QSAD=self.Model.PredictBatch(NextStates)
+            # Value of the next state, from the target network if there is one, with the next action picked by the trained network for Double DQN
+            QTarget=QSAD if self.Model.TargetModel is None else self.Model.PredictTarget(Batch.NextStates)
+            if self.Model.DoubleDQN:
+                NextValues=QTarget[np.arange(len(Batch)), np.argmax(QSAD, axis=1)]
+            else:
+                NextValues=np.amax(QTarget, axis=1)
             
-            # Setting up training arrays
-            x=np.zeros((len(Batch), self.NumStates))
-            y=np.zeros((len(Batch), self.NumActions))
+            # Updates Q(State,Action) of every sample, the other actions keep their predicted value
+            Targets=Batch.Rewards+self.Gamma*NextValues
+            Errors=Targets-QSA[np.arange(len(Batch)), Batch.Actions]
+            QSA[np.arange(len(Batch)), Batch.Actions]=Targets
+        
+            self.Model.TrainBatch(Batch.States, QSA, Batch.Weights)
             
-            for i, b in enumerate(Batch):
-                State, Action, Reward, _=b[0], b[1], b[2], b[3]
-                CurrentQ=QSA[i]
-                CurrentQ[Action]=Reward+self.Gamma*np.amax(QSAD[i]) # Updates Q(State,Action)
-                x[i]=State
-                y[i]=CurrentQ
-        
-            self.Model.TrainBatch(x,y)
+            # Prioritized memory replays the samples the model is most wrong about more often
+            if Batch.Weights is not None:
+                self.Memory.UpdatePriorities(Batch.Indices, Errors)
 
     # Save stats of the episode to plot
     def SaveEpisodeStats(self):
-        self.RewardStore.append(self.SumNegativeReward)
-        self.TotalWaitStore.append(self.SumWaitingTime)
-        self.AverageQueueLengthStore.append(self.SumQueueReward / self.MaxSteps)
+        self.RecordEpisode(self.SumNegativeReward, self.SumWaitingTime, self.SumQueueReward / self.MaxSteps)
+    
+    # Keeps the stats of an episode, and writes them to the metrics file
+    def RecordEpisode(self, Reward, TotalWait, AverageQueueLength):
+        self.RewardStore.append(Reward)
+        self.TotalWaitStore.append(TotalWait)
+        self.AverageQueueLengthStore.append(AverageQueueLength)
+        if self.Metrics is not None:
+            self.Metrics.Append(self.EpisodeOffset+len(self.RewardStore), Reward, TotalWait, AverageQueueLength)
+    
+class ParallelTrainingSimulation(TrainingSimulation):
+    # Simulates NumEnvs episodes at once, each in a worker process with its own sumo, all feeding the shared Memory and Model
+    # Workers are processes rather than threads, so the Python half of every episode isn't serialized by the GIL
+    # Workers are spawned rather than forked, TensorFlow and sumo connections don't survive a fork
+    def __init__(self, Model, Memory, Traffic, Environment, Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs, NumEnvs, MetricsPath=None):
+        super().__init__(Model, Memory, Traffic, Environment, Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs, MetricsPath)
+        Settings=(Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs)
+        Context=multiprocessing.get_context('spawn')
+        Numbers=Context.Queue() # Every worker takes a number, naming its sumo and its route file
+        for Worker in range(NumEnvs):
+            Numbers.put(Worker)
+        self.Pool=ProcessPoolExecutor(max_workers=NumEnvs, mp_context=Context, initializer=StartWorker, initargs=(Numbers, Traffic, Environment, Settings))
+        atexit.register(self.Pool.shutdown) # The workers quit along with the program, before the interpreter is torn down
+    
+    # Runs one episode per worker in parallel, then trains the model for TrainingEpochs per simulated episode
+    def RunTraining(self, episodes, epsilons):
+        StartTime=timeit.default_timer()
+        
+        # Each worker picks its actions with the weights of this round and is seeded with its own episode number, so every worker sees different traffic
+        Layers=NumpyForward(self.Model.model).Layers
+        Runs=[self.Pool.submit(RunWorkerEpisode, Layers, Episode, Epsilon) for Episode, Epsilon in zip(episodes, epsilons)]
+        
+        # Samples and stats are kept in episode order
+        for Run in Runs:
+            Samples, Stats=Run.result() # Raises the error of a crashed worker
+            for Sample in Samples:
+                self.Memory.AddSample(Sample)
+            self.RecordEpisode(*Stats)
+        SimulationTime=round(timeit.default_timer() - StartTime, 1)
+        
+        print("=====Training The Model=====")
+        TrainingTime=self.Train(self.TrainingEpochs*len(Runs))
+        
+        return SimulationTime, TrainingTime
+
+class EpisodeSamples(list):
+    # Stands in for the replay memory in a worker process, keeping the samples of an episode to send them back
+    def AddSample(self, Sample):
+        self.append(Sample)
+
+class WorkerSimulation(TrainingSimulation):
+    # Simulation of a ParallelTrainingSimulation worker process, which has no Model and exploits with the weights of the round
+    def Predict(self, States):
+        return DenseForward(self.Layers, States)
+
+# Simulation of a worker process, kept between its episodes so its sumo is only started once
+WorkerState={}
+
+# Sets up a worker process on the environment and traffic it was sent, which arrive with nothing running
+def StartWorker(Numbers, Traffic, Environment, Settings):
+    Worker=Numbers.get()
+    Environment.Label="Worker_"+str(Worker) # Sumo instances running side by side need labels of their own
+    multiprocessing.util.Finalize(Environment, Environment.Shutdown, exitpriority=0) # Worker processes quit without running atexit
+    # Every worker writes its own route file, so workers don't overwrite each other's traffic
+    if Traffic.RouteFile is not None:
+        Traffic.RouteFile=os.path.join(os.path.dirname(Traffic.RouteFile), "EpisodeRoutes_"+str(Worker)+".rou.xml")
+    WorkerState['Simulation']=WorkerSimulation(None, EpisodeSamples(), Traffic, Environment, *Settings)
+
+# Simulates one episode in a worker process with the given weights, returns its samples and its stats
+def RunWorkerEpisode(Layers, Episode, Epsilon):
+    Simulation=WorkerState['Simulation']
+    Simulation.Layers=Layers
+    Simulation.Memory=EpisodeSamples()
+    Simulation.RunEpisode(Episode, Epsilon)
+    return list(Simulation.Memory), (Simulation.RewardStore[-1], Simulation.TotalWaitStore[-1], Simulation.AverageQueueLengthStore[-1])
+
+class AsyncTrainingSimulation(TrainingSimulation):
+    # Trains the model in a learner thread while the actor keeps simulating, instead of one after the other
+    def __init__(self, Model, Memory, Traffic, Environment, Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs, SyncEvery, MetricsPath=None):
+        super().__init__(Model, Memory, Traffic, Environment, Gamma, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs, MetricsPath)
+        self.SyncEvery=SyncEvery # Number of updates after which the actor picks up the learner's weights
+        self.Actor=NumpyForward(Model.model) # Copy of the weights the actor picks actions with
     
+    # Simulates an episode while training on the memory gathered so far, episodes still get TrainingEpochs updates each
+    def RunTraining(self, episode, epsilon):
+        ActorDone=threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as Pool:
+            Learner=Pool.submit(self.Learn, self.TrainingEpochs, ActorDone)
+            try:
+                SimulationTime=self.RunEpisode(episode, epsilon)
+            finally:
+                ActorDone.set()
+            TrainingTime=Learner.result()
+        
+        return SimulationTime, TrainingTime
+    
+    # Runs the replay updates of one episode, returns the time spent training
+    def Learn(self, Epochs, ActorDone):
+        TrainingTime=0
+        Done=0
+        while Done<Epochs:
+            if self.Memory.SizeNow()<self.Memory.SizeMin:
+                if ActorDone.is_set():
+                    break # Memory is still too small once the episode is over, the same as replaying from it sequentially
+                ActorDone.wait(0.1)
+                continue
+            
+            StartTime=timeit.default_timer()
+            self.Replay()
+            TrainingTime+=timeit.default_timer()-StartTime
+            Done+=1
+            if Done%self.SyncEvery==0:
+                self.Actor.LoadWeights(self.Model.model)
+        self.Actor.LoadWeights(self.Model.model)
+        
+        return round(TrainingTime, 1)
+    
+    # Exploits with the actor's copy of the weights
+    def Predict(self, States):
+        return self.Actor(States)
+
 class TestingSimulation:
     # Basic Class Definition
-    def __init__(self, Model, Traffic, Sumo, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions):
+    # With a MetricsPath the queue length of every step is streamed to Steps.csv in it, and the reward of every decision to Decisions.csv
+    # Every row starts with the episode, the files are carried on across episodes and runs
+    # A Controller from controllers.py picks the actions instead of the Model, which can then be None
+    def __init__(self, Model, Traffic, Environment, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, MetricsPath=None, Controller=None):
         self.Model=Model
+        self.Controller=Controller
         self.Traffic=Traffic
         self.Step=0
-        self.Sumo=Sumo
+        self.Environment=Environment
         self.MaxSteps=MaxSteps
         self.GreenDuration=GreenDuration
         self.YellowDuration=YellowDuration
         self.NumStates=NumStates
         self.NumActions=NumActions
         self.EpisodeReward=[]
-        self.EpisodeQueueLength=[]
+        self.EpisodeQueueLength=np.zeros(MaxSteps, dtype=np.int64) # Queue length after every step of the episode
+        self.MetricsPath=MetricsPath
+        if MetricsPath is not None:
+            self.StepMetrics=MetricsSink(os.path.join(MetricsPath, "Steps.csv"), ["Episode", "Step", "Queue"])
+            self.DecisionMetrics=MetricsSink(os.path.join(MetricsPath, "Decisions.csv"), ["Episode", "Step", "Reward"])
+        self.Junctions=Environment.Junctions
+        if NumActions>self.Junctions.GreenPhases.shape[1]:
+            raise ValueError("The junctions have green phases for %i actions, not %i"%(self.Junctions.GreenPhases.shape[1], NumActions))
+        self.Encoder=LaneCellEncoder(NumStates, self.Junctions, Inclusive=False)
 
     # Runs the testing simulation        
     def RunTesting(self, episode):
         StartTime=timeit.default_timer()
         
         self.Traffic.GenerateRoutes(seed=episode)
-        traci.start(self.Sumo)
+        self.Environment.Start(self.Traffic)
         print("=====Testing Cars=====")
         
         # Initialisations
         self.Step=0
         self.WaitingTimes={}
-        OldWaitTime=0
-        OldAction=-1 # Arbitrary Initialisation
+        self.EpisodeReward=[]
+        self.EpisodeQueueLength=np.zeros(self.MaxSteps, dtype=np.int64)
+        self.Episode=episode
+        OldWaitTime=np.zeros(len(self.Junctions))
+        OldActions=np.full(len(self.Junctions), -1) # Arbitrary Initialisation
+        Scheduler=DecisionScheduler(len(self.Junctions))
+        if self.Controller is not None:
+            self.Controller.Reset(episode, len(self.Junctions))
         
-        while self.Step<self.MaxSteps:
-            CurrentState=self.GetState()
-            CurrentTotalWait=self.CollectWaitingTimes()
-            Reward=OldWaitTime-CurrentTotalWait
-            
-            Action=self.ChooseAction(CurrentState)
+        while True:
+            Time, Greens, Deciding=Scheduler.Next()
+            self.Simulate(Time-self.Step)
+            if self.Step>=self.MaxSteps:
+                break
+            self.StartGreenPhases(Scheduler, Greens, OldActions[Greens])
+            if len(Deciding)==0:
+                continue
             
-            if self.Step!=0 and OldAction!=Action:
-                self.SetYellowPhase(OldAction)
-                self.Simulate(self.YellowDuration)
+            CurrentStates=self.GetState()[Deciding]
+            CurrentTotalWait=self.CollectWaitingTimes()[Deciding]
+            Rewards=OldWaitTime[Deciding]-CurrentTotalWait
             
-            self.SetGreenPhase(Action)
-            self.Simulate(self.GreenDuration)
+            Actions=self.ChooseActions(CurrentStates, Deciding)
+            self.StartPhases(Scheduler, Deciding, OldActions[Deciding], Actions)
             
-            OldAction=Action
-            OldWaitTime=CurrentTotalWait
-            self.EpisodeReward.append(Reward)
+            OldActions[Deciding]=Actions
+            OldWaitTime[Deciding]=CurrentTotalWait
+            self.EpisodeReward.append(float(Rewards.sum()))
+            if self.MetricsPath is not None:
+                self.DecisionMetrics.Append(episode, self.Step, self.EpisodeReward[-1])
             
-        traci.close()
+        self.Environment.Close()
+        if self.Environment.QueueEdges is not None:
+            self.EpisodeQueueLength=self.Environment.QueueLengths(self.MaxSteps)
+            if self.MetricsPath is not None:
+                self.StepMetrics.Extend(np.full(self.MaxSteps, episode), np.arange(1, self.MaxSteps+1), self.EpisodeQueueLength)
+        if self.MetricsPath is not None:
+            self.StepMetrics.Flush()
+            self.DecisionMetrics.Flush()
         SimulationTime=round(timeit.default_timer()-StartTime, 1)
         
         return SimulationTime
@@ -317,120 +543,82 @@ class TestingSimulation:
         if (self.Step+StepsToDo)>=self.MaxSteps:
             StepsToDo=self.MaxSteps-self.Step
         
+        # The environment records the queue of every step itself, so the whole phase is simulated in one call
+        if self.Environment.QueueEdges is not None:
+            if StepsToDo>0:
+                self.Environment.Step(StepsToDo)
+                self.Step+=StepsToDo
+            return
+        
         while StepsToDo>0:
-            traci.simulationStep()
+            self.Environment.Step()
             self.Step+=1
             StepsToDo-=1
-            QueueLength=self.GetQueueLength()
-            self.EpisodeQueueLength.append(QueueLength)
+            self.EpisodeQueueLength[self.Step-1]=self.GetQueueLength()
+            if self.MetricsPath is not None:
+                self.StepMetrics.Append(self.Episode, self.Step, self.EpisodeQueueLength[self.Step-1])
 
-    # Collect the waiting time for every car in the Incoming Roads            
+    # Collect the waiting time for every car in the Incoming Roads, summed up for each junction
     def CollectWaitingTimes(self):
-        IncomingRoads=["E2TL", "N2TL", "W2TL", "S2TL"]
-        CarList=traci.vehicle.getIDList()
-        for CarID in CarList:
-            WaitTime=traci.vehicle.getAccumulatedWaitingTime(CarID)
-            RoadID=traci.vehicle.getRoadID(CarID) # Get Road ID on which the vehicle is
+        IncomingRoads=self.Junctions.EdgeJunctions
+        Vehicles=self.Environment.Vehicles(self.Step)
+        for CarID, Variables in Vehicles.items():
+            WaitTime=Variables[tc.VAR_ACCUMULATED_WAITING_TIME]
+            RoadID=Variables[tc.VAR_ROAD_ID] # Get Road ID on which the vehicle is
             if RoadID in IncomingRoads: # Considers only waiting time of cars in incoming roads
-                self.WaitingTimes[CarID]=WaitTime
+                self.WaitingTimes[CarID]=(IncomingRoads[RoadID], WaitTime)
             else:
                 if CarID in self.WaitingTimes: # Car that was tracked and has now cleared the intersection
                     del self.WaitingTimes[CarID]
-        TotalWaitingTime=sum(self.WaitingTimes.values())
+        TotalWaitingTime=np.zeros(len(self.Junctions))
+        if self.WaitingTimes:
+            Junctions, WaitTimes=zip(*self.WaitingTimes.values())
+            TotalWaitingTime=np.bincount(Junctions, weights=WaitTimes, minlength=len(self.Junctions))
         
         return TotalWaitingTime
 
-    # Picks the best action based on the current state of the environment            
-    def ChooseAction(self,state):
-        return np.argmax(self.Model.PredictOne(state))
+    # Picks the best action based on the current state of every given junction, in one forward pass for all of them
+    def ChooseActions(self, States, Junctions):
+        if self.Controller is not None:
+            return self.Controller.ChooseActions(self, Junctions, States)
+        if len(States)==1:
+            return np.argmax(self.Model.PredictOne(States[0]), axis=1)
+        return np.argmax(self.Model.PredictBatch(States), axis=1)
 
-    # Activates the green correct green light combination
-    def SetYellowPhase(self, OldAction):
-        YellowPhaseCode=OldAction*2+1
-        traci.trafficlight.setPhase("TL", YellowPhaseCode)    
+    # Sets the phases of the junctions that just decided, a junction that changes its phase goes through yellow first
+    # Schedules when each of them starts its green phase or decides again
+    def StartPhases(self, Scheduler, Junctions, OldActions, Actions):
+        Changing=self.Junctions.Yellows(Junctions, OldActions, Actions)
+        self.SetYellowPhase(Junctions[Changing], OldActions[Changing])
+        for Junction in Junctions[Changing]:
+            Scheduler.Push(self.Step+self.YellowDuration, Scheduler.Green, Junction)
+        self.StartGreenPhases(Scheduler, Junctions[~Changing], Actions[~Changing])
+    
+    # Starts the green phases of the given junctions and schedules their next decision
+    def StartGreenPhases(self, Scheduler, Junctions, Actions):
+        self.SetGreenPhase(Junctions, Actions)
+        for Junction in Junctions:
+            Scheduler.Push(self.Step+self.GreenDuration, Scheduler.Decide, Junction)
+
+    # Activates the yellow phase after the old green one at the given junctions
+    def SetYellowPhase(self, Junctions, OldActions):
+        for Junction, OldAction in zip(Junctions, OldActions):
+            self.Environment.SetPhase(self.Junctions.IDs[Junction], self.Junctions.YellowPhases[Junction, OldAction])
 
-    # Activates the green correct green light combination
-    def SetGreenPhase(self,ActionNumber):
-        if ActionNumber==0:
-            traci.trafficlight.setPhase("TL", NS_Green)
-        elif ActionNumber==1:
-            traci.trafficlight.setPhase("TL",NSL_Green)
-        elif ActionNumber==2:
-            traci.trafficlight.setPhase("TL",EW_Green)
-        elif ActionNumber==3:
-            traci.trafficlight.setPhase("TL",EWL_Green)
+    # Activates the green correct green light combination at the given junctions
+    def SetGreenPhase(self, Junctions, Actions):
+        for Junction, ActionNumber in zip(Junctions, Actions):
+            self.Environment.SetPhase(self.Junctions.IDs[Junction], self.Junctions.GreenPhases[Junction, ActionNumber])
 
-    # Get the number of cars with no speed in all the incoming lanes
+    # Get the number of cars with no speed in all the incoming lanes of all junctions
     def GetQueueLength(self):
-        HaltN=traci.edge.getLastStepHaltingNumber("N2TL")
-        HaltS=traci.edge.getLastStepHaltingNumber("S2TL")
-        HaltE=traci.edge.getLastStepHaltingNumber("E2TL")
-        HaltW=traci.edge.getLastStepHaltingNumber("W2TL")
-        
-        QueueLength=HaltN+HaltS+HaltE+HaltW
+        QueueLength=sum(self.Environment.HaltingNumbers(self.Junctions.IncomingEdges))
         return QueueLength
 
-    # Retrieves the state of the junction from sumo              
+    # Retrieves the states of the junctions from sumo, one row each
     def GetState(self):
-        State=np.zeros(self.NumStates)
-        CarList=traci.vehicle.getIDList()
-        
-        for CarID in CarList:
-            LanePosition=traci.vehicle.getLanePosition(CarID)
-            LaneID=traci.vehicle.getLaneID(CarID)
-            LanePosition=750-LanePosition
-            
-            if LanePosition<7:
-                LaneCell=0
-            elif LanePosition<14:
-                LaneCell=1
-            elif LanePosition<21:
-                LaneCell=2
-            elif LanePosition<28:
-                LaneCell=3
-            elif LanePosition<40:
-                LaneCell=4
-            elif LanePosition<60:
-                LaneCell=5
-            elif LanePosition<100:
-                LaneCell=6
-            elif LanePosition<160:
-                LaneCell=7
-            elif LanePosition<400:
-                LaneCell=8
-            elif LanePosition<750:
-                LaneCell=9
-            
-            # Any lanes ending with 3 are the "Turn Left Only" Lanes
-            if LaneID == "W2TL_0" or LaneID == "W2TL_1" or LaneID == "W2TL_2":
-                LaneGroup = 0
-            elif LaneID == "W2TL_3":
-                LaneGroup = 1
-            elif LaneID == "N2TL_0" or LaneID == "N2TL_1" or LaneID == "N2TL_2":
-                LaneGroup = 2
-            elif LaneID == "N2TL_3":
-                LaneGroup = 3
-            elif LaneID == "E2TL_0" or LaneID == "E2TL_1" or LaneID == "E2TL_2":
-                LaneGroup = 4
-            elif LaneID == "E2TL_3":
-                LaneGroup = 5
-            elif LaneID == "S2TL_0" or LaneID == "S2TL_1" or LaneID == "S2TL_2":
-                LaneGroup = 6
-            elif LaneID == "S2TL_3":
-                LaneGroup = 7
-            else:
-                LaneGroup = -1
-                
-            if LaneGroup >= 1 and LaneGroup <= 7:
-                CarPosition = int(str(LaneGroup) + str(LaneCell))  # composition of the two postion ID to create a number in interval 0-79
-                ValidCar = True
-            elif LaneGroup == 0:
-                CarPosition = LaneCell
-                ValidCar = True
-            else:
-                ValidCar = False  # Doesnt detect cars crossing the intersection or driving away from it
-
-            if ValidCar:
-                State[CarPosition]=1
+        Vehicles=self.Environment.Vehicles(self.Step)
+        Positions=np.fromiter((Variables[tc.VAR_LANEPOSITION] for Variables in Vehicles.values()), dtype=np.float64, count=len(Vehicles))
+        Groups=self.Encoder.Groups(Variables[tc.VAR_LANE_ID] for Variables in Vehicles.values())
         
-        return State
\ No newline at end of file
+        return self.Encoder.Encode(Positions, Groups)
@@ -4,14 +4,25 @@ from __future__ import print_function
 import os
 import argparse
 
-from utilities import SetSumo,SetTestPath,TrafficGen,Visualization,ImportSettings
-from model import TestModel
+from utilities import SetSumo,SetTestPath,TrafficGen,ScenarioBank,Visualization,ImportSettings
+from model import TestModel, Backends
+from runtime import ExportedModel
 from simulations import TestingSimulation
+from environment import TraciEnvironment, NumpyEnvironment, JunctionLayout
+from profiling import Profiler
 
 def parse_args():
     # Takes arguments from command line
     Parser=argparse.ArgumentParser()
     Parser.add_argument('--ModelNumber',help='Model Number to be Tested',type=int,default = 4) #required=True)
+    Parser.add_argument('--Environment',help='Simulate in sumo, or in the much faster NumPy stand-in of the junction (no sumo needed)',choices=['sumo','numpy'],default='sumo')
+    Parser.add_argument('--RouteFile',help='Route file the traffic is written to for sumo',default=os.path.join('Junction','EpisodeRoutes.rou.xml'))
+    Parser.add_argument('--ScenarioBank',help='Scenario bank made by scenarios.py to take the traffic from, instead of generating it')
+    Parser.add_argument('--StepPhases',help='Simulates every green/yellow phase in one call, the queue length of every step is read from the environment at the end of the episode',action='store_true')
+    Parser.add_argument('--Backend',help='How the Model picks an action from a single state',choices=Backends,default='function')
+    Parser.add_argument('--Exported',help='Tests the TrainedModel.npz written by export.py with the NumPy-only runtime instead of the Keras model',action='store_true')
+    Parser.add_argument('--Profile',help='Times the state, reward, queue, stepping and inference calls, and prints their count, total and p50/p99',action='store_true')
+    Parser.add_argument('--ProfileDump',help='Runs the episode under cProfile and saves the stats to Profile_Episode_1.prof in the test folder',action='store_true')
     
     return Parser.parse_args()
 
@@ -19,21 +30,34 @@ def parse_args():
 if __name__=="__main__":
     args=parse_args()
     config=ImportSettings(os.path.join("Models","Model_4","Settings.ini"))
-    # Setting up cmd command to run sumo during simulation
-    SumoCmd=SetSumo(config['gui'],"SumoConfig.sumocfg",config['maxsteps'])
+    # Setting up cmd command to run sumo during simulation, or the stand-in that runs without it
+    NetFile=os.path.join("Junction","Environment.net.xml")
+    QueueEdges=JunctionLayout(NetFile).IncomingEdges if args.StepPhases else None
+    if args.Environment=='sumo':
+        Environment=TraciEnvironment(SetSumo(config['gui'],"SumoConfig.sumocfg",config['maxsteps']),NetFile=NetFile,QueueEdges=QueueEdges)
+    else:
+        Environment=NumpyEnvironment(NetFile,QueueEdges=QueueEdges)
     # Setting up the path of the Model to be tested
     ModelPath,PlotPath=SetTestPath(args.ModelNumber)
     
-    TestModel=TestModel(config['numstates'],ModelPath)
-    TrafficGen=TrafficGen(config['maxsteps'],config['n_cars'])
+    TestModel=ExportedModel(config['numstates'],ModelPath) if args.Exported else TestModel(config['numstates'],ModelPath,args.Backend)
+    Bank=ScenarioBank(args.ScenarioBank) if args.ScenarioBank else None
+    TrafficGen=TrafficGen(config['maxsteps'],config['n_cars'],args.RouteFile if args.Environment=='sumo' else None,Bank,config['weibulldepartures'])
     Visualization=Visualization(PlotPath,config['dpi'])
-    TestingSimulation=TestingSimulation(TestModel,TrafficGen,SumoCmd,config['maxsteps'],config['greenduration'],config['yellowduration'],config['numstates'],config['numactions'])
+    TestingSimulation=TestingSimulation(TestModel,TrafficGen,Environment,config['maxsteps'],config['greenduration'],config['yellowduration'],config['numstates'],config['numactions'],PlotPath)
+    
+    Timers=Profiler(1 if args.ProfileDump else None,PlotPath)
+    if args.Profile:
+        Timers.Instrument(TestingSimulation)
     
     print('\n=============== Testing Episode ===============')
+    Timers.Begin([0])
     SimulationTime=TestingSimulation.RunTesting(1000)
     print('Simulation Time:',SimulationTime,'Seconds')
+    Timers.End('Profile of the Testing Episode')
     print("Model Testing Info is saved at:",PlotPath)
     
+    # Steps.csv and Decisions.csv hold every episode tested with the model, the plots are of the episode just run
     Visualization.DataAndPlot(data=TestingSimulation.EpisodeReward, filename='Reward',xlabel='Action Step',ylabel='Reward')
     Visualization.DataAndPlot(data=TestingSimulation.EpisodeQueueLength, filename='Queue',xlabel='Step',ylabel='Queue Length (In Vehicles)')
     
\ No newline at end of file
@@ -5,14 +5,15 @@ import configparser
 import sys
 import os
 import datetime
-import time
-import tensorflow as tf
-import sumo_visualizer as sv
+import timeit
 
 
-from model import TrainModel
-from utilities import SetSumo, SetTrainPath, Visualization, TrafficGen, Memory, ImportSettings, MaxModelNumber
-from simulations import TrainingSimulation
+from model import TrainModel, Backends, TargetUpdates
+from utilities import SetSumo, SetModelPath, Visualization, TrafficGen, ScenarioBank, Memory, PrioritizedMemory, ImportSettings
+from simulations import TrainingSimulation, ParallelTrainingSimulation, AsyncTrainingSimulation
+from environment import TraciEnvironment, NumpyEnvironment, JunctionLayout
+from checkpoint import SaveCheckpoint, LoadCheckpoint, CheckpointName
+from profiling import Profiler
 
 from sumolib import checkBinary
 def parse_args() -> argparse.Namespace:
@@ -20,12 +21,23 @@ def parse_args() -> argparse.Namespace:
     Parser=argparse.ArgumentParser()
     
     # Misc arguments
-    Parser.add_argument('--Mode',help='Choose between making a new model and working further on an existing model',choices=['normal','retraining'],default='normal')
+    Parser.add_argument('--Mode',help='Choose between making a new model, working further on an existing model and resuming the latest model from its last checkpoint',choices=['normal','retraining','resume'],default='normal')
     Parser.add_argument('--Gui',help='GUI display option',type=bool,default=True)
+    Parser.add_argument('--Environment',help='Simulate in sumo, or in the much faster NumPy stand-in of the junction (no sumo needed)',choices=['sumo','numpy'],default='sumo')
+    Parser.add_argument('--StepPhases',help='Simulates every green/yellow phase in one call, the queue length of every step is read from the environment at the end of the episode',action='store_true')
     Parser.add_argument('--TotalEpisodes',help='Total Number of Episodes to train the model on',type=int,default=25)
     Parser.add_argument('--MaxSteps',help='Max Number of steps that can be taken',type=int,default=5400)
     Parser.add_argument('--N_Cars',help='Number of cars to be generated in each episode',type=int,default=1000)
+    Parser.add_argument('--RouteFile',help='Route file the traffic of every episode is written to for sumo, the parallel workers write theirs next to it',default=os.path.join('Junction','EpisodeRoutes.rou.xml'))
+    Parser.add_argument('--WeibullDepartures',help='Spreads the departures of the cars over the episode along a Weibull distribution, instead of all cars departing at the same step',action='store_true')
+    Parser.add_argument('--ScenarioBank',help='Scenario bank made by scenarios.py to take the traffic of every episode from, instead of generating it')
+    Parser.add_argument('--CheckpointEvery',help='Saves the whole training state every this many episodes so the run can be resumed, 0 to never',type=int,default=5)
     Parser.add_argument('--SaveSteps', help='Saves the model after every 5 episodes', action='store_true')
+    Parser.add_argument('--NumEnvs',help='Number of worker processes simulating episodes in parallel, each with its own sumo',type=int,default=1)
+    Parser.add_argument('--Async',help='Trains the model while the episode is being simulated',action='store_true')
+    Parser.add_argument('--SyncEvery',help='Number of training updates after which the simulation picks up the new weights in --Async mode',type=int,default=50)
+    Parser.add_argument('--Profile',help='Times the state, reward, queue, stepping, inference and training calls, and prints their count, total and p50/p99 after every episode',action='store_true')
+    Parser.add_argument('--ProfileEpisode',help='Runs this episode under cProfile and saves the stats to Profile_Episode_<n>.prof in the model folder',type=int)
     
     # Model arguments
     Parser.add_argument('--NumLayers',help='Number of Layers in the Nueral Network',type=int,default=5)
@@ -34,6 +46,11 @@ def parse_args() -> argparse.Namespace:
     Parser.add_argument('--LearningRate',help='Learning Rate for the Model',type=float,default=0.001)
     Parser.add_argument('--NumStates',help='Shape of the Inner Layers of the Nueral Network',type=int,default=80)
     Parser.add_argument('--NumActions',help='Output Shape of the Nueral Network',type=int,default=4)
+    Parser.add_argument('--Backend',help='How the Model picks an action from a single state',choices=Backends,default='function')
+    Parser.add_argument('--TargetUpdate',help='Target network for the Q-learning targets, copied every --TargetEvery training steps (hard) or moved --Tau towards the trained network after every step (polyak)',choices=TargetUpdates,default='none')
+    Parser.add_argument('--TargetEvery',help='Training steps between copies of the weights into the target network with --TargetUpdate hard',type=int,default=500)
+    Parser.add_argument('--Tau',help='Fraction of the way the target network moves towards the trained network after every step with --TargetUpdate polyak',type=float,default=0.005)
+    Parser.add_argument('--DoubleDQN',help='Picks the next action with the trained network and values it with the target network',action='store_true')
     
     # Visualization arguments
     Parser.add_argument('--dpi',type=int,default=100)
@@ -41,23 +58,128 @@ def parse_args() -> argparse.Namespace:
     # Memory arguments
     Parser.add_argument('--MaxMemorySize',help='Maximum Size of Memory',type=int,default=50000)
     Parser.add_argument('--MinMemorySize',help='Minimum Size of Memory',type=int,default=600)
+    Parser.add_argument('--Prioritized',help='Replays samples in proportion to their TD error instead of uniformly',action='store_true')
+    Parser.add_argument('--Alpha',help='How strongly --Prioritized favours samples with a large error, 0 is uniform',type=float,default=0.6)
+    Parser.add_argument('--Beta',help='How much --Prioritized corrects the loss for the uneven sampling, 1 is fully',type=float,default=0.4)
     
     # Training Simulation arguments
     Parser.add_argument('--GreenDuration',help='Duration in seconds for the traffic light to remain green',type=int,default=10)
     Parser.add_argument('--YellowDuration',help='Duration in seconds for the traffic light to remain yellow',type=int,default=4)
     Parser.add_argument('--TrainingEpochs',type=int,default=800)
     
-    return Parser.parse_args()
+    args=Parser.parse_args()
+    if args.Async and args.NumEnvs>1:
+        Parser.error('--Async runs a single sumo instance, it cannot be combined with --NumEnvs')
+    if args.DoubleDQN and args.TargetUpdate=='none':
+        Parser.error('--DoubleDQN values the next action with the target network, it needs --TargetUpdate hard or polyak')
+    
+    return args
+
+def CreateSimulation(args, Model, Memory, Traffic, Environment, MaxSteps, GreenDuration, YellowDuration, NumStates, NumActions, TrainingEpochs, DataPath):
+    # Creates the Env in which the model will be trained, on several sumo instances, training while simulating, or one episode at a time
+    if args.NumEnvs>1:
+        return ParallelTrainingSimulation(Model,Memory,Traffic,Environment,0.75,MaxSteps,GreenDuration,YellowDuration,NumStates,NumActions,TrainingEpochs,args.NumEnvs,DataPath)
+    elif args.Async:
+        return AsyncTrainingSimulation(Model,Memory,Traffic,Environment,0.75,MaxSteps,GreenDuration,YellowDuration,NumStates,NumActions,TrainingEpochs,args.SyncEvery,DataPath)
+    else:
+        return TrainingSimulation(Model,Memory,Traffic,Environment,0.75,MaxSteps,GreenDuration,YellowDuration,NumStates,NumActions,TrainingEpochs,MetricsPath=DataPath)
+
+def Train(args, Model, Memory, Simulation, DataPath, Episode, dpi, StartTimeStamp):
+    # Runs the episodes from Episode up to TotalEpisodes, then saves the model and plots its metrics
+    Visualisation=Visualization(DataPath,dpi)
+    
+    Timers=Profiler(args.ProfileEpisode,DataPath) if args.Profile or args.ProfileEpisode else None
+    if args.Profile:
+        Timers.Instrument(Simulation)
+    
+    while Episode<args.TotalEpisodes:
+        EpisodeStart=timeit.default_timer()
+        if Timers is not None:
+            Timers.Begin(range(Episode,Episode+args.NumEnvs))
+        if args.NumEnvs>1:
+            # Every worker simulates one of the next episodes
+            Episodes=list(range(Episode, min(Episode+args.NumEnvs, args.TotalEpisodes)))
+            print('=============== Episodes',str(Episodes[0]+1), 'to', str(Episodes[-1]+1), 'of', str(args.TotalEpisodes), ' ===============')
+            Epsilons=[1-(E/args.TotalEpisodes) for E in Episodes]
+            SimulationTime, TrainingTime = Simulation.RunTraining(Episodes,Epsilons)
+        else:
+            Episodes=[Episode]
+            print('=============== Episode',str(Episode+1), 'of', str(args.TotalEpisodes), ' ===============')
+            Epsilon=1-(Episode/args.TotalEpisodes) # Sets epsilon for the current episode for epsilon greedy policy
+            SimulationTime, TrainingTime = Simulation.RunTraining(Episode,Epsilon)
+        print('\n=============== Episode Stats ===============')
+        print('Simulation Time:', SimulationTime, 'Seconds')
+        print('Training Time:', TrainingTime, 'Seconds')
+        print('Total Time:', round(timeit.default_timer()-EpisodeStart,1), 'Seconds') # Simulation and training overlap in --Async mode
+        print('=============================================')
+        if Timers is not None:
+            Timers.End('Profile of Episode '+str(Episodes[-1]+1))
+        Episode+=len(Episodes)
+        
+        if(args.CheckpointEvery and Episode//args.CheckpointEvery>(Episode-len(Episodes))//args.CheckpointEvery): # Passed a multiple of CheckpointEvery episodes
+            SaveCheckpoint(DataPath,Episode,args.TotalEpisodes,Model,Memory,Simulation)
+        
+        # import sumo_visualizer
+
+        # # Create a SumoVisualizer object.
+        # visualizer = sumo_visualizer.SumoVisualizer("D:\Programming\Code\Python\RL\Traffic\TCS\Junction\Environment.net.xml", "D:\Programming\Code\Python\RL\Traffic\TCS\Junction\EpisodeRoutes.rou.xml")
+
+        # # Start the SUMO simulation.
+        # visualizer.sumo_sim.start()
+
+        # # Train the Deep Q Learning agent.
+        # while not Model.is_trained():
+        #     # Get the agent's state and action.
+        #     agent_state = Model.get_state()
+        #     agent_action = Model.act(agent_state)
+
+        #     # Update the SUMO simulation with the agent's action.
+        #     visualizer.sumo_sim.step(agent_action)
+
+        #     # Visualize the SUMO simulation state.
+        #     visualizer.visualize_step(agent_state, agent_action)
+
+        # # Stop the SUMO simulation.
+        # visualizer.close()
+        
+        if(args.SaveSteps and Episode//5>(Episode-len(Episodes))//5 and Episode!=args.TotalEpisodes): # Passed a multiple of 5 episodes
+            StepData=DataPath+"Episode "+str(Episode)
+            Viz=Visualization(StepData,dpi)
+            Model.SaveModel(StepData)
+            Viz.PlotMetrics(os.path.join(DataPath,'Episodes.csv'), 'Reward', filename='Reward', xlabel='Episode', ylabel='Total Negative Reward')
+            Viz.PlotMetrics(os.path.join(DataPath,'Episodes.csv'), 'Delay', filename='Delay', xlabel='Episode', ylabel='Total Delay (In Seconds)')
+            Viz.PlotMetrics(os.path.join(DataPath,'Episodes.csv'), 'Queue', filename='Queue', xlabel='Episode', ylabel='Average Queue Length (Number Of Vehicles)')
+            print("Model Info is saved at:",StepData)
+            
+    print('\n=============== Session Stats ===============')
+    print('Start Time:', StartTimeStamp)
+    print('End Time:', datetime.datetime.now())
+    print('Model trained in this Session is saved at:', DataPath)
+    print('=============================================')
+    
+    Model.SaveModel(DataPath)
+    
+    Visualisation.PlotMetrics(os.path.join(DataPath,'Episodes.csv'), 'Reward', filename='Reward', xlabel='Episode', ylabel='Total Negative Reward')
+    Visualisation.PlotMetrics(os.path.join(DataPath,'Episodes.csv'), 'Delay', filename='Delay', xlabel='Episode', ylabel='Total Delay (In Seconds)')
+    Visualisation.PlotMetrics(os.path.join(DataPath,'Episodes.csv'), 'Queue', filename='Queue', xlabel='Episode', ylabel='Average Queue Length (Number Of Vehicles)')
 
 if __name__ == "__main__":
     args=parse_args()
     config=configparser.ConfigParser()
     
-    #Setting up cmd command to run sumo during simulation
-    SumoCmd=SetSumo(args.Gui,"D:\Programming\Code\Python\RL\Traffic\TCS\Junction\SumoConfig.sumocfg",args.MaxSteps)
+    #Setting up cmd command to run sumo during simulation, or the stand-in that runs without it
+    NetFile=os.path.join("Junction","Environment.net.xml")
+    QueueEdges=JunctionLayout(NetFile).IncomingEdges if args.StepPhases else None
+    if args.Environment=='sumo':
+        Environment=TraciEnvironment(SetSumo(args.Gui,"D:\Programming\Code\Python\RL\Traffic\TCS\Junction\SumoConfig.sumocfg",args.MaxSteps),NetFile=NetFile,QueueEdges=QueueEdges)
+    else:
+        Environment=NumpyEnvironment(NetFile,QueueEdges=QueueEdges)
+    Bank=ScenarioBank(args.ScenarioBank) if args.ScenarioBank else None
     
-    # Setting up the Model Directory
-    DataPath=SetTrainPath("D:\Programming\Code\Python\RL\Traffic\TCS\Models")
+    # Setting up the Model Directory, the checkpoint is kept in it as well
+    DataPath=SetModelPath("Models",args.Mode)
+    if args.Mode=='resume' and not os.path.isfile(os.path.join(DataPath,CheckpointName)):
+        sys.exit('There Is No Checkpoint To Resume In '+DataPath)
     
     Episode=0
     StartTimeStamp=datetime.datetime.now() # To Show the starting time when the program is done executing
@@ -68,6 +190,7 @@ if __name__ == "__main__":
         config.set('Misc','Gui',str(True))
         config.set('Misc','MaxSteps',str(args.MaxSteps))
         config.set('Misc','N_Cars',str(args.N_Cars))
+        config.set('Misc','WeibullDepartures',str(args.WeibullDepartures))
         config.add_section('Model')
         config.set('Model','NumLayers',str(args.NumLayers))
         config.set('Model','LayerWidth',str(args.LayerWidth))
@@ -75,6 +198,10 @@ if __name__ == "__main__":
         config.set('Model','LearningRate',str(args.LearningRate))
         config.set('Model','NumStates',str(args.NumStates))
         config.set('Model','NumActions',str(args.NumActions))
+        config.set('Model','TargetUpdate',args.TargetUpdate)
+        config.set('Model','TargetEvery',str(args.TargetEvery))
+        config.set('Model','Tau',str(args.Tau))
+        config.set('Model','DoubleDQN',str(args.DoubleDQN))
         config.add_section('Simulation')
         config.set('Simulation','GreenDuration',str(args.GreenDuration))
         config.set('Simulation','YellowDuration',str(args.YellowDuration))
@@ -84,121 +211,41 @@ if __name__ == "__main__":
         config.add_section('Memory')
         config.set('Memory','MaxMemorySize',str(args.MaxMemorySize))
         config.set('Memory','MinMemorySize',str(args.MinMemorySize))
+        config.set('Memory','Prioritized',str(args.Prioritized))
+        config.set('Memory','Alpha',str(args.Alpha))
+        config.set('Memory','Beta',str(args.Beta))
         FP=open(os.path.join(DataPath,"Settings.ini"),'x')
         config.write(FP)
         FP.close()
 
         # Initialising the Model
-        Model=TrainModel(args.NumLayers,args.LayerWidth,args.BatchSize,args.LearningRate,args.NumStates,args.NumActions)
+        Model=TrainModel(args.NumLayers,args.LayerWidth,args.BatchSize,args.LearningRate,args.NumStates,args.NumActions,Backend=args.Backend,TargetUpdate=args.TargetUpdate,TargetEvery=args.TargetEvery,Tau=args.Tau,DoubleDQN=args.DoubleDQN)
         
-        # Graphs and Stuff
-        Visualisation=Visualization(DataPath,args.dpi)
-        
-        #Generate Traffic/Routes taken by cars
-        Traffic = TrafficGen(args.MaxSteps, args.N_Cars)
+        #Generate Traffic/Routes taken by cars, the stand-in takes them from memory without a route file
+        Traffic = TrafficGen(args.MaxSteps, args.N_Cars, args.RouteFile if args.Environment=='sumo' else None, Bank, args.WeibullDepartures)
         
         #Creates Memory
-        Memory=Memory(args.MaxMemorySize, args.MinMemorySize)
+        Memory=PrioritizedMemory(args.MaxMemorySize, args.MinMemorySize, args.Alpha, args.Beta) if args.Prioritized else Memory(args.MaxMemorySize, args.MinMemorySize)
         
         # Creates the Env in which the model will be trained
-        TrainingSimulation=TrainingSimulation(Model,Memory,Traffic,SumoCmd,0.75,args.MaxSteps,args.GreenDuration,args.YellowDuration,args.NumStates,args.NumActions,args.TrainingEpochs)
+        Simulation=CreateSimulation(args,Model,Memory,Traffic,Environment,args.MaxSteps,args.GreenDuration,args.YellowDuration,args.NumStates,args.NumActions,args.TrainingEpochs,DataPath)
         
-        while Episode<args.TotalEpisodes:
-            print('=============== Episode',str(Episode+1), 'of', str(args.TotalEpisodes), ' ===============')
-            Epsilon=1-(Episode/args.TotalEpisodes) # Sets epsilon for the current episode for epsilon greedy policy
-            SimulationTime, TrainingTime = TrainingSimulation.RunTraining(Episode,Epsilon)
-            print('\n=============== Episode Stats ===============')
-            print('Simulation Time:', SimulationTime, 'Seconds')
-            print('Training Time:', TrainingTime, 'Seconds')
-            print('Total Time:', round(SimulationTime+TrainingTime,1), 'Seconds')
-            print('=============================================')
-            Episode+=1
-            
-            # import sumo_visualizer
-
-            # # Create a SumoVisualizer object.
-            # visualizer = sumo_visualizer.SumoVisualizer("D:\Programming\Code\Python\RL\Traffic\TCS\Junction\Environment.net.xml", "D:\Programming\Code\Python\RL\Traffic\TCS\Junction\EpisodeRoutes.rou.xml")
-
-            # # Start the SUMO simulation.
-            # visualizer.sumo_sim.start()
-
-            # # Train the Deep Q Learning agent.
-            # while not Model.is_trained():
-            #     # Get the agent's state and action.
-            #     agent_state = Model.get_state()
-            #     agent_action = Model.act(agent_state)
-
-            #     # Update the SUMO simulation with the agent's action.
-            #     visualizer.sumo_sim.step(agent_action)
-
-            #     # Visualize the SUMO simulation state.
-            #     visualizer.visualize_step(agent_state, agent_action)
-
-            # # Stop the SUMO simulation.
-            # visualizer.close()
-            
-            if(args.SaveSteps and Episode%5==0 and Episode!=args.TotalEpisodes):
-                StepData=DataPath+"Episode "+str(Episode)
-                Viz=Visualization(StepData,args.dpi)
-                Model.SaveModel(StepData)
-                Viz.DataAndPlot(data=TrainingSimulation.RewardStore, filename='Reward', xlabel='Episode', ylabel='Total Negative Reward')
-                Viz.DataAndPlot(data=TrainingSimulation.TotalWaitStore, filename='Delay', xlabel='Episode', ylabel='Total Delay (In Seconds)')
-                Viz.DataAndPlot(data=TrainingSimulation.AverageQueueLengthStore, filename='Queue', xlabel='Episode', ylabel='Average Queue Length (Number Of Vehicles)') 
-                print("Pausing the Training for 10 Minutes")
-                #time.sleep(600)
-                
-        print('\n=============== Session Stats ===============')
-        print('Start Time:', StartTimeStamp)
-        print('End Time:', datetime.datetime.now())
-        print('Model trained in this Session is saved at:', DataPath)
-        print('=============================================')
-        
-        Model.SaveModel(DataPath)
-        
-        Visualisation.DataAndPlot(data=TrainingSimulation.RewardStore, filename='Reward', xlabel='Episode', ylabel='Total Negative Reward')
-        Visualisation.DataAndPlot(data=TrainingSimulation.TotalWaitStore, filename='Delay', xlabel='Episode', ylabel='Total Delay (In Seconds)')
-        Visualisation.DataAndPlot(data=TrainingSimulation.AverageQueueLengthStore, filename='Queue', xlabel='Episode', ylabel='Average Queue Length (Number Of Vehicles)') 
-
+        Train(args,Model,Memory,Simulation,DataPath,Episode,args.dpi,StartTimeStamp)
     
-    elif(args.Mode=='retraining'):
-        DataPath=os.path.join("Models","Model_"+str(MaxModelNumber("Models")))
+    elif(args.Mode in ('retraining','resume')):
         config=ImportSettings(os.path.join(DataPath,"Settings.ini"))
-        Model=TrainModel(config['numlayers'],config['layerwidth'],config['batchsize'],config['learningrate'],config['numstates'],config['numactions'],tf.keras.models.load_model(os.path.join(DataPath,'TrainedModel.h5')))
-        Visualisation=Visualization(DataPath,config['dpi'])
-        Traffic=TrafficGen(config['maxsteps'],config['n_cars'])
-        Memory=Memory(config['maxmemorysize'],config['minmemorysize'])
-        TrainingSimulation=TrainingSimulation(Model,Memory,Traffic,SumoCmd,0.75,config['maxsteps'],config['greenduration'],config['yellowduration'],config['numstates'],config['numactions'],config['trainingepochs'])
-        
-        while Episode<args.TotalEpisodes:
-            print('=============== Episode',str(Episode+1), 'of', str(args.TotalEpisodes), ' ===============')
-            Epsilon=1-(Episode/args.TotalEpisodes) # Sets epsilon for the current episode for epsilon greedy policy
-            SimulationTime, TrainingTime = TrainingSimulation.RunTraining(Episode,Epsilon)
-            print('\n=============== Episode Stats ===============')
-            print('Simulation Time:', SimulationTime, 'Seconds')
-            print('Training Time:', TrainingTime, 'Seconds')
-            print('Total Time:', round(SimulationTime+TrainingTime,1), 'Seconds')
-            print('=============================================')
-            Episode+=1
-            
-            if(args.SaveSteps and Episode%5==0 and Episode!=args.TotalEpisodes):
-                StepData=DataPath+"Episode "+str(Episode)
-                Viz=Visualization(StepData,config['dpi'])
-                Model.SaveModel(StepData)
-                Viz.DataAndPlot(data=TrainingSimulation.RewardStore, filename='Reward', xlabel='Episode', ylabel='Total Negative Reward')
-                Viz.DataAndPlot(data=TrainingSimulation.TotalWaitStore, filename='Delay', xlabel='Episode', ylabel='Total Delay (In Seconds)')
-                Viz.DataAndPlot(data=TrainingSimulation.AverageQueueLengthStore, filename='Queue', xlabel='Episode', ylabel='Average Queue Length (Number Of Vehicles)')
-                print("Model Info is saved at:",StepData)
-                print("Pausing the Training for 10 Minutes")
-                time.sleep(600)
-                
-        print('\n=============== Session Stats ===============')
-        print('Start Time:', StartTimeStamp)
-        print('End Time:', datetime.datetime.now())
-        print('Model trained in this Session is saved at:', DataPath)
-        print('=============================================')      
+        if args.Mode=='retraining':
+            from keras.models import load_model
+            Model=TrainModel(config['numlayers'],config['layerwidth'],config['batchsize'],config['learningrate'],config['numstates'],config['numactions'],load_model(os.path.join(DataPath,'TrainedModel.h5')),Backend=args.Backend,TargetUpdate=config['targetupdate'],TargetEvery=config['targetevery'],Tau=config['tau'],DoubleDQN=config['doubledqn'])
+        else:
+            Model=TrainModel(config['numlayers'],config['layerwidth'],config['batchsize'],config['learningrate'],config['numstates'],config['numactions'],Backend=args.Backend,TargetUpdate=config['targetupdate'],TargetEvery=config['targetevery'],Tau=config['tau'],DoubleDQN=config['doubledqn']) # Weights come from the checkpoint
+        Traffic=TrafficGen(config['maxsteps'],config['n_cars'],args.RouteFile if args.Environment=='sumo' else None,Bank,config['weibulldepartures'])
+        Memory=PrioritizedMemory(config['maxmemorysize'],config['minmemorysize'],config['alpha'],config['beta']) if config['prioritized'] else Memory(config['maxmemorysize'],config['minmemorysize'])
+        Simulation=CreateSimulation(args,Model,Memory,Traffic,Environment,config['maxsteps'],config['greenduration'],config['yellowduration'],config['numstates'],config['numactions'],config['trainingepochs'],DataPath)
         
-        Model.SaveModel(DataPath)
+        if args.Mode=='resume':
+            # Carries on with the episode counter and epsilon schedule of the run that stopped
+            Episode,args.TotalEpisodes=LoadCheckpoint(DataPath,Model,Memory,Simulation)
+            print('Resuming',DataPath,'after episode',Episode,'of',args.TotalEpisodes)
         
-        Visualisation.DataAndPlot(data=TrainingSimulation.RewardStore, filename='Reward', xlabel='Episode', ylabel='Total Negative Reward')
-        Visualisation.DataAndPlot(data=TrainingSimulation.TotalWaitStore, filename='Delay', xlabel='Episode', ylabel='Total Delay (In Seconds)')
-        Visualisation.DataAndPlot(data=TrainingSimulation.AverageQueueLengthStore, filename='Queue', xlabel='Episode', ylabel='Average Queue Length (Number Of Vehicles)')  
\ No newline at end of file
+        Train(args,Model,Memory,Simulation,DataPath,Episode,config['dpi'],StartTimeStamp)
\ No newline at end of file
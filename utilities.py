@@ -1,5 +1,4 @@
-# Visualization
-import matplotlib.pyplot as plt
+# Visualization, matplotlib is imported once something is plotted
 import os
 
 # TrafficGen
@@ -7,7 +6,7 @@ import numpy as np
 import math
 
 # Memory
-import random
+import threading
 
 # SetSumo Function
 import sys
@@ -16,12 +15,18 @@ from sumolib import checkBinary
 # ImportSettings Function
 import configparser
 
+# ScenarioBank settings
+import json
+
+from metrics import ReadMetrics
+
 class Visualization:
     def __init__(self,path,dpi):
         self.path=path
         self.dpi=dpi # Resolution in "Dots Per Inch"
         
     def DataAndPlot(self, data, filename, xlabel, ylabel):
+        import matplotlib.pyplot as plt
         Min=min(data)
         Max=max(data)
         
@@ -39,116 +44,294 @@ class Visualization:
         plt.close("all")
         
         with open(os.path.join(self.path,'plot_'+filename+'_data.txt'), "w") as file:
-            for value in data:
-                file.write("%s\n"%value)
+            file.write("".join("%s\n"%value for value in data))
+    
+    # Plots a column of a metrics file, which is only read once it is plotted
+    def PlotMetrics(self, MetricsFile, column, filename, xlabel, ylabel):
+        self.DataAndPlot(ReadMetrics(MetricsFile, [column])[column], filename, xlabel, ylabel)
 
 class TrafficGen:
-    def __init__(self, MaxSteps, N_Cars):
+    # Routes cars can take through the junction, as (incoming edge, outgoing edge)
+    RouteEdges={"W_N": ("W2TL","TL2N"), "W_E": ("W2TL","TL2E"), "W_S": ("W2TL","TL2S"),
+                "N_W": ("N2TL","TL2W"), "N_E": ("N2TL","TL2E"), "N_S": ("N2TL","TL2S"),
+                "E_W": ("E2TL","TL2W"), "E_N": ("E2TL","TL2N"), "E_S": ("E2TL","TL2S"),
+                "S_W": ("S2TL","TL2W"), "S_N": ("S2TL","TL2N"), "S_E": ("S2TL","TL2E")}
+    RouteNames=np.array(list(RouteEdges))
+    RouteIndex={Route: i for i, Route in enumerate(RouteEdges)}
+    StraightRoutes=np.array(["W_E","E_W","N_S","S_N"])
+    TurnRoutes=np.array(["W_N","W_S","N_W","N_E","E_N","E_S","S_W","S_E"])
+    # Lanes of the incoming edge that lead onto the outgoing edge of every route, right turns from 0, left turns from 3
+    RouteLanes={"W_N": (3,), "W_E": (0,1,2), "W_S": (0,),
+                "N_W": (0,), "N_E": (3,), "N_S": (0,1,2),
+                "E_W": (0,1,2), "E_N": (0,), "E_S": (3,),
+                "S_W": (3,), "S_N": (0,1,2), "S_E": (0,)}
+
+    # Without a RouteFile the routes are only kept in memory, for environments that don't read them from disk
+    # With a ScenarioBank the routes of every seed are read from the bank instead of being generated
+    # With WeibullDepartures the cars depart spread over the episode along the Weibull draw, otherwise all of them depart at the same step like every model trained so far
+    def __init__(self, MaxSteps, N_Cars, RouteFile=os.path.join("Junction","EpisodeRoutes.rou.xml"), Bank=None, WeibullDepartures=False):
         self.N_Cars=N_Cars
         self.MaxSteps=MaxSteps
+        self.RouteFile=RouteFile
+        self.Bank=Bank
+        self.WeibullDepartures=WeibullDepartures
         
     def GenerateRoutes(self, seed):
-        # Generate route of cars every episode
+        # Generate route of cars every episode, sets IDs, Routes, Departs and Lanes of every car and writes them to RouteFile
+        if self.Bank is not None:
+            self.LoadScenario(seed)
+            if self.RouteFile is not None:
+                self.WriteRoutes(self.RouteFile)
+            return
         
-        # Make tests reproducible
-        np.random.seed(seed)
+        # Make tests reproducible, with a generator of its own so parallel workers don't share the global one
+        Random=np.random.RandomState(seed)
         
         # Cars generate according to weibull distribution (https://en.wikipedia.org/wiki/Weibull_distribution) and sort them
-        Timing=np.sort(np.random.weibull(2,self.N_Cars))
+        # It is drawn either way, so the routes drawn after it stay the same for a seed
+        Timing=np.sort(Random.weibull(2,self.N_Cars))
         
         # Fit the distribution in the interval between 0 to MaxSteps
-        CarGen=[]
         OldMin=math.floor(Timing[1])
         OldMax=math.floor(Timing[-1])
         NewMin=0
         NewMax=self.MaxSteps
-        for x in Timing:
-            CarGen=np.append(CarGen,((NewMax-NewMin)/(OldMax-OldMin)))
+        if self.WeibullDepartures:
+            CarGen=NewMin+(Timing-Timing[0])*(NewMax-NewMin)/(Timing[-1]-Timing[0])
+        else:
+            CarGen=np.full(self.N_Cars,(NewMax-NewMin)/(OldMax-OldMin))
         
         #round every value to int, ie effective steps to determine when a car will be generated
-        CarGen=np.rint(CarGen)
+        self.Departs=np.rint(CarGen)
         
+        # Cars go straight 73% of the time and take one of the turns for the other 27% of the time
+        Straight=Random.uniform(size=self.N_Cars)<0.73
+        rs=Random.randint(0,len(self.StraightRoutes),self.N_Cars)
+        rt=Random.randint(0,len(self.TurnRoutes),self.N_Cars)
+        self.Routes=np.where(Straight,self.StraightRoutes[rs],self.TurnRoutes[rt])
+        self.IDs=[Route+"_"+str(cc) for cc,Route in enumerate(self.Routes.tolist())]
+        self.Lanes=np.full(self.N_Cars,-1) # Cars depart on a random lane
         
-        # Make the file for car generation, each new line represents a new car
-        with open("D:\Programming\Code\Python\RL\Traffic\TCS\Junction\EpisodeRoutes.rou.xml", "w") as route:
-            print("""<routes>
+        if self.RouteFile is not None:
+            self.WriteRoutes(self.RouteFile)
+    
+    # Takes the cars of the seed's scenario from the bank, which has to be generated with the same settings as this traffic
+    def LoadScenario(self, seed):
+        Settings=BankSettings(self.MaxSteps, self.N_Cars, self.WeibullDepartures)
+        if self.Bank.Settings!=Settings:
+            raise ValueError("The scenario bank %s was generated with %s, not %s"%(self.Bank.BankFile,self.Bank.Settings,Settings))
+        Scenario=self.Bank[seed]
+        self.Departs=Scenario['depart'].astype(float)
+        self.Routes=self.RouteNames[Scenario['route']]
+        self.Lanes=Scenario['lane'].astype(int)
+        self.IDs=[Route+"_"+str(cc) for cc,Route in enumerate(self.Routes.tolist())]
+    
+    # Draws a departure lane for every car among the lanes that lead to the road it wants to take
+    def DrawLanes(self, Random):
+        Index=np.array([self.RouteIndex[Route] for Route in self.Routes.tolist()])
+        Options=np.array([(self.RouteLanes[Route]*3)[:3] for Route in self.RouteNames]) # Repeated up to 3 lanes per route
+        Counts=np.array([len(self.RouteLanes[Route]) for Route in self.RouteNames])
+        return Options[Index,(Random.uniform(size=len(Index))*Counts[Index]).astype(int)]
+    
+    # Make the file for car generation in one write, each new line represents a new car
+    def WriteRoutes(self, RouteFile):
+        Lines=["""<routes>
             <vType accel="1.0" decel="4.5" id="Car" length="5.0" minGap="2.5" maxSpeed="25" sigma="0.5" />
+"""]
+        Lines+=['            <route id="%s" edges="%s %s"/>' % (RouteID, From, To) for RouteID,(From,To) in self.RouteEdges.items()]
+        DepartLanes=["random" if Lane<0 else str(Lane) for Lane in self.Lanes.tolist()]
+        Lines+=['    <vehicle id="%s" type="Car" route="%s" depart="%s" departLane="%s" departSpeed="10" />' % (CarID, Route, step, Lane) for CarID,Route,step,Lane in zip(self.IDs,self.Routes.tolist(),self.Departs.tolist(),DepartLanes)]
+        Lines.append("</routes>\n")
+        with open(RouteFile, "w") as route:
+            route.write("\n".join(Lines))
+            
+# One scenario per seed of the cars TrafficGen generates: departure step, index into TrafficGen.RouteNames and departure lane
+ScenarioType=np.dtype([('depart', np.int32), ('route', np.uint8), ('lane', np.int8)])
 
-            <route id="W_N" edges="W2TL TL2N"/>
-            <route id="W_E" edges="W2TL TL2E"/>
-            <route id="W_S" edges="W2TL TL2S"/>
-            <route id="N_W" edges="N2TL TL2W"/>
-            <route id="N_E" edges="N2TL TL2E"/>
-            <route id="N_S" edges="N2TL TL2S"/>
-            <route id="E_W" edges="E2TL TL2W"/>
-            <route id="E_N" edges="E2TL TL2N"/>
-            <route id="E_S" edges="E2TL TL2S"/>
-            <route id="S_W" edges="S2TL TL2W"/>
-            <route id="S_N" edges="S2TL TL2N"/>
-            <route id="S_E" edges="S2TL TL2E"/>""", file=route)
+# Settings of TrafficGen a scenario bank is generated with, the traffic that reads it has to have the same
+def BankSettings(MaxSteps, N_Cars, WeibullDepartures):
+    return {'MaxSteps': int(MaxSteps), 'N_Cars': int(N_Cars), 'WeibullDepartures': bool(WeibullDepartures)}
+
+# The .npy header only holds the shape and dtype, so the settings are kept in a .json next to the bank
+def BankSettingsFile(BankFile):
+    return os.path.splitext(BankFile)[0]+".json"
+
+class ScenarioBank:
+    # Pregenerated episode traffic, memory-mapped read-only so looking up a scenario is a slice and parallel workers share one copy
+    def __init__(self, BankFile):
+        self.BankFile=BankFile
+        self.Scenarios=np.load(BankFile, mmap_mode='r')
+        if self.Scenarios.dtype!=ScenarioType or self.Scenarios.ndim!=2:
+            raise ValueError("%s is not a scenario bank"%BankFile)
+        if not os.path.isfile(BankSettingsFile(BankFile)):
+            raise ValueError("%s has no settings file %s, generate it again with scenarios.py"%(BankFile,BankSettingsFile(BankFile)))
+        with open(BankSettingsFile(BankFile)) as File:
+            self.Settings=json.load(File)
+        if self.Settings.get('N_Cars')!=self.Scenarios.shape[1]:
+            raise ValueError("%s holds %i cars per scenario, its settings say %s"%(BankFile,self.Scenarios.shape[1],self.Settings.get('N_Cars')))
+    
+    # Pickled as its file name, so worker processes map the same file instead of getting a copy of every scenario
+    def __reduce__(self):
+        return ScenarioBank, (self.BankFile,)
+    
+    def __len__(self):
+        return len(self.Scenarios)
+    
+    # The cars of the seed's scenario
+    def __getitem__(self, seed):
+        if not 0<=seed<len(self.Scenarios):
+            raise IndexError("The scenario bank %s holds seeds 0 to %i, not %i"%(self.BankFile,len(self.Scenarios)-1,seed))
+        return self.Scenarios[seed]
+
+# Writes the scenarios of seeds 0 to NumScenarios-1 to a scenario bank, one row per seed
+def GenerateScenarioBank(BankFile, MaxSteps, N_Cars, NumScenarios, WeibullDepartures=False):
+    Traffic=TrafficGen(MaxSteps, N_Cars, None, WeibullDepartures=WeibullDepartures)
+    if os.path.isfile(BankSettingsFile(BankFile)):
+        os.remove(BankSettingsFile(BankFile)) # Settings are only written once the bank is complete, a bank that was cut short can't be read
+    Scenarios=np.lib.format.open_memmap(BankFile, mode='w+', dtype=ScenarioType, shape=(NumScenarios, N_Cars))
+    for seed in range(NumScenarios):
+        Traffic.GenerateRoutes(seed)
+        Scenarios[seed]['depart']=Traffic.Departs
+        Scenarios[seed]['route']=[Traffic.RouteIndex[Route] for Route in Traffic.Routes.tolist()]
+        Scenarios[seed]['lane']=Traffic.DrawLanes(np.random.default_rng(seed)) # A stream of its own, so the routes of the seed stay the same
+    Scenarios.flush()
+    del Scenarios
+    with open(BankSettingsFile(BankFile), "w") as File:
+        json.dump(BankSettings(MaxSteps, N_Cars, WeibullDepartures), File, indent=1)
+
+class Batch:
+    # Sampled transitions as contiguous arrays, still indexable as (State, Action, Reward, NextState) tuples
+    # Prioritized samples also carry their slots in memory and their importance sampling weights
+    def __init__(self, States, Actions, Rewards, NextStates, Indices=None, Weights=None):
+        self.States=States
+        self.Actions=Actions
+        self.Rewards=Rewards
+        self.NextStates=NextStates
+        self.Indices=Indices
+        self.Weights=Weights
+    
+    def __len__(self):
+        return len(self.Actions)
+    
+    def __getitem__(self, i):
+        return self.States[i], self.Actions[i], self.Rewards[i], self.NextStates[i]
 
-            
-            for cc,step in enumerate(CarGen):
-                StraightOrTurn = np.random.uniform()
-                if StraightOrTurn < 0.73: # Cars go straight 73% of the time
-                    rs=np.random.randint(1,5) # Helps choose which straight route a car should take
-                    if rs==1:
-                        print('    <vehicle id="W_E_%i" type="Car" route="W_E" depart="%s" departLane="random" departSpeed="10" />' % (cc, step), file=route)
-                    elif rs ==2:
-                        print('    <vehicle id="E_W_%i" type="Car" route="E_W" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rs ==3:
-                        print('    <vehicle id="N_S_%i" type="Car" route="N_S" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    else:
-                        print('    <vehicle id="S_N_%i" type="Car" route="S_N" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                        
-                else: # Cars that take turns for the other 27% of the time
-                    rt=np.random.randint(1,9) # Helps choose which route that has a turn a car should take
-                    if rt==1:
-                        print('    <vehicle id="W_N_%i" type="Car" route="W_N" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rt ==2:
-                        print('    <vehicle id="W_S_%i" type="Car" route="W_S" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)                        
-                    elif rt ==3:
-                        print('    <vehicle id="N_W_%i" type="Car" route="N_W" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rt ==4:
-                        print('    <vehicle id="N_E_%i" type="Car" route="N_E" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rt ==5:
-                        print('    <vehicle id="E_N_%i" type="Car" route="E_N" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rt ==6:
-                        print('    <vehicle id="E_S_%i" type="Car" route="E_S" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rt ==7:
-                        print('    <vehicle id="S_W_%i" type="Car" route="S_W" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-                    elif rt ==8:
-                        print('    <vehicle id="S_E_%i" type="Car" route="S_E" depart="%s" departLane="random" departSpeed="10" />' % (cc,step), file=route)
-            
-            print("</routes>", file=route)
-            
 class Memory:
     def __init__(self,SizeMax,SizeMin):
-        self.Samples=[]
+        self.Lock=threading.RLock() # The --Async learner samples while the episode adds samples, re-entrant for subclasses that extend AddSample
         self.SizeMax=SizeMax
         self.SizeMin=SizeMin
+        self.Size=0
+        self.Next=0 # Slot the next sample is written to, which is the oldest one once the memory is full
+        self.States=None # Arrays are allocated with the first sample, when the size of a state is known
+        self.Random=np.random.default_rng()
+    
+    def Allocate(self, NumStates):
+        self.States=np.zeros((self.SizeMax, NumStates), dtype=np.float32)
+        self.Actions=np.zeros(self.SizeMax, dtype=np.int64)
+        self.Rewards=np.zeros(self.SizeMax, dtype=np.float32)
+        self.NextStates=np.zeros((self.SizeMax, NumStates), dtype=np.float32)
     
     def AddSample(self,Sample):
-        self.Samples.append(Sample)
-        if self.SizeNow()>self.SizeMax:
-            # Removes oldest element when full
-            self.Samples.pop(0)
+        State, Action, Reward, NextState=Sample
+        with self.Lock:
+            if self.States is None:
+                self.Allocate(len(State))
+            
+            # Overwrites the oldest element when full
+            self.States[self.Next]=State
+            self.Actions[self.Next]=Action
+            self.Rewards[self.Next]=Reward
+            self.NextStates[self.Next]=NextState
+            self.Next=(self.Next+1)%self.SizeMax
+            self.Size=min(self.Size+1, self.SizeMax)
     
     def GetSamples(self, N):
         if self.SizeNow()<self.SizeMin:
             return []
         
-        if N>self.SizeNow():
-            # Get all sampples
-            return random.sample(self.Samples,self.SizeNow())
-        else:
-            # Returns 'BatchSize'(or N, in this case) number of samples
-            return random.sample(self.Samples, N)
+        # Returns 'BatchSize'(or N, in this case) number of samples, or all of them if there are fewer
+        with self.Lock:
+            Indices=self.Random.choice(self.Size, min(N, self.Size), replace=False)
+            return Batch(self.States[Indices], self.Actions[Indices], self.Rewards[Indices], self.NextStates[Indices])
     
     def SizeNow(self):
         # Returns number of elements in Samples or how 'full' the memory is
-        return len(self.Samples)
+        return self.Size
+    
+class SumTree:
+    # Binary tree in an array where every node holds the sum of its two children, the root is node 1 and leaf i is node Capacity+i
+    def __init__(self, Size):
+        self.Capacity=1
+        while self.Capacity<Size:
+            self.Capacity*=2
+        self.Tree=np.zeros(2*self.Capacity)
+    
+    def Total(self):
+        return self.Tree[1]
+    
+    # Sets the values of the given leaves and the sums above them, one level at a time for the whole batch
+    def Update(self, Leaves, Values):
+        Nodes=np.asarray(Leaves)+self.Capacity
+        self.Tree[Nodes]=Values
+        while Nodes[0]>1:
+            Nodes=Nodes//2 # Parents shared by several leaves are just written more than once with the same sum
+            self.Tree[Nodes]=self.Tree[2*Nodes]+self.Tree[2*Nodes+1]
+    
+    # Leaves at which the given running sums fall, going down one level at a time for the whole batch
+    def Find(self, Sums):
+        Sums=np.array(Sums, dtype=np.float64)
+        Nodes=np.ones(len(Sums), dtype=np.int64)
+        while Nodes[0]<self.Capacity:
+            Left=2*Nodes
+            Right=Sums>self.Tree[Left]
+            Sums-=self.Tree[Left]*Right
+            Nodes=Left+Right
+        return Nodes-self.Capacity
     
+    def Values(self, Leaves):
+        return self.Tree[np.asarray(Leaves)+self.Capacity]
+
+class PrioritizedMemory(Memory):
+    # Samples transitions in proportion to their last TD error to the power Alpha, instead of uniformly
+    # Beta sets how much the importance sampling weights make up for the samples being drawn unevenly
+    def __init__(self, SizeMax, SizeMin, Alpha=0.6, Beta=0.4, Epsilon=1e-3):
+        super().__init__(SizeMax, SizeMin)
+        self.Alpha=Alpha
+        self.Beta=Beta
+        self.Epsilon=Epsilon # Keeps transitions with no error sampled now and then
+        self.Priorities=SumTree(SizeMax)
+        self.MaxPriority=1.0 # New transitions get the highest priority so they are replayed at least once
+    
+    def AddSample(self,Sample):
+        with self.Lock:
+            Slot=self.Next
+            super().AddSample(Sample)
+            self.Priorities.Update([Slot], self.MaxPriority)
+    
+    def GetSamples(self, N):
+        if self.SizeNow()<self.SizeMin:
+            return []
+        
+        with self.Lock:
+            # One sample from each of N equal slices of the total priority
+            N=min(N, self.Size)
+            Total=self.Priorities.Total()
+            Sums=(np.arange(N)+self.Random.random(N))*(Total/N)
+            Indices=np.minimum(self.Priorities.Find(Sums), self.Size-1) # Rounding can run past the last filled slot
+            
+            Probabilities=self.Priorities.Values(Indices)/Total
+            Weights=(self.Size*Probabilities)**(-self.Beta)
+            Weights=(Weights/Weights.max()).astype(np.float32)
+            return Batch(self.States[Indices], self.Actions[Indices], self.Rewards[Indices], self.NextStates[Indices], Indices, Weights)
+    
+    # Sets the priorities of replayed transitions from their new TD errors
+    def UpdatePriorities(self, Indices, Errors):
+        Priorities=(np.abs(Errors)+self.Epsilon)**self.Alpha
+        with self.Lock:
+            self.Priorities.Update(Indices, Priorities)
+            self.MaxPriority=max(self.MaxPriority, float(Priorities.max()))
+
 #Configure the various parameters of SUMO
 def SetSumo(Gui, SumoCfgFileName,MaxSteps):
     if 'SUMO_HOME' in os.environ:
@@ -189,6 +372,19 @@ def SetTrainPath(ModelPathName):
     
     return DataPath
 
+# Setting up the Directory a training run works in, a new model folder for a new model, the latest model folder to retrain or resume
+def SetModelPath(ModelPathName, Mode):
+    if Mode=='normal':
+        return SetTrainPath(ModelPathName)
+    
+    ModelPath=os.path.join(os.getcwd(),ModelPathName,'')
+    Contents=[Name for Name in os.listdir(ModelPath) if Name.startswith('Model_')] if os.path.isdir(ModelPath) else []
+    if not Contents:
+        sys.exit('There Is No Model In '+ModelPath+' To Continue Training')
+    Latest=max(Contents,key=lambda Name: int(Name.split("_")[1]))
+    
+    return os.path.join(ModelPath,Latest,'')
+
 # Setting up the path from which a trained model is taken
 def SetTestPath(ModelNumber):
     ModelPath=os.path.join(os.getcwd(),"Models",'Model_'+str(ModelNumber),'')
@@ -209,6 +405,8 @@ def ImportSettings(ConfigFile):
     Config['gui']=Content['Misc'].getboolean('gui')
     Config['maxsteps']=Content['Misc'].getint('maxsteps')
     Config['n_cars']=Content['Misc'].getint('n_cars')
+    # Models trained before the Weibull departures were added had all of their cars depart at once
+    Config['weibulldepartures']=Content['Misc'].getboolean('weibulldepartures', fallback=False)
         
     Config['numlayers']=Content['Model'].getint('numlayers')
     Config['layerwidth']=Content['Model'].getint('layerwidth')
@@ -216,6 +414,11 @@ def ImportSettings(ConfigFile):
     Config['learningrate']=Content['Model'].getfloat('learningrate')
     Config['numstates']=Content['Model'].getint('numstates')
     Config['numactions']=Content['Model'].getint('numactions')
+    # Models trained before the target network options were added used the trained network itself for the targets
+    Config['targetupdate']=Content['Model'].get('targetupdate', fallback='none')
+    Config['targetevery']=Content['Model'].getint('targetevery', fallback=500)
+    Config['tau']=Content['Model'].getfloat('tau', fallback=0.005)
+    Config['doubledqn']=Content['Model'].getboolean('doubledqn', fallback=False)
     
     Config['greenduration']=Content['Simulation'].getint('greenduration')    
     Config['yellowduration']=Content['Simulation'].getint('yellowduration')
@@ -225,6 +428,9 @@ def ImportSettings(ConfigFile):
     
     Config['maxmemorysize']=Content['Memory'].getint('maxmemorysize')
     Config['minmemorysize']=Content['Memory'].getint('minmemorysize')
+    Config['prioritized']=Content['Memory'].getboolean('prioritized', fallback=False)
+    Config['alpha']=Content['Memory'].getfloat('alpha', fallback=0.6)
+    Config['beta']=Content['Memory'].getfloat('beta', fallback=0.4)
        
 
     return Config